@@ -24,6 +24,7 @@ __all__ = ['BeautifulSoup']
 
 
 from collections import Counter
+import itertools
 import os
 import re
 import sys
@@ -37,11 +38,13 @@ if sys.version_info.major < 3:
 
 from .builder import (
     builder_registry,
+    HTMLParserTreeBuilder,
     ParserRejectedMarkup,
     XMLParsedAsHTMLWarning,
 )
 from .dammit import UnicodeDammit
 from .element import (
+    BatchEdit,
     CData,
     Comment,
     DEFAULT_OUTPUT_ENCODING,
@@ -116,6 +119,27 @@ class BeautifulSoup(Tag):
     # endData() to detect data chunks that seem 'empty'.
     ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
 
+    # This goes up by one every time the document is changed. See
+    # add_observer().
+    version = 0
+
+    # The functions registered with add_observer().
+    _observers = ()
+
+    # The value of .version when this document was last frozen by
+    # snapshot(), and the frozen copy.
+    _frozen = None
+
+    # The markup returned by the last call to reparse_range(), and a
+    # (line number, offset) pair for a line start in that markup, so
+    # the next call doesn't have to count lines from the beginning.
+    _source_anchor = None
+
+    # Set by HTMLParserTreeBuilder if the document ended while
+    # html.parser was still waiting for the end of a tag, comment or
+    # declaration.
+    _unfinished_markup = False
+
     NO_PARSER_SPECIFIED_WARNING = "No parser was explicitly specified, so I'm using the best available %(markup_type)s parser for this system (\"%(parser)s\"). This usually isn't a problem, but if you run this code on another system, or in a different virtual environment, it may use a different parser and behave differently.\n\nThe code that caused this warning is on line %(line_number)s of the file %(filename)s. To get rid of this warning, pass the additional argument 'features=\"%(parser)s\"' to the BeautifulSoup constructor.\n"
     
     def __init__(self, markup="", features=None, builder=None,
@@ -380,8 +404,171 @@ class BeautifulSoup(Tag):
         self.markup = None
         self.builder.soup = None
 
+        # Some tree builders (html5lib) build the tree by moving
+        # elements around, but parsing the document doesn't count as
+        # changing it.
+        self.version = 0
+
     def __copy__(self):
-        """Copy a BeautifulSoup object by converting the document to a string and parsing it again."""
+        """Copy a BeautifulSoup object.
+
+        The copy is built directly from this object's parse tree,
+        without converting the document to a string and parsing it
+        again.
+        """
+        if self.builder is None:
+            # This object was unpickled and lost its builder. There's
+            # nothing to set up the new object with, so go through a
+            # default builder instead.
+            return self._copy_by_reparsing()
+
+        copy = type(self).__new__(type(self))
+        copy.element_classes = self.element_classes
+        copy.builder = self.builder
+        copy.is_xml = self.is_xml
+        copy.known_xml = self.known_xml
+        copy.parse_only = self.parse_only
+        copy.markup = None
+        copy.original_encoding = self.original_encoding
+        copy.declared_html_encoding = self.declared_html_encoding
+        copy.contains_replacement_characters = self.contains_replacement_characters
+        copy._unfinished_markup = self._unfinished_markup
+        copy.reset()
+        copy._namespaces = dict(self._namespaces)
+
+        for element in self.descendants:
+            if not isinstance(element, (Tag, NavigableString)):
+                # Some other kind of PageElement that we don't know
+                # how to copy.
+                return self._copy_by_reparsing()
+        previous = self._copy_descendants(copy)
+        if previous is not copy:
+            copy._most_recent_element = previous
+        return copy
+
+    def freeze(self):
+        """Make a read-only copy of this document.
+
+        The copy is stored as a ColumnarDocument (see bs4.columnar),
+        which takes up much less memory than this tree. Its elements
+        can't be modified, so it can be shared between threads
+        without locking.
+
+        :return: A read-only BeautifulSoup object.
+        """
+        from bs4.columnar import ColumnarDocument
+        return ColumnarDocument(self).root
+
+    def snapshot(self):
+        """Make a copy of this document that shares as much as
+        possible with a read-only version of it.
+
+        This freezes the document (see freeze()) and takes a snapshot
+        of the frozen copy. Elements are only copied out of a frozen
+        document when they're reached, so making many variations of
+        one document is cheap. The frozen copy is kept until the
+        document changes (see add_observer()), so only the first
+        call after a change has to freeze the whole document.
+        Changes made by modifying .contents or .attrs directly aren't
+        noticed, so after making one, call freeze() and snapshot()
+        the frozen copy yourself.
+
+        :return: A BeautifulSoup object.
+        """
+        frozen = self._frozen
+        if frozen is None or frozen[0] != self.version:
+            frozen = self._frozen = (self.version, self.freeze())
+        return frozen[1].snapshot()
+
+    def batch_edit(self):
+        """Make a lot of changes to this document at once.
+
+        Use the return value as a context manager:
+
+         with soup.batch_edit():
+             for a in links:
+                 a.wrap(soup.new_tag("span"))
+
+        Inside the block, insert(), append(), extract(),
+        replace_with(), wrap() and the methods built on them only
+        update .contents and .parent. The rest of the linkage --
+        next_element, previous_element, next_sibling and
+        previous_sibling -- is rebuilt once, for the parts of the
+        tree that changed, when the block ends. Until then it may be
+        out of date, and so may everything that relies on it:
+        find_next(), find_previous(), find_all_next(),
+        find_all_previous() and their relatives, and .next_elements,
+        .previous_elements, .next_siblings and .previous_siblings.
+        find_all(), .descendants, get_text() and decode() still
+        work, by going through .contents.
+
+        The batch only covers this document, including elements
+        taken out of it inside the block. Changes to other documents
+        are made as usual. Blocks can be nested; the outermost one
+        does the repairs.
+
+        Rebuilding the linkage at the end costs about as much as
+        walking the changed parts of the tree, so a batch only pays
+        off when the individual changes are expensive, as they are
+        in deep trees or when large subtrees are moved around. Many
+        small changes to a shallow tree are faster without one.
+
+        :return: A BatchEdit, which turns into this object when the
+           block is entered.
+        """
+        return BatchEdit(self)
+
+    def add_observer(self, observer):
+        """Call a function every time this document changes.
+
+        Every change also increments .version, so to find out whether
+        a document has changed since you last looked at it, you can
+        compare .version with the value you saw then.
+
+        The observer is called once for each element affected by a
+        change, with four arguments:
+
+        * op: 'insert' or 'extract' if an element was added to or
+          removed from a Tag's .contents; 'set_attribute' or
+          'delete_attribute' if tag[key] was set or deleted;
+          'rename' if tag.name was changed.
+        * node: The element that was inserted or extracted, or the
+          Tag whose attribute or name changed.
+        * parent: The Tag that changed: the one whose .contents
+          changed, or the one whose attribute or name changed.
+        * index: The position `node` now has, or used to have, in
+          `parent.contents`. For an attribute change, the name of
+          the attribute. For a rename, the Tag's old name.
+
+        Methods like replace_with(), wrap(), clear() and smooth() are
+        reported as the insertions and extractions that make them
+        up. Changes made by modifying .contents or .attrs directly
+        aren't reported.
+
+        :param observer: A function that takes four arguments.
+        """
+        self._observers = self._observers + (observer,)
+
+    def remove_observer(self, observer):
+        """Stop calling a function registered with add_observer()."""
+        self._observers = tuple(
+            x for x in self._observers if x is not observer
+        )
+
+    def _tree_changed(self, op, nodes, parent, index):
+        """Keep track of a change to this document. See add_observer()."""
+        self.version += 1
+        for observer in self._observers:
+            if op in ('insert', 'extract'):
+                for i, node in enumerate(nodes):
+                    observer(op, node, parent, index + i)
+            else:
+                observer(op, nodes[0], parent, index)
+
+    def _copy_by_reparsing(self):
+        """Copy a BeautifulSoup object by converting the document to a
+        string and parsing it again.
+        """
         copy = type(self)(
             self.encode('utf-8'), builder=self.builder, from_encoding='utf-8'
         )
@@ -395,11 +582,199 @@ class BeautifulSoup(Tag):
 
     def __getstate__(self):
         # Frequently a tree builder can't be pickled.
-        d = dict(self.__dict__)
+        d = super(BeautifulSoup, self).__getstate__()
+        # Observers are often bound methods of objects that can't
+        # be pickled.
+        d.pop('_observers', None)
+        d.pop('_source_anchor', None)
+        d.pop('_frozen', None)
         if 'builder' in d and d['builder'] is not None and not self.builder.picklable:
             d['builder'] = None
         return d
-    
+
+    def reparse_range(self, old_span, new_text, markup):
+        """Apply an edit to the markup this document was parsed from,
+        and bring the parse tree up to date by reparsing only the
+        smallest element that encloses the edit.
+
+        Partial reparsing only works if the document was parsed with
+        html.parser (which records where each tag starts) and
+        `markup` is the Unicode markup that produced the current
+        tree. If the edit can't safely be reparsed in isolation --
+        because a different tree builder was used, or because the
+        new text leaves a tag open, leaves a start tag or comment
+        unfinished, or closes a tag it didn't open -- the entire
+        document is reparsed instead.
+
+        Only the enclosing element is reparsed, but if the edit adds
+        or removes lines, the line number of every tag after it has
+        to be updated, which takes time proportional to the rest of
+        the document. Edits that don't change the number of lines
+        only touch the tags on the line where the edit ends.
+
+        :param old_span: A 2-tuple (start, end) of character offsets
+            into `markup`, identifying the text to be replaced.
+        :param new_text: The replacement text.
+        :param markup: The markup this document was parsed from.
+        :return: The edited markup. Pass this in as `markup` the
+            next time you call reparse_range().
+        """
+        if not isinstance(markup, str):
+            raise TypeError(
+                "reparse_range() needs the Unicode markup that was parsed.")
+        if self.builder is None:
+            raise ValueError(
+                "Cannot reparse part of a document that has no tree builder.")
+        start, end = old_span
+        if not 0 <= start <= end <= len(markup):
+            raise ValueError("Invalid span for markup: %r" % (old_span,))
+        new_markup = markup[:start] + new_text + markup[end:]
+
+        anchor = self._source_anchor
+        self._source_anchor = None
+        if anchor is not None and anchor[0] is markup:
+            locator = _SourceLocator(markup, *anchor[1:])
+        else:
+            locator = _SourceLocator(markup)
+
+        region = None
+        if (isinstance(self.builder, HTMLParserTreeBuilder)
+            and self.builder.store_line_numbers and not self.parse_only
+            and not self._unfinished_markup):
+            # html.parser records where each tag starts, and parses a
+            # region of a document the same way it would parse that
+            # region in context -- unless the document ends in an
+            # unfinished tag or comment, which an edit anywhere
+            # before it could finish.
+            region = self._enclosing_source_region(locator, start, end)
+        if region is not None:
+            element, region_start, region_end, following = region
+            new_region = (
+                markup[region_start:start] + new_text
+                + markup[end:region_end]
+            )
+            fragment = _RegionSoup(
+                new_region, self.builder, self.element_classes,
+                set(parent.name for parent in element.parents)
+            )
+            if fragment.self_contained:
+                self._splice_region(
+                    element, following, fragment, locator, start, end,
+                    new_text
+                )
+                # Nothing before the edit has moved, so the line the
+                # edit started on is a good place to start counting
+                # from next time.
+                line, column = locator.position(start)
+                self._source_anchor = (new_markup, line, start - column)
+                return new_markup
+
+        # Reparse the whole document.
+        new_soup = type(self)(
+            new_markup, builder=self.builder, parse_only=self.parse_only,
+            element_classes=self.element_classes
+        )
+        self.clear()
+        self.extend(new_soup)
+        self._unfinished_markup = new_soup._unfinished_markup
+        return new_markup
+
+    def _enclosing_source_region(self, locator, start, end):
+        """Find the smallest element whose source region covers the
+        given span of the markup.
+
+        An element's source region runs from the start of its opening
+        tag to the start of the opening tag of its next sibling tag,
+        so it also covers any strings that come between the two. The
+        last tag among its siblings has no known source region.
+
+        :param locator: A _SourceLocator for the markup.
+        :return: A 4-tuple (element, region_start, region_end,
+            next_tag), or None if no suitable element was found.
+        """
+        start_position = locator.position(start)
+        end_position = locator.position(end)
+        builder = self.builder
+        found = None
+        node = self
+        while True:
+            candidate = None
+            for child in node.contents:
+                if not isinstance(child, Tag):
+                    continue
+                position = _source_position(child)
+                if position is None or position > start_position:
+                    break
+                candidate = child
+            if candidate is None:
+                break
+            following = candidate.next_sibling
+            while following is not None and not isinstance(following, Tag):
+                following = following.next_sibling
+            if following is not None:
+                following_position = _source_position(following)
+                if (following_position is not None
+                    and following_position >= end_position):
+                    found = (candidate, _source_position(candidate), following)
+
+            # Even if this tag's source region couldn't be determined,
+            # the edit might be inside one of its children.
+            if (candidate.name in builder.preserve_whitespace_tags
+                or candidate.name in builder.string_containers):
+                # The contents of this tag can't be parsed out of
+                # context.
+                break
+            node = candidate
+        if found is None:
+            return None
+        element, position, following = found
+        return (
+            element, locator.offset(*position),
+            locator.offset(*_source_position(following)), following
+        )
+
+    def _splice_region(self, element, following, fragment, locator,
+                       start, end, new_text):
+        """Replace `element` (and any strings between it and
+        `following`) with the contents of a freshly parsed fragment,
+        then shift the source positions of the later tags.
+        """
+        line, pos = element.sourceline, element.sourcepos
+        for tag in fragment.descendants:
+            if isinstance(tag, Tag) and _source_position(tag) is not None:
+                if tag.sourceline == 1:
+                    tag.sourcepos += pos
+                tag.sourceline += line - 1
+
+        parent = element.parent
+        index = parent.index(element)
+        while element is not following:
+            next_sibling = element.next_sibling
+            element.extract(_self_index=index)
+            element = next_sibling
+        for offset, child in enumerate(list(fragment.contents)):
+            parent.insert(index + offset, child)
+
+        # Every tag after the edited region has moved.
+        start_line, start_column = locator.position(start)
+        end_line, end_column = locator.position(end)
+        line_delta = new_text.count('\n') - (end_line - start_line)
+        if '\n' in new_text:
+            new_end_column = len(new_text) - (new_text.rfind('\n') + 1)
+        else:
+            new_end_column = start_column + len(new_text)
+        column_delta = new_end_column - end_column
+        for tag in itertools.chain([following], following.next_elements):
+            if not isinstance(tag, Tag) or _source_position(tag) is None:
+                continue
+            if tag.sourceline == end_line:
+                tag.sourcepos += column_delta
+            elif line_delta == 0:
+                # No line numbers changed, and we're past the line
+                # where column numbers did change.
+                break
+            tag.sourceline += line_delta
+
     @classmethod
     def _decode_markup(cls, markup):
         """Ensure `markup` is bytes so it's safe to send into warnings.warn.
@@ -460,7 +835,10 @@ class BeautifulSoup(Tag):
         markup.
         """
         Tag.__init__(self, self, self.builder, self.ROOT_TAG_NAME)
+        # Tree builders may register namespace prefixes here.
+        self._namespaces = dict()
         self.hidden = 1
+        self._frozen = None
         self.builder.reset()
         self.current_data = []
         self.currentTag = None
@@ -795,6 +1173,113 @@ class BeautifulStoneSoup(BeautifulSoup):
         super(BeautifulStoneSoup, self).__init__(*args, **kwargs)
 
 
+class _RegionSoup(BeautifulSoup):
+    """A BeautifulSoup object used by reparse_range() to parse one
+    region of a larger document.
+
+    It keeps track of whether the region could have been parsed the
+    same way in its original context: that is, whether all of the
+    region's markup was parsed before it ran out, whether every tag
+    opened in the region was also closed there, and whether the
+    region tried to close any of the tags that enclose it.
+    """
+
+    def __init__(self, markup, builder, element_classes, enclosing_names):
+        self.enclosing_names = enclosing_names
+        self.self_contained = True
+        super(_RegionSoup, self).__init__(
+            markup, builder=builder, element_classes=element_classes
+        )
+
+    def _feed(self):
+        self.builder.reset()
+        self.builder.feed(self.markup)
+        if self._unfinished_markup:
+            # html.parser ran out of markup in the middle of a tag,
+            # comment or declaration. In the original document it
+            # would have run on past the region.
+            self.self_contained = False
+        self.endData()
+        if len(self.tagStack) > 1:
+            # A tag was left open. In the original document it would
+            # have swallowed whatever came after the region.
+            self.self_contained = False
+        while self.currentTag.name != self.ROOT_TAG_NAME:
+            self.popTag()
+
+    def handle_endtag(self, name, nsprefix=None):
+        if (not self.open_tag_counter.get(name)
+            and name in self.enclosing_names):
+            # In the original document, this end tag would have
+            # closed a tag outside the region.
+            self.self_contained = False
+        super(_RegionSoup, self).handle_endtag(name, nsprefix)
+
+
+class _SourceLocator(object):
+    """Converts between character offsets into a document and the
+    (line number, column) pairs recorded by tree builders.
+
+    Lines are counted from the nearest line whose start is already
+    known, so the cost of a conversion depends on how far it is from
+    the last one, not on how far into the document it is.
+    """
+
+    def __init__(self, markup, line=1, line_start=0):
+        """Constructor.
+
+        :param markup: The document.
+        :param line: The number of a line in the document.
+        :param line_start: The offset where that line starts.
+        """
+        self.markup = markup
+        # Map line numbers to the offsets where those lines start.
+        self.line_starts = {line: line_start}
+
+    def position(self, offset):
+        """Convert an offset into a (line number, column) pair."""
+        markup = self.markup
+        line, line_start = min(
+            self.line_starts.items(), key=lambda x: abs(x[1] - offset)
+        )
+        if line_start <= offset:
+            newlines = markup.count('\n', line_start, offset)
+            if newlines:
+                line += newlines
+                line_start = markup.rfind('\n', line_start, offset) + 1
+        else:
+            line -= markup.count('\n', offset, line_start)
+            line_start = markup.rfind('\n', 0, offset) + 1
+        self.line_starts[line] = line_start
+        return line, offset - line_start
+
+    def offset(self, line, column):
+        """Convert a (line number, column) pair into an offset."""
+        known = min(self.line_starts, key=lambda l: abs(l - line))
+        line_start = self.line_starts[known]
+        while known < line:
+            line_start = self.markup.index('\n', line_start) + 1
+            known += 1
+            self.line_starts[known] = line_start
+        while known > line:
+            line_start = self.markup.rfind('\n', 0, line_start - 1) + 1
+            known -= 1
+            self.line_starts[known] = line_start
+        return line_start + column
+
+
+def _source_position(tag):
+    """Find where a Tag was found in its source document.
+
+    :return: A (sourceline, sourcepos) 2-tuple, or None if the tree
+        builder didn't record this information.
+    """
+    line, column = tag._source_position()
+    if line is None or column is None:
+        return None
+    return line, column
+
+
 class StopParsing(Exception):
     """Exception raised by a TreeBuilder if it's unable to continue parsing."""
     pass
@@ -22,6 +22,7 @@ import html5lib
 from html5lib.constants import (
     namespaces,
     prefixes,
+    tableInsertModeElements,
     )
 from bs4.element import (
     Comment,
@@ -50,7 +51,10 @@ class HTML5TreeBuilder(HTMLTreeBuilder):
     * This TreeBuilder doesn't use different subclasses of NavigableString
       based on the name of the tag in which the string was found.
 
-    * You can't use a SoupStrainer to parse only part of a document.
+    * If you use a SoupStrainer to parse only part of a document,
+      html5lib still needs to see the whole document, so every tag is
+      created. Strings that can't end up in the tree are skipped,
+      and the rest of the tree is thrown away at the end.
     """
 
     NAME = "html5lib"
@@ -80,8 +84,6 @@ class HTML5TreeBuilder(HTMLTreeBuilder):
 
     # These methods are defined by Beautiful Soup.
     def feed(self, markup):
-        if self.soup.parse_only is not None:
-            warnings.warn("You provided a value for parse_only, but the html5lib tree builder doesn't support parse_only. The entire document will be parsed.")
         parser = html5lib.HTMLParser(tree=self.create_treebuilder)
         self.underlying_builder.parser = parser
         extra_kwargs = dict()
@@ -142,10 +144,38 @@ class TreeBuilderForHtml5lib(treebuilder_base.TreeBuilder):
         # object, which we can use to track the current line number.
         self.parser = None
         self.store_line_numbers = store_line_numbers
-        
+
+        # html5lib often adds text to a document a few characters at a
+        # time. Rather than create a new string every time, we keep
+        # track of the string in the tree that's being added to, and
+        # the pieces of text that belong in it. See Element._merge_text().
+        self.pending_text = None
+
+        # If only part of the document is wanted, this maps the id()
+        # of each Tag that matches the SoupStrainer to the Tag.
+        self.parse_only = getattr(self.soup, 'parse_only', None)
+        self.matching_tags = {}
+
+        # Incremented whenever html5lib moves a tag that's already in
+        # the tree, so that Elements know when to stop trusting what
+        # they found out from their ancestors.
+        self.moves = 0
+
+    def flush_text(self):
+        """Replace the string being added to with a single string
+        containing all the text that belongs in it.
+        """
+        if self.pending_text is None:
+            return
+        old_element, chunks = self.pending_text
+        self.pending_text = None
+        new_element = self.soup.new_string(''.join(chunks))
+        old_element.replace_with(new_element)
+        self.soup._most_recent_element = new_element
+
     def documentClass(self):
         self.soup.reset()
-        return Element(self.soup, self.soup, None)
+        return Element(self.soup, self.soup, None, self)
 
     def insertDoctype(self, token):
         name = token["name"]
@@ -153,9 +183,10 @@ class TreeBuilderForHtml5lib(treebuilder_base.TreeBuilder):
         systemId = token["systemId"]
 
         doctype = Doctype.for_name_and_ids(name, publicId, systemId)
+        self.flush_text()
         self.soup.object_was_parsed(doctype)
 
-    def elementClass(self, name, namespace):
+    def elementClass(self, name, namespace, attrs=None):
         kwargs = {}
         if self.parser and self.store_line_numbers:
             # This represents the point immediately after the end of the
@@ -164,12 +195,59 @@ class TreeBuilderForHtml5lib(treebuilder_base.TreeBuilder):
             sourceline, sourcepos = self.parser.tokenizer.stream.position()
             kwargs['sourceline'] = sourceline
             kwargs['sourcepos'] = sourcepos-1
-        tag = self.soup.new_tag(name, namespace, **kwargs)
+        if attrs:
+            # html5lib uses tuples for namespaced attribute names.
+            attrs = dict(
+                (NamespacedAttribute(*key) if isinstance(key, tuple) else key,
+                 value)
+                for key, value in attrs.items()
+            )
+        # The Tag constructor takes care of multi-valued attributes
+        # and substitutions such as the charset in a META tag, so the
+        # tag is ready as soon as it's created.
+        if (self.parse_only is not None and not self.parse_only.text
+            and self.parse_only.search_tag(name, attrs or {})):
+            matches = True
+        else:
+            matches = False
+        tag = self.soup.element_classes.get(Tag, Tag)(
+            None, self.soup.builder, name, namespace, None, attrs, **kwargs
+        )
+        if matches:
+            self.matching_tags[id(tag)] = tag
+        return Element(tag, self.soup, namespace, self)
+
+    def createElement(self, token):
+        """Create an Element for a start tag token, with its
+        attributes, but don't insert it anywhere.
+        """
+        return self.elementClass(
+            token["name"], token.get("namespace", self.defaultNamespace),
+            token["data"]
+        )
 
-        return Element(tag, self.soup, namespace)
+    def insertElementNormal(self, token):
+        element = self.createElement(token)
+        self.openElements[-1].appendChild(element)
+        self.openElements.append(element)
+        return element
+
+    def insertElementTable(self, token):
+        if self.openElements[-1].name not in tableInsertModeElements:
+            return self.insertElementNormal(token)
+        # This element is being moved out of a table. See
+        # treebuilder_base.TreeBuilder.insertElementTable.
+        element = self.createElement(token)
+        parent, insertBefore = self.getTableMisnestedNodePosition()
+        if insertBefore is None:
+            parent.appendChild(element)
+        else:
+            parent.insertBefore(element, insertBefore)
+        self.openElements.append(element)
+        return element
 
     def commentClass(self, data):
-        return TextNode(Comment(data), self.soup)
+        return TextNode(self.soup.new_string(data, Comment), self.soup)
 
     def fragmentClass(self):
         from bs4 import BeautifulSoup
@@ -177,16 +255,80 @@ class TreeBuilderForHtml5lib(treebuilder_base.TreeBuilder):
         # infinite loop?
         self.soup = BeautifulSoup("", "html.parser")
         self.soup.name = "[document_fragment]"
-        return Element(self.soup, self.soup, None)
+        return Element(self.soup, self.soup, None, self)
 
     def appendChild(self, node):
         # XXX This code is not covered by the BS4 tests.
+        self.flush_text()
         self.soup.append(node.element)
 
     def getDocument(self):
+        self.flush_text()
+        if self.parse_only is not None:
+            self.apply_strainer()
         return self.soup
 
+    def keeps_strings(self, tag):
+        """Could a string added to `tag` end up in the final tree?
+
+        If only part of the document is wanted, a string can only be
+        kept if it's inside a Tag that matches the SoupStrainer, or
+        if the SoupStrainer looks for strings.
+        """
+        if self.parse_only is None or self.parse_only.text:
+            return True
+        matching_tags = self.matching_tags
+        while tag is not None:
+            if id(tag) in matching_tags:
+                return True
+            tag = tag.parent
+        return False
+
+    def apply_strainer(self):
+        """Replace the contents of the BeautifulSoup object with the
+        parts of the tree that match the SoupStrainer.
+
+        html5lib moves things around as it builds a tree, so it's
+        not possible to know until the end which parts are wanted.
+        """
+        strainer = self.parse_only
+        kept = []
+        stack = [iter(self.soup.contents)]
+        while stack:
+            for element in stack[-1]:
+                if isinstance(element, Tag):
+                    if id(element) in self.matching_tags:
+                        kept.append(element)
+                    elif element.contents:
+                        stack.append(iter(element.contents))
+                        break
+                elif strainer.text and strainer.search(element):
+                    kept.append(element)
+            else:
+                stack.pop()
+        self.matching_tags = {}
+
+        # html5lib is done with the tree, and the parts of it it's
+        # still holding on to are about to be thrown away.
+        self.openElements = []
+        self.activeFormattingElements = (
+            treebuilder_base.ActiveFormattingElements()
+        )
+        self.headPointer = self.formPointer = None
+
+        # The rest of the tree is thrown away, so there's no need
+        # to extract the kept elements one at a time.
+        soup = self.soup
+        soup.contents = []
+        soup.next_element = None
+        for element in kept:
+            element.parent = None
+            element.previous_sibling = element.next_sibling = None
+            soup.append(element)
+        soup._most_recent_element = soup._last_descendant()
+
     def getFragment(self):
+        self.flush_text()
         return treebuilder_base.TreeBuilder.getFragment(self).element
 
     def testSerializer(self, element):
@@ -240,16 +382,20 @@ class TreeBuilderForHtml5lib(treebuilder_base.TreeBuilder):
         return "\n".join(rv)
 
 class AttrList(object):
+    """A view of a Tag's attributes, in the form html5lib expects."""
+
+    __slots__ = ('element', 'attrs')
+
     def __init__(self, element):
         self.element = element
-        self.attrs = dict(self.element.attrs)
+        self.attrs = element.attrs
     def __iter__(self):
         return list(self.attrs.items()).__iter__()
     def __setitem__(self, name, value):
         # If this attribute is a multi-valued attribute for this element,
         # turn its value into a list.
         list_attr = self.element.cdata_list_attributes or {}
-        if (name in list_attr.get('*')
+        if (name in list_attr.get('*', [])
             or (self.element.name in list_attr
                 and name in list_attr[self.element.name])):
             # A node that is being cloned may have already undergone
@@ -257,6 +403,13 @@ class AttrList(object):
             if not isinstance(value, list):
                 value = nonwhitespace_re.findall(value)
         self.element[name] = value
+    def __eq__(self, other):
+        # html5lib compares the attributes of formatting elements
+        # to decide whether they're the same.
+        if isinstance(other, AttrList):
+            other = other.attrs
+        return self.attrs == other
+    __hash__ = None
     def items(self):
         return list(self.attrs.items())
     def keys(self):
@@ -266,17 +419,74 @@ class AttrList(object):
     def __getitem__(self, name):
         return self.attrs[name]
     def __contains__(self, name):
-        return name in list(self.attrs.keys())
+        return name in self.attrs
 
 
 class Element(treebuilder_base.Node):
-    def __init__(self, element, soup, namespace):
-        treebuilder_base.Node.__init__(self, element.name)
+    """An html5lib node that stands in for a Tag.
+
+    html5lib only sees these nodes; all the real work happens on
+    the Tag.
+    """
+
+    def __init__(self, element, soup, namespace, treebuilder=None):
+        # treebuilder_base.Node.__init__ sets up a number of data
+        # structures that are never used, so it's not called.
+        self.name = element.name
+        self.parent = None
         self.element = element
         self.soup = soup
         self.namespace = namespace
+        self.treebuilder = treebuilder
+        if namespace is None:
+            self.nameTuple = (namespaces["html"], self.name)
+        else:
+            self.nameTuple = (namespace, self.name)
+
+    def _flush_text(self):
+        if self.treebuilder is not None:
+            self.treebuilder.flush_text()
+
+    def _keeps_strings(self):
+        treebuilder = self.treebuilder
+        if treebuilder is None or treebuilder.parse_only is None:
+            return True
+        cached = getattr(self, '_keeps_strings_cache', None)
+        if cached is None or cached[0] != treebuilder.moves:
+            cached = self._keeps_strings_cache = (
+                treebuilder.moves, treebuilder.keeps_strings(self.element)
+            )
+        return cached[1]
+
+    def _moved(self):
+        if self.treebuilder is not None:
+            self.treebuilder.moves += 1
+
+    def _merge_text(self, old_element, string):
+        """Add `string` to the end of `old_element`, a string that's
+        already in the tree.
+
+        Creating a new string every time would take quadratic time
+        for input like "a</a>a</a>a</a>...", so the new text is held
+        by the TreeBuilderForHtml5lib until something else happens
+        to the tree.
+        """
+        if self.treebuilder is None:
+            new_element = self.soup.new_string(old_element + string)
+            old_element.replace_with(new_element)
+            self.soup._most_recent_element = new_element
+            return
+        pending = self.treebuilder.pending_text
+        if pending is None or pending[0] is not old_element:
+            self.treebuilder.flush_text()
+            pending = self.treebuilder.pending_text = (
+                old_element, [old_element]
+            )
+        pending[1].append(string)
 
     def appendChild(self, node):
+        # Strings of this class can be merged with their neighbors.
+        string_class = self.soup.string_container()
         string_child = child = None
         if isinstance(node, str):
             # Some other piece of code decided to pass in a string
@@ -288,26 +498,29 @@ class Element(treebuilder_base.Node):
             # instead of creating an Element object to contain the
             # Tag.
             child = node
-        elif node.element.__class__ == NavigableString:
+        elif node.element.__class__ == string_class:
             string_child = child = node.element
             node.parent = self
         else:
             child = node.element
             node.parent = self
 
+        if (isinstance(child, NavigableString) and child.parent is None
+            and not self._keeps_strings()):
+            # This string can't end up in the tree.
+            return
+
         if not isinstance(child, str) and child.parent is not None:
+            self._flush_text()
+            self._moved()
             node.element.extract()
 
         if (string_child is not None and self.element.contents
-            and self.element.contents[-1].__class__ == NavigableString):
+            and self.element.contents[-1].__class__ == string_class):
             # We are appending a string onto another string.
-            # TODO This has O(n^2) performance, for input like
-            # "a</a>a</a>a</a>..."
-            old_element = self.element.contents[-1]
-            new_element = self.soup.new_string(old_element + string_child)
-            old_element.replace_with(new_element)
-            self.soup._most_recent_element = new_element
+            self._merge_text(self.element.contents[-1], string_child)
         else:
+            self._flush_text()
             if isinstance(node, str):
                 # Create a brand new NavigableString from this string.
                 child = self.soup.new_string(node)
@@ -337,17 +550,10 @@ class Element(treebuilder_base.Node):
 
     def setAttributes(self, attributes):
         if attributes is not None and len(attributes) > 0:
-            converted_attributes = []
             for name, value in list(attributes.items()):
                 if isinstance(name, tuple):
-                    new_name = NamespacedAttribute(*name)
-                    del attributes[name]
-                    attributes[new_name] = value
-
-            self.soup.builder._replace_cdata_list_attribute_values(
-                self.name, attributes)
-            for name, value in list(attributes.items()):
-                self.element[name] = value
+                    name = NamespacedAttribute(*name)
+                AttrList(self.element)[name] = value
 
             # The attributes may contain variables that need substitution.
             # Call set_up_substitutions manually.
@@ -358,6 +564,16 @@ class Element(treebuilder_base.Node):
     attributes = property(getAttributes, setAttributes)
 
     def insertText(self, data, insertBefore=None):
+        if not self._keeps_strings():
+            return
+        if insertBefore is None:
+            contents = self.element.contents
+            if (contents and
+                contents[-1].__class__ == self.soup.string_container()):
+                # There's no need to create a string object for text
+                # that's going to be merged into another string.
+                self._merge_text(contents[-1], data)
+                return
         text = TextNode(self.soup.new_string(data), self.soup)
         if insertBefore:
             self.insertBefore(text, insertBefore)
@@ -365,18 +581,25 @@ class Element(treebuilder_base.Node):
             self.appendChild(text)
 
     def insertBefore(self, node, refNode):
+        if (isinstance(node.element, NavigableString)
+            and node.element.parent is None and not self._keeps_strings()):
+            return
         index = self.element.index(refNode.element)
-        if (node.element.__class__ == NavigableString and self.element.contents
-            and self.element.contents[index-1].__class__ == NavigableString):
+        string_class = self.soup.string_container()
+        if (node.element.__class__ == string_class and self.element.contents
+            and self.element.contents[index-1].__class__ == string_class):
             # (See comments in appendChild)
-            old_node = self.element.contents[index-1]
-            new_str = self.soup.new_string(old_node + node.element)
-            old_node.replace_with(new_str)
+            self._merge_text(self.element.contents[index-1], node.element)
         else:
+            self._flush_text()
+            if node.element.parent is not None:
+                self._moved()
             self.element.insert(index, node.element)
             node.parent = self
 
     def removeChild(self, node):
+        self._flush_text()
+        self._moved()
         node.element.extract()
 
     def reparentChildren(self, new_parent):
@@ -385,6 +608,8 @@ class Element(treebuilder_base.Node):
         # print("FROM", self.element)
         # print("TO", new_parent.element)
 
+        self._flush_text()
+        self._moved()
         element = self.element
         new_parent_element = new_parent.element
         # Determine what this tag's next_element will be once all the children
@@ -446,28 +671,28 @@ class Element(treebuilder_base.Node):
         # print("TO", new_parent_element)
 
     def cloneNode(self):
-        tag = self.soup.new_tag(self.element.name, self.namespace)
-        node = Element(tag, self.soup, self.namespace)
-        for key,value in self.attributes:
-            node.attributes[key] = value
-        return node
+        # new_tag() copies the dictionary, but the clone needs its
+        # own copies of multi-valued attributes as well.
+        attrs = dict(
+            (key, list(value) if isinstance(value, list) else value)
+            for key, value in self.element.attrs.items()
+        )
+        tag = self.soup.new_tag(self.element.name, self.namespace, attrs=attrs)
+        if (self.treebuilder is not None
+            and id(self.element) in self.treebuilder.matching_tags):
+            self.treebuilder.matching_tags[id(tag)] = tag
+        return Element(tag, self.soup, self.namespace, self.treebuilder)
 
     def hasContent(self):
         return self.element.contents
 
-    def getNameTuple(self):
-        if self.namespace == None:
-            return namespaces["html"], self.name
-        else:
-            return self.namespace, self.name
-
-    nameTuple = property(getNameTuple)
-
 class TextNode(Element):
     def __init__(self, element, soup):
-        treebuilder_base.Node.__init__(self, None)
+        self.name = None
+        self.parent = None
         self.element = element
         self.soup = soup
+        self.treebuilder = None
 
     def cloneNode(self):
         raise NotImplementedError
@@ -397,6 +397,10 @@ class HTMLParserTreeBuilder(HTMLTreeBuilder):
         parser.soup = self.soup
         try:
             parser.feed(markup)
+            # If html.parser is still waiting for the end of a tag,
+            # comment or declaration, close() will treat it as text.
+            # BeautifulSoup.reparse_range() needs to know this.
+            self.soup._unfinished_markup = bool(parser.rawdata)
             parser.close()
         except HTMLParseError as e:
             warnings.warn(RuntimeWarning(
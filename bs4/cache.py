@@ -0,0 +1,313 @@
+"""A disk cache for parsed documents.
+
+Parsing a document is much more expensive than rebuilding a parse
+tree from a simple serialized form. If you need to process the same
+documents over and over again, a ParseCache will keep the parse trees
+on disk, keyed by a hash of the markup and the parser configuration.
+"""
+
+# Use of this source code is governed by the MIT license.
+__license__ = "MIT"
+
+__all__ = ['ParseCache']
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from bs4 import (
+    BeautifulSoup,
+    FeatureNotFound,
+    __version__,
+)
+from bs4.builder import builder_registry
+from bs4.element import (
+    NavigableString,
+    Tag,
+)
+
+
+class ParseCache(object):
+    """Maps markup to serialized parse trees stored in a directory.
+
+    The cache is keyed by a hash of the raw markup, the name of the
+    tree builder, any options passed into the BeautifulSoup
+    constructor, and the version of Beautiful Soup. When the total
+    size of the cached trees exceeds `max_bytes`, the least recently
+    used trees are removed.
+
+    The serialized form is a flat list of nodes, so unlike pickling a
+    BeautifulSoup object, it doesn't run into Python's recursion
+    limit on deeply nested documents.
+
+    Cached trees are stored as pickles, so only point a ParseCache at
+    a directory you trust.
+    """
+
+    # Bump this if the serialized format changes.
+    FORMAT_VERSION = 1
+
+    FILE_EXTENSION = '.soup'
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        """Constructor.
+
+        :param directory: Cached parse trees will be stored in this
+            directory. It will be created if it doesn't exist.
+        :param max_bytes: The maximum total size of the cached parse
+            trees.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def parse(self, markup, features=None, builder=None, **kwargs):
+        """Parse some markup, or load a previously cached parse tree
+        for the same markup.
+
+        The arguments are the same as for the BeautifulSoup
+        constructor. If you pass in a value for `parse_only`, the
+        markup is parsed as usual and nothing is cached.
+
+        :return: A BeautifulSoup object.
+        """
+        if hasattr(markup, 'read'):
+            markup = markup.read()
+        if kwargs.get('parse_only') is not None:
+            return BeautifulSoup(markup, features, builder, **kwargs)
+
+        key = self.key(markup, features, builder, **kwargs)
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                data = pickle.load(fh)
+        except Exception as e:
+            # A missing, truncated or otherwise unusable file is a
+            # cache miss.
+            data = None
+        if data is not None and data.get('format') == self.FORMAT_VERSION:
+            # Mark this tree as recently used.
+            try:
+                os.utime(path)
+            except OSError as e:
+                pass
+            self.hits += 1
+            return self.loads(data, features, builder, **kwargs)
+
+        self.misses += 1
+        soup = BeautifulSoup(markup, features, builder, **kwargs)
+        self._store(path, self.dumps(soup))
+        return soup
+
+    def key(self, markup, features=None, builder=None, **kwargs):
+        """Calculate the cache key for some markup and a parser
+        configuration.
+
+        :return: A hex digest.
+        """
+        if isinstance(markup, str):
+            markup_type = b's'
+            markup = markup.encode("utf8", "surrogatepass")
+        else:
+            markup_type = b'b'
+        if builder is None:
+            # Key on the tree builder the features pick out, so that
+            # "html" and "html.parser" share entries when they mean
+            # the same parser, and entries don't outlive a change in
+            # which parsers are installed.
+            if isinstance(features, str):
+                features = [features]
+            features = features or BeautifulSoup.DEFAULT_BUILDER_FEATURES
+            builder = builder_registry.lookup(*features)
+            if builder is None:
+                raise FeatureNotFound(
+                    "Couldn't find a tree builder with the features you "
+                    "requested: %s. Do you need to install a parser library?"
+                    % ",".join(features))
+        if isinstance(builder, type):
+            builder_class = builder
+        else:
+            builder_class = builder.__class__
+            # The builder's configuration is part of the key.
+            kwargs = dict(kwargs)
+            kwargs['builder_configuration'] = dict(
+                (k, v) for k, v in builder.__dict__.items()
+                if k != 'soup' and not k.startswith('_')
+            )
+        builder_name = '%s.%s' % (
+            builder_class.__module__, builder_class.__name__)
+
+        digest = hashlib.sha256()
+        for part in (
+                __version__, str(self.FORMAT_VERSION), builder_name,
+                _canonical(kwargs)
+        ):
+            digest.update(part.encode("utf8"))
+            digest.update(b'\0')
+        digest.update(markup_type)
+        digest.update(markup)
+        return digest.hexdigest()
+
+    def clear(self):
+        """Remove every cached parse tree."""
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                pass
+
+    @classmethod
+    def dumps(cls, soup):
+        """Convert a BeautifulSoup object into a simple data structure
+        that can be pickled without recursion.
+        """
+        nodes = []
+        for node in soup.descendants:
+            if isinstance(node, Tag):
+                sourceline, sourcepos = node._source_position()
+                nodes.append((
+                    node.__class__, node.name, node.namespace, node.prefix,
+                    node.attrs, sourceline, sourcepos,
+                    node._namespaces or None, len(node.contents)
+                ))
+            elif node.__class__ is NavigableString:
+                nodes.append(str(node))
+            else:
+                nodes.append((node.__class__, str(node)))
+        return dict(
+            format=cls.FORMAT_VERSION,
+            original_encoding=soup.original_encoding,
+            declared_html_encoding=soup.declared_html_encoding,
+            contains_replacement_characters=soup.contains_replacement_characters,
+            namespaces=soup._namespaces,
+            size=len(soup.contents),
+            nodes=nodes,
+        )
+
+    @classmethod
+    def loads(cls, data, features=None, builder=None, **kwargs):
+        """Rebuild a BeautifulSoup object from the output of dumps()."""
+        # There's no markup to detect the encoding of.
+        kwargs.pop('from_encoding', None)
+        soup = BeautifulSoup("", features, builder, **kwargs)
+        builder = soup.builder
+        soup.original_encoding = data['original_encoding']
+        soup.declared_html_encoding = data['declared_html_encoding']
+        soup.contains_replacement_characters = data[
+            'contains_replacement_characters']
+        soup._namespaces.update(data['namespaces'])
+
+        # The nodes are in document order, so each node's
+        # previous_element is the node before it, and its parent is the
+        # innermost tag that still has children to come.
+        parent = soup
+        remaining = data['size']
+        stack = []
+        previous = soup
+        for record in data['nodes']:
+            while remaining == 0:
+                parent, remaining = stack.pop()
+            if isinstance(record, str):
+                node = NavigableString(record)
+                children = 0
+            elif len(record) == 2:
+                node_class, value = record
+                node = node_class(value)
+                children = 0
+            else:
+                (node_class, name, namespace, prefix, attrs, sourceline,
+                 sourcepos, namespaces, children) = record
+                node = node_class(
+                    soup, builder, name, namespace, prefix, attrs,
+                    sourceline=sourceline, sourcepos=sourcepos,
+                    namespaces=namespaces
+                )
+            node.setup(parent, previous)
+            parent.contents.append(node)
+            previous = node
+            remaining -= 1
+            if children:
+                stack.append((parent, remaining))
+                parent, remaining = node, children
+        return soup
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.FILE_EXTENSION)
+
+    def _entries(self):
+        """Find all the cached parse trees."""
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError as e:
+            return []
+        return [
+            entry for entry in entries
+            if entry.name.endswith(self.FILE_EXTENSION) and entry.is_file()
+        ]
+
+    def _store(self, path, data):
+        """Write a serialized parse tree to disk, then evict the least
+        recently used trees until the cache is small enough.
+        """
+        serialized = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        if len(serialized) > self.max_bytes:
+            # This tree would push everything else out of the cache.
+            return
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(serialized)
+            os.replace(temp_path, path)
+        except OSError as e:
+            try:
+                os.remove(temp_path)
+            except OSError as e:
+                pass
+            return
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        """Remove least recently used parse trees until the cache is
+        no bigger than max_bytes.
+        """
+        entries = []
+        total = 0
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                continue
+            entries.append((stat.st_mtime, entry.path, stat.st_size))
+            total += stat.st_size
+        entries.sort()
+        for mtime, path, size in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                continue
+            total -= size
+
+
+def _canonical(value):
+    """Make a string representation of an option value that doesn't
+    depend on set or dictionary ordering.
+    """
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(sorted(
+            '%s: %s' % (_canonical(k), _canonical(v))
+            for k, v in value.items()
+        ))
+    if isinstance(value, (set, frozenset)):
+        return '{%s}' % ', '.join(sorted(_canonical(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join(_canonical(v) for v in value)
+    if isinstance(value, type):
+        return '%s.%s' % (value.__module__, value.__qualname__)
+    return repr(value)
@@ -0,0 +1,1230 @@
+"""A compact, read-only representation of a parse tree.
+
+A ColumnarDocument stores the structure of a parse tree in a handful
+of integer arrays, one entry per node, with the nodes in document
+order. All the text lives in a single string. This takes up a small
+fraction of the memory needed by a tree of Tag and NavigableString
+objects, and questions like "how many <a> tags are there?" can be
+answered by scanning an array instead of walking the tree.
+
+Tag and NavigableString objects are created on demand, as proxies for
+nodes in the document. They support the usual navigation and search
+API, but they can't be modified. Copying a proxy with copy.copy()
+gives you an ordinary Tag or NavigableString.
+
+Nothing in a ColumnarDocument ever changes, so it can be shared between
+threads without locking, and things worked out from it, like tag name
+indexes and hash values, are kept around for next time.
+BeautifulSoup.freeze() turns a document into a ColumnarDocument and
+returns the read-only root.
+
+A document keeps a single copy of its text. A string's proxy is only
+created when something asks for it; get_text() and output methods
+like decode() and prettify() copy text straight out of the document.
+
+A document can be copied into a block of shared memory with share(),
+and other processes can use it, without parsing the markup or copying
+the arrays, by calling ColumnarDocument.attach() with the block's name.
+"""
+
+# Use of this source code is governed by the MIT license.
+__license__ = "MIT"
+
+__all__ = ['ColumnarDocument']
+
+from array import array
+from bisect import (
+    bisect_left,
+    bisect_right,
+)
+from collections import Counter
+from operator import countOf
+import pickle
+import re
+import struct
+import threading
+from types import MappingProxyType
+import sys
+import weakref
+
+try:
+    import numpy
+except ImportError as e:
+    numpy = None
+
+try:
+    from multiprocessing import shared_memory
+except ImportError as e:
+    # Python 3.7 and earlier.
+    shared_memory = None
+
+from bs4 import BeautifulSoup
+from bs4.element import (
+    DEFAULT_OUTPUT_ENCODING,
+    NavigableString,
+    PageElement,
+    PreformattedString,
+    ResultSet,
+    SoupStrainer,
+    Tag,
+)
+from bs4.formatter import Formatter
+from bs4.lite import (
+    LiteSoup,
+    LiteTag,
+    _lite_class,
+)
+
+
+class ColumnarDocument(object):
+    """A parse tree stored in arrays.
+
+    Node 0 is the document itself. Nodes are numbered in document
+    order, so the descendants of node i are the nodes from i+1 up to
+    (but not including) end[i]. These arrays describe the nodes:
+
+    * parent: The parent node, or -1.
+    * depth: The number of ancestors the node has.
+    * end: One past the node's last descendant.
+    * next_sibling, previous_sibling: The adjacent nodes with the
+      same parent, or -1.
+    * name_id: For a tag, an index into `qualified_names`, a list of
+      (name, namespace, prefix) 3-tuples. For a string, -1.
+    * type_id: For a tag, an index into a table of Tag classes and
+      settings. For a string, an index into a table of NavigableString
+      classes.
+    * attribute_start: The tag's attributes are entries
+      attribute_start[i] through attribute_start[i+1]-1 of
+      `attribute_name_ids` and `attribute_value_ids`. This array has
+      one extra entry at the end.
+    * text_start: A string's text is text[text_start[i]:text_start[i+1]].
+      This array also has one extra entry at the end.
+    * sourceline, sourcepos: Where the tag was found in the source
+      document, or -1.
+
+    A node's first child, if it has one, is node i+1.
+    """
+
+    # The signed integer type used for the arrays.
+    TYPECODE = 'i'
+
+    COLUMNS = (
+        'parent', 'depth', 'end', 'next_sibling', 'previous_sibling',
+        'name_id', 'type_id', 'attribute_start', 'text_start',
+        'sourceline', 'sourcepos', 'attribute_name_ids',
+        'attribute_value_ids',
+    )
+
+    # The start of a document in shared memory: a marker, a format
+    # version, and the length of the pickled metadata that follows.
+    SHARED_MAGIC = b'BS4COLUMNS'
+    SHARED_FORMAT_VERSION = 1
+    SHARED_HEADER = struct.Struct('<10sBxxxxxQ')
+
+    def __init__(self, soup):
+        """Constructor.
+
+        :param soup: A BeautifulSoup object. Its tree is copied into
+            the new document; the BeautifulSoup object itself is not
+            changed or kept around.
+        """
+        self.is_xml = soup.is_xml
+        self.original_encoding = soup.original_encoding
+        self.declared_html_encoding = soup.declared_html_encoding
+        self.contains_replacement_characters = soup.contains_replacement_characters
+        self.namespaces = dict(soup._namespaces)
+        # Kept for snapshot(), so new tags can be created.
+        self.builder = getattr(soup, 'builder', None)
+        self._shared_memory = None
+        self._build(soup)
+        self._set_up()
+
+    def _set_up(self):
+        """Create the caches used when navigating the document."""
+        # Figure out which class to use for each node's proxy.
+        self._proxy_classes = [
+            _proxy_class(entry[0] if isinstance(entry, tuple) else entry)
+            for entry in self._types
+        ]
+        self._proxies = weakref.WeakValueDictionary()
+        self._proxy_lock = threading.Lock()
+        self._tag_indexes = {}
+        self._hashes = {}
+
+    @classmethod
+    def parse(cls, markup, features=None, builder=None, **kwargs):
+        """Parse a document into a ColumnarDocument.
+
+        The document is parsed into an ordinary tree first, and then
+        copied, so while this runs there's a NavigableString for
+        every string as well as the document's own copy of the text.
+        It's the finished document that takes up less memory.
+
+        The arguments are the same as for the BeautifulSoup constructor.
+        """
+        return cls(BeautifulSoup(markup, features, builder, **kwargs))
+
+    def _build(self, soup):
+        for column in self.COLUMNS:
+            setattr(self, column, array(self.TYPECODE))
+        self.qualified_names = []
+        self.attribute_names = []
+        self.attribute_values = []
+        self._types = []
+        text = []
+        text_length = 0
+
+        qualified_name_ids = {}
+        attribute_name_ids = {}
+        attribute_value_ids = {}
+        type_ids = {}
+
+        # Local names for the columns.
+        parents = self.parent
+        depths = self.depth
+        ends = self.end
+        next_siblings = self.next_sibling
+        previous_siblings = self.previous_sibling
+        name_ids = self.name_id
+        node_type_ids = self.type_id
+        attribute_starts = self.attribute_start
+        text_starts = self.text_start
+        sourcelines = self.sourceline
+        sourceposes = self.sourcepos
+        attribute_name_column = self.attribute_name_ids
+        attribute_value_column = self.attribute_value_ids
+
+        # The most recent child added to each node.
+        last_child = []
+
+        def intern(table, ids, key, value):
+            i = ids.get(key)
+            if i is None:
+                i = ids[key] = len(table)
+                table.append(value)
+            return i
+
+        def add(node, parent_index, depth):
+            nonlocal text_length
+            index = len(parents)
+            parents.append(parent_index)
+            depths.append(depth)
+            ends.append(index + 1)
+            next_siblings.append(-1)
+            last_child.append(-1)
+            if parent_index >= 0:
+                previous = last_child[parent_index]
+                if previous >= 0:
+                    next_siblings[previous] = index
+                last_child[parent_index] = index
+            else:
+                previous = -1
+            previous_siblings.append(previous)
+            attribute_starts.append(len(attribute_name_column))
+            text_starts.append(text_length)
+
+            if isinstance(node, Tag):
+                name_ids.append(intern(
+                    self.qualified_names, qualified_name_ids,
+                    (node.name, node.namespace, node.prefix),
+                    (node.name, node.namespace, node.prefix)
+                ))
+                config = node._config
+                namespaces = node._namespaces
+                node_type_ids.append(intern(
+                    self._types, type_ids,
+                    (node.__class__, id(config), id(namespaces)),
+                    (node.__class__, config, namespaces)
+                ))
+                for key, value in node.attrs.items():
+                    attribute_name_column.append(intern(
+                        self.attribute_names, attribute_name_ids,
+                        (key.__class__, key, getattr(key, 'namespace', None)),
+                        key
+                    ))
+                    if isinstance(value, list):
+                        value = tuple(value)
+                    attribute_value_column.append(intern(
+                        self.attribute_values, attribute_value_ids,
+                        (value.__class__, value), value
+                    ))
+                sourceline, sourcepos = node._source_position()
+                sourcelines.append(-1 if sourceline is None else sourceline)
+                sourceposes.append(-1 if sourcepos is None else sourcepos)
+            else:
+                name_ids.append(-1)
+                node_type_ids.append(intern(
+                    self._types, type_ids, node.__class__, node.__class__
+                ))
+                value = str(node)
+                text.append(value)
+                text_length += len(value)
+                sourcelines.append(-1)
+                sourceposes.append(-1)
+            return index
+
+        # Walk the tree without recursion.
+        add(soup, -1, 0)
+        stack = [(0, iter(soup.contents))]
+        while stack:
+            parent_index, children = stack[-1]
+            for child in children:
+                index = add(child, parent_index, len(stack))
+                if isinstance(child, Tag) and child.contents:
+                    stack.append((index, iter(child.contents)))
+                    break
+            else:
+                stack.pop()
+                ends[parent_index] = len(parents)
+
+        attribute_starts.append(len(attribute_name_column))
+        text_starts.append(text_length)
+        self.text = ''.join(text)
+
+    def __len__(self):
+        """The number of nodes in the document, including the
+        document itself.
+        """
+        return len(self.parent)
+
+    @property
+    def nbytes(self):
+        """Roughly how much memory the document takes up, not counting
+        any proxy objects.
+        """
+        total = sys.getsizeof(self.text)
+        for column in self.COLUMNS:
+            values = getattr(self, column)
+            total += values.itemsize * len(values)
+        for table in (
+                self.qualified_names, self.attribute_names,
+                self.attribute_values, self._types
+        ):
+            total += sys.getsizeof(table)
+            total += sum(sys.getsizeof(x) for x in table)
+        return total
+
+    @property
+    def root(self):
+        """A proxy for the document itself."""
+        return self.node(0)
+
+    def node(self, index):
+        """Get a proxy for the node with the given index."""
+        proxy = self._proxies.get(index)
+        if proxy is None:
+            # Two threads must never create different proxies for the
+            # same node.
+            with self._proxy_lock:
+                proxy = self._proxies.get(index)
+                if proxy is None:
+                    proxy = self._new_proxy(index)
+                    self._proxies[index] = proxy
+        return proxy
+
+    def _new_proxy(self, index):
+        if index < 0 or index >= len(self.parent):
+            raise IndexError(index)
+        proxy_class = self._proxy_classes[self.type_id[index]]
+        if self.name_id[index] < 0:
+            start = self.text_start[index]
+            value = self.text[start:self.text_start[index + 1]]
+            proxy = str.__new__(proxy_class, value)
+        else:
+            proxy = proxy_class.__new__(proxy_class)
+            proxy._attrs = None
+            proxy._contents = None
+            if index == 0:
+                # The root proxy acts like a BeautifulSoup object.
+                proxy.is_xml = self.is_xml
+                proxy.builder = None
+                proxy.original_encoding = self.original_encoding
+                proxy.declared_html_encoding = self.declared_html_encoding
+                proxy.contains_replacement_characters = self.contains_replacement_characters
+        proxy._document = self
+        proxy._index = index
+        return proxy
+
+    def span(self, index):
+        """Find a node's text within `text`.
+
+        :return: A 2-tuple (start, end). For a string, text[start:end]
+           is the string. For a tag, it's the text of every string
+           inside the tag, comments and all, run together.
+        """
+        if index < 0 or index >= len(self.parent):
+            raise IndexError(index)
+        return self.text_start[index], self.text_start[self.end[index]]
+
+    def _attributes(self, index):
+        """Build a new dictionary of a tag's attributes."""
+        attribute_names = self.attribute_names
+        attribute_values = self.attribute_values
+        name_ids = self.attribute_name_ids
+        value_ids = self.attribute_value_ids
+        attrs = {}
+        for i in range(self.attribute_start[index],
+                       self.attribute_start[index + 1]):
+            value = attribute_values[value_ids[i]]
+            if isinstance(value, tuple):
+                value = list(value)
+            attrs[attribute_names[name_ids[i]]] = value
+        return attrs
+
+    def share(self, name=None):
+        """Copy this document into a new block of shared memory.
+
+        Other processes can then call ColumnarDocument.attach() to
+        use the document without copying it.
+
+        :param name: The name of the shared memory block. By default,
+           a unique name is chosen.
+        :return: A multiprocessing.shared_memory.SharedMemory. The
+           caller is responsible for calling its unlink() method once
+           no process needs the document any more.
+        """
+        if shared_memory is None:
+            raise NotImplementedError(
+                "Shared memory requires Python 3.8 or later.")
+        text_encoding, text_width = _text_encoding(self.text)
+        text = self.text.encode(text_encoding, 'surrogatepass')
+        metadata = pickle.dumps(dict(
+            is_xml=self.is_xml,
+            original_encoding=self.original_encoding,
+            declared_html_encoding=self.declared_html_encoding,
+            contains_replacement_characters=self.contains_replacement_characters,
+            namespaces=self.namespaces,
+            qualified_names=self.qualified_names,
+            attribute_names=self.attribute_names,
+            attribute_values=self.attribute_values,
+            types=self._types,
+            lengths=[len(getattr(self, column)) for column in self.COLUMNS],
+            text_encoding=text_encoding,
+            text_width=text_width,
+        ), pickle.HIGHEST_PROTOCOL)
+
+        # The columns start at an offset that's suitably aligned for
+        # their integer type.
+        itemsize = array(self.TYPECODE).itemsize
+        offset = _align(self.SHARED_HEADER.size + len(metadata), itemsize)
+        size = offset + len(text) + sum(
+            len(getattr(self, column)) * itemsize for column in self.COLUMNS)
+        block = shared_memory.SharedMemory(
+            name=name, create=True, size=max(size, 1))
+        buf = block.buf
+        buf[:self.SHARED_HEADER.size] = self.SHARED_HEADER.pack(
+            self.SHARED_MAGIC, self.SHARED_FORMAT_VERSION, len(metadata))
+        buf[self.SHARED_HEADER.size:self.SHARED_HEADER.size + len(metadata)] = metadata
+        for column in self.COLUMNS:
+            data = getattr(self, column).tobytes()
+            buf[offset:offset + len(data)] = data
+            offset += len(data)
+        buf[offset:offset + len(text)] = text
+        return block
+
+    @classmethod
+    def attach(cls, name):
+        """Use a document that another process put into shared memory
+        with share().
+
+        The arrays and text are used in place, not copied. Call
+        close() once you're done with the document.
+
+        :param name: The name of the shared memory block.
+        """
+        if shared_memory is None:
+            raise NotImplementedError(
+                "Shared memory requires Python 3.8 or later.")
+        try:
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError as e:
+            # Before Python 3.13, there's no way to stop this process
+            # from keeping track of the block.
+            block = shared_memory.SharedMemory(name=name)
+        buf = block.buf
+        header_size = cls.SHARED_HEADER.size
+        magic, version, metadata_length = cls.SHARED_HEADER.unpack_from(buf)
+        if magic != cls.SHARED_MAGIC or version != cls.SHARED_FORMAT_VERSION:
+            block.close()
+            raise ValueError(
+                "Shared memory block %s doesn't contain a document." % name)
+        metadata = pickle.loads(
+            buf[header_size:header_size + metadata_length])
+
+        self = cls.__new__(cls)
+        self._shared_memory = block
+        self.builder = None
+        for key in (
+                'is_xml', 'original_encoding', 'declared_html_encoding',
+                'contains_replacement_characters', 'namespaces',
+                'qualified_names', 'attribute_names', 'attribute_values',
+        ):
+            setattr(self, key, metadata[key])
+        self._types = metadata['types']
+
+        itemsize = array(cls.TYPECODE).itemsize
+        offset = _align(header_size + metadata_length, itemsize)
+        for column, length in zip(cls.COLUMNS, metadata['lengths']):
+            end = offset + length * itemsize
+            setattr(self, column, buf[offset:end].cast(cls.TYPECODE))
+            offset = end
+        self.text = _SharedText(
+            buf[offset:offset + self.text_start[-1] * metadata['text_width']],
+            metadata['text_encoding'], metadata['text_width']
+        )
+        self._set_up()
+        return self
+
+    def close(self):
+        """Stop using a document that was attached to shared memory.
+
+        Any proxies for the document's nodes become unusable.
+        """
+        if self._shared_memory is None:
+            return
+        for column in self.COLUMNS:
+            getattr(self, column).release()
+        self.text._buffer.release()
+        self._tag_indexes.clear()
+        self._proxies = weakref.WeakValueDictionary()
+        self._shared_memory.close()
+        self._shared_memory = None
+
+    def _snapshot_tag(self, index):
+        """Copy a tag for a snapshot, leaving its children to be copied
+        later.
+
+        This sets up the new Tag directly, rather than through the
+        constructor, since a snapshot may need to copy a lot of them
+        at once.
+        """
+        tag_class, config, namespaces = self._types[self.type_id[index]]
+        snapshot_class = _snapshot_class(tag_class)
+        tag = snapshot_class.__new__(snapshot_class)
+        tag._name, tag.namespace, tag.prefix = self.qualified_names[
+            self.name_id[index]]
+        tag.attrs = self._attributes(index)
+        tag._config = config
+        tag._namespaces = namespaces
+        sourceline = self.sourceline[index]
+        sourcepos = self.sourcepos[index]
+        if sourceline >= 0 or sourcepos >= 0:
+            tag.sourceline = None if sourceline < 0 else sourceline
+            tag.sourcepos = None if sourcepos < 0 else sourcepos
+        tag.parent = tag.previous_sibling = tag.next_sibling = None
+        if self.end[index] > index + 1:
+            tag._snapshot_source = (self, index)
+        else:
+            tag.contents = []
+        return tag
+
+    def _snapshot_children(self, parent, index):
+        """Copy the children of a node for a snapshot.
+
+        :param parent: The new parent of the copies.
+        :param index: The node whose children are copied.
+        :return: A list of lite PageElements.
+        """
+        ends = self.end
+        text = self.text
+        text_start = self.text_start
+        children = []
+        previous = None
+        child_index = index + 1
+        end = ends[index]
+        while child_index < end:
+            if self.name_id[child_index] < 0:
+                string_class = self._types[self.type_id[child_index]]
+                child = _lite_class(string_class)(
+                    text[text_start[child_index]:text_start[child_index + 1]])
+            else:
+                child = self._snapshot_tag(child_index)
+            child.parent = parent
+            child.previous_sibling = previous
+            if previous is not None:
+                previous.next_sibling = child
+            children.append(child)
+            previous = child
+            child_index = ends[child_index]
+        return children
+
+    def column(self, name):
+        """Get one of the arrays that describe the nodes.
+
+        :return: A NumPy array if NumPy is installed (this doesn't copy
+            the data), otherwise an array.array.
+        """
+        if name not in self.COLUMNS:
+            raise ValueError("Unknown column: %s" % name)
+        values = getattr(self, name)
+        if numpy is not None:
+            return numpy.frombuffer(values, dtype=self.TYPECODE)
+        return values
+
+    def _name_ids_for(self, name):
+        return [
+            i for i, (tag_name, namespace, prefix)
+            in enumerate(self.qualified_names)
+            if tag_name == name or (prefix and name == prefix + ':' + tag_name)
+        ]
+
+    def tag_indices(self, name=None):
+        """Find the indices of tags with the given name.
+
+        :param name: A tag name, optionally with a namespace prefix. If
+            this is None, all tags are found (except the document itself).
+        :return: A list of node indices, in document order.
+        """
+        if numpy is not None:
+            name_ids = self.column('name_id')
+            if name is None:
+                mask = name_ids >= 0
+            else:
+                mask = numpy.isin(name_ids, self._name_ids_for(name))
+            mask[0] = False
+            return numpy.flatnonzero(mask).tolist()
+        if name is None:
+            return [
+                i for i, name_id in enumerate(self.name_id)
+                if name_id >= 0 and i != 0
+            ]
+        ids = set(self._name_ids_for(name))
+        return [
+            i for i, name_id in enumerate(self.name_id)
+            if name_id in ids and i != 0
+        ]
+
+    def _tag_index(self, name):
+        """Like tag_indices(), but the answer is an array that's kept
+        around for the next time the same name is looked up.
+        """
+        indices = self._tag_indexes.get(name)
+        if indices is None:
+            indices = array(self.TYPECODE, self.tag_indices(name))
+            self._tag_indexes[name] = indices
+        return indices
+
+    def count(self, name=None):
+        """Count the tags with the given name.
+
+        :param name: A tag name, optionally with a namespace prefix. If
+            this is None, all tags are counted (except the document itself).
+        """
+        if name is None:
+            return len(self.name_id) - countOf(self.name_id, -1) - 1
+        # countOf() runs in C, so this is fast even without NumPy.
+        return sum(
+            countOf(self.name_id, i) for i in self._name_ids_for(name))
+
+    def find_all(self, name=None):
+        """Find all the tags with the given name.
+
+        :return: A list of proxy Tags, in document order.
+        """
+        return [self.node(i) for i in self._tag_index(name)]
+
+    def depth_histogram(self, name=None):
+        """Count how many tags there are at each depth in the tree.
+
+        :param name: Only count tags with this name.
+        :return: A dictionary mapping depth to number of tags. The
+            children of the document itself are at depth 1.
+        """
+        indices = self.tag_indices(name)
+        if numpy is not None:
+            depths = self.column('depth')[indices]
+            counts = numpy.bincount(depths)
+            return dict(
+                (depth, int(count)) for depth, count in enumerate(counts)
+                if count
+            )
+        depths = self.depth
+        return dict(Counter(depths[i] for i in indices))
+
+
+_surrogate = re.compile('[\ud800-\udfff]')
+
+def _align(offset, size):
+    """Round an offset up to a multiple of `size`."""
+    return (offset + size - 1) // size * size
+
+def _text_encoding(text):
+    """Choose a fixed-width encoding that can hold `text`, so that
+    character offsets can be turned into byte offsets.
+
+    :return: A 2-tuple (encoding, bytes per character).
+    """
+    largest = max(text) if text else ''
+    if largest < '\u0100':
+        return 'latin-1', 1
+    if largest < '\U00010000' and not _surrogate.search(text):
+        # Surrogates could pair up when decoded, so a document that
+        # contains them can't use UTF-16.
+        return 'utf-16-le', 2
+    return 'utf-32-le', 4
+
+
+class _SharedText(object):
+    """The text of a document in shared memory.
+
+    This acts enough like a string for ColumnarDocument's purposes:
+    slicing it decodes the characters in the slice.
+    """
+
+    def __init__(self, buffer, encoding, width):
+        self._buffer = buffer
+        self._encoding = encoding
+        self._width = width
+
+    def __len__(self):
+        return len(self._buffer) // self._width
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            key = slice(key, key + 1 if key != -1 else None)
+        start, stop, step = key.indices(len(self))
+        if step != 1:
+            return str(self)[key]
+        width = self._width
+        return str(
+            self._buffer[start * width:max(start, stop) * width],
+            self._encoding, 'surrogatepass'
+        )
+
+    def __str__(self):
+        return self[:]
+
+
+def _is_interesting(string_class, types):
+    """Is a string of the given class one of the `types` being looked
+    for by Tag.strings?
+
+    As in Tag._all_strings, the classes have to match exactly.
+    """
+    if types is None:
+        return True
+    if isinstance(types, type):
+        return string_class is types
+    return string_class in types
+
+
+def _read_only(self, *args, **kwargs):
+    raise TypeError("Elements of a ColumnarDocument can't be modified.")
+
+
+def _unpickled_copy(copy):
+    """Unpickle a copy of a proxy Tag. See _ColumnarTag.__reduce__."""
+    return copy
+
+
+class _ColumnarNode(object):
+    """Navigation for a proxy element in a ColumnarDocument."""
+
+    __slots__ = ()
+
+    def _node(self, column):
+        index = getattr(self._document, column)[self._index]
+        if index < 0:
+            return None
+        return self._document.node(index)
+
+    @property
+    def parent(self):
+        return self._node('parent')
+
+    @parent.setter
+    def parent(self, value):
+        _read_only(self)
+
+    @property
+    def next_sibling(self):
+        return self._node('next_sibling')
+
+    @next_sibling.setter
+    def next_sibling(self, value):
+        _read_only(self)
+
+    @property
+    def previous_sibling(self):
+        return self._node('previous_sibling')
+
+    @previous_sibling.setter
+    def previous_sibling(self, value):
+        _read_only(self)
+
+    @property
+    def next_element(self):
+        index = self._index + 1
+        if index == 1 or index >= len(self._document):
+            # As in a BeautifulSoup tree, the document isn't linked to
+            # its first element.
+            return None
+        return self._document.node(index)
+
+    @next_element.setter
+    def next_element(self, value):
+        _read_only(self)
+
+    @property
+    def previous_element(self):
+        index = self._index - 1
+        if index < 1:
+            return None
+        return self._document.node(index)
+
+    @previous_element.setter
+    def previous_element(self, value):
+        _read_only(self)
+
+    setup = replace_with = replaceWith = unwrap = replace_with_children = \
+        replaceWithChildren = wrap = extract = insert = append = extend = \
+        insert_before = insert_after = clear = smooth = decompose = \
+        _extract_children = __setitem__ = __delitem__ = _read_only
+
+
+class _ColumnarString(_ColumnarNode):
+    """A proxy NavigableString."""
+
+    __slots__ = ()
+
+    def __copy__(self):
+        # Make an ordinary string, not another proxy.
+        return self.__class__.__bases__[-1](str(self))
+
+    def __reduce__(self):
+        return (self.__class__.__bases__[-1], (str(self),))
+
+    def _all_strings(self, strip=False, types=PageElement.default):
+        if types is self.default:
+            types = Tag.DEFAULT_INTERESTING_STRING_TYPES
+        if not _is_interesting(self.__class__.__bases__[-1], types):
+            return
+        value = self
+        if strip:
+            value = value.strip()
+        if len(value) > 0:
+            yield value
+    strings = property(_all_strings)
+
+
+class _ColumnarTag(_ColumnarNode):
+    """A proxy Tag."""
+
+    __slots__ = ()
+
+    def _column(self, column):
+        return getattr(self._document, column)[self._index]
+
+    def _qualified_name(self):
+        return self._document.qualified_names[self._column('name_id')]
+
+    @property
+    def name(self):
+        return self._qualified_name()[0]
+
+    @name.setter
+    def name(self, value):
+        _read_only(self)
+
+    @property
+    def namespace(self):
+        return self._qualified_name()[1]
+
+    @property
+    def prefix(self):
+        return self._qualified_name()[2]
+
+    @property
+    def _config(self):
+        return self._document._types[self._column('type_id')][1]
+
+    @_config.setter
+    def _config(self, value):
+        _read_only(self)
+
+    @property
+    def _namespaces(self):
+        return self._document._types[self._column('type_id')][2]
+
+    @property
+    def sourceline(self):
+        value = self._column('sourceline')
+        return None if value < 0 else value
+
+    @property
+    def sourcepos(self):
+        value = self._column('sourcepos')
+        return None if value < 0 else value
+
+    def _source_position(self):
+        return self.sourceline, self.sourcepos
+
+    @property
+    def attrs(self):
+        if self._attrs is None:
+            self._attrs = MappingProxyType(
+                self._document._attributes(self._index))
+        return self._attrs
+
+    @attrs.setter
+    def attrs(self, value):
+        _read_only(self)
+
+    def _child_indices(self):
+        ends = self._document.end
+        index = self._index + 1
+        end = ends[self._index]
+        while index < end:
+            yield index
+            index = ends[index]
+
+    @property
+    def contents(self):
+        if self._contents is None:
+            node = self._document.node
+            self._contents = tuple(
+                node(index) for index in self._child_indices())
+        return self._contents
+
+    @contents.setter
+    def contents(self, value):
+        _read_only(self)
+
+    @property
+    def is_empty_element(self):
+        index = self._index
+        return (self._document.end[index] == index + 1
+                and self.can_be_empty_element)
+    isSelfClosing = is_empty_element
+
+    def __len__(self):
+        count = 0
+        for index in self._child_indices():
+            count += 1
+        return count
+
+    @property
+    def descendants(self):
+        node = self._document.node
+        for index in range(self._index + 1, self._document.end[self._index]):
+            yield node(index)
+
+    def _string_indices(self, types):
+        """Find the descendants that are interesting strings."""
+        if types is self.default:
+            types = self.interesting_string_types
+        document = self._document
+        name_ids = document.name_id
+        type_ids = document.type_id
+        string_types = document._types
+        for index in range(self._index + 1, document.end[self._index]):
+            if (name_ids[index] < 0
+                and _is_interesting(string_types[type_ids[index]], types)):
+                yield index
+
+    def _all_strings(self, strip=False, types=PageElement.default):
+        node = self._document.node
+        for index in self._string_indices(types):
+            descendant = node(index)
+            if strip:
+                descendant = descendant.strip()
+                if len(descendant) == 0:
+                    continue
+            yield descendant
+    strings = property(_all_strings)
+
+    def get_text(self, separator="", strip=False,
+                 types=PageElement.default):
+        # The text is sliced straight out of the document, without
+        # creating proxy objects.
+        document = self._document
+        text = document.text
+        text_start = document.text_start
+        pieces = []
+        for index in self._string_indices(types):
+            piece = text[text_start[index]:text_start[index + 1]]
+            if strip:
+                piece = piece.strip()
+                if len(piece) == 0:
+                    continue
+            pieces.append(piece)
+        return separator.join(pieces)
+    getText = get_text
+    text = property(get_text)
+
+    def decode_contents(self, indent_level=None,
+                       eventual_encoding=DEFAULT_OUTPUT_ENCODING,
+                       formatter="minimal"):
+        # Like Tag.decode_contents, but strings are formatted straight
+        # out of the document's text, without creating proxy objects,
+        # unless their class has its own idea of how to be output.
+        if not isinstance(formatter, Formatter):
+            formatter = self.formatter_for_name(formatter)
+        document = self._document
+        text = document.text
+        text_start = document.text_start
+        name_ids = document.name_id
+        type_ids = document.type_id
+        string_types = document._types
+
+        pretty_print = (indent_level is not None)
+        preserve_whitespace = (
+            self.preserve_whitespace_tags and self.name in self.preserve_whitespace_tags
+        )
+        # This is what Formatter.substitute() would do to a string
+        # inside this tag.
+        fast = formatter.__class__.substitute is Formatter.substitute
+        substitute = formatter.entity_substitution
+        if self.name in formatter.cdata_containing_tags:
+            substitute = None
+        s = []
+        for index in self._child_indices():
+            if name_ids[index] >= 0:
+                s.append(document.node(index).decode(
+                    indent_level, eventual_encoding, formatter))
+                continue
+            string_class = string_types[type_ids[index]]
+            output_ready = string_class.output_ready
+            if fast and output_ready is NavigableString.output_ready:
+                value = text[text_start[index]:text_start[index + 1]]
+                if substitute:
+                    value = substitute(value)
+                value = string_class.PREFIX + value + string_class.SUFFIX
+            elif fast and output_ready is PreformattedString.output_ready:
+                value = text[text_start[index]:text_start[index + 1]]
+                value = string_class.PREFIX + value + string_class.SUFFIX
+            else:
+                value = document.node(index).output_ready(formatter)
+            if value and indent_level and not preserve_whitespace:
+                value = value.strip()
+            if value:
+                if pretty_print and not preserve_whitespace:
+                    s.append(formatter.indent * (indent_level - 1))
+                s.append(value)
+                if pretty_print and not preserve_whitespace:
+                    s.append("\n")
+        return ''.join(s)
+
+    def find_all(self, name=None, attrs={}, recursive=True, string=None,
+                 limit=None, **kwargs):
+        # A search for tags by name alone is answered from the
+        # document's index of tag names.
+        if (recursive and isinstance(name, str) and not attrs
+            and string is None and not kwargs):
+            document = self._document
+            indices = document._tag_index(name)
+            start = bisect_right(indices, self._index)
+            end = bisect_left(indices, document.end[self._index])
+            if limit:
+                end = min(end, start + limit)
+            return ResultSet(
+                SoupStrainer(name),
+                [document.node(index) for index in indices[start:end]]
+            )
+        return super(_ColumnarTag, self).find_all(
+            name, attrs, recursive, string, limit, **kwargs)
+    findAll = findChildren = find_all
+
+    # Proxies come and go, so hashes are remembered by the document.
+    def _cached_hash(self):
+        return self._document._hashes.get(self._index)
+
+    def _cache_hash(self, value):
+        self._document._hashes[self._index] = value
+
+    def _last_descendant(self, is_initialized=True, accept_self=True):
+        index = self._document.end[self._index] - 1
+        if index == self._index and not accept_self:
+            return None
+        return self._document.node(index)
+    _lastRecursiveChild = _last_descendant
+
+    def _clone(self, base=None):
+        # Make an ordinary Tag, not another proxy.
+        if base is None:
+            base = self.__class__.__bases__[-1]
+            if issubclass(base, BeautifulSoup):
+                base = Tag
+        clone = base(
+            None, None, self.name, self.namespace, self.prefix,
+            None, is_xml=self._is_xml, sourceline=self.sourceline,
+            sourcepos=self.sourcepos,
+            can_be_empty_element=self.can_be_empty_element,
+            cdata_list_attributes=self.cdata_list_attributes,
+            preserve_whitespace_tags=self.preserve_whitespace_tags,
+            interesting_string_types=self.interesting_string_types,
+            namespaces=self._namespaces
+        )
+        for key, value in self.attrs.items():
+            if isinstance(value, list):
+                value = list(value)
+            clone.attrs[key] = value
+        clone.parser_class = self.parser_class
+        clone.hidden = self.hidden
+        return clone
+
+    def __copy__(self):
+        if self._index == 0:
+            # There's no tree builder to make an ordinary
+            # BeautifulSoup object with.
+            return self.snapshot()
+        return super(_ColumnarTag, self).__copy__()
+
+    def __deepcopy__(self, memo):
+        # A copy never shares anything with the document.
+        return self.__copy__()
+
+    def __reduce__(self):
+        # The proxy classes can't be found by name, so pickle a copy.
+        return (_unpickled_copy, (self.__copy__(),))
+
+    def __getattr__(self, name):
+        # If a proxy hasn't been set up, looking for its state as a
+        # tag name would need that same state.
+        if name.startswith('_') and name not in ('_hash', '_child_positions'):
+            raise AttributeError(
+                "'%s' object has no attribute '%s'" % (self.__class__, name))
+        return super(_ColumnarTag, self).__getattr__(name)
+
+    def new_tag(self, *args, **kwargs):
+        raise TypeError(
+            "A frozen document can't create new elements. Call snapshot()"
+            " to get a copy that can be modified."
+        )
+    new_string = new_tag
+
+    def freeze(self):
+        # This is already read-only.
+        return self
+
+    def snapshot(self):
+        """Make a modifiable copy of this element.
+
+        Elements are copied out of the document only when they're
+        reached: a tag's children are copied the first time its
+        .contents are used. Making a snapshot and changing a small
+        part of it costs about the same no matter how big the
+        document is.
+
+        The copy is made of lite elements (see bs4.lite), so
+        .next_element and .previous_element don't have to be set up
+        for elements that haven't been copied yet.
+
+        :return: A BeautifulSoup object if this is the document
+            itself, otherwise a Tag.
+        """
+        document = self._document
+        if self._index != 0:
+            return document._snapshot_tag(self._index)
+        soup = _SnapshotSoup.__new__(_SnapshotSoup)
+        Tag.__init__(
+            soup, None, None, self.name, is_xml=self.is_xml,
+            can_be_empty_element=self.can_be_empty_element,
+            cdata_list_attributes=self.cdata_list_attributes,
+            preserve_whitespace_tags=self.preserve_whitespace_tags,
+            interesting_string_types=self.interesting_string_types,
+        )
+        soup.hidden = 1
+        soup._namespaces = dict(document.namespaces)
+        soup.element_classes = {Tag: LiteTag}
+        soup.builder = document.builder
+        soup.is_xml = soup.known_xml = self.is_xml
+        soup.parse_only = None
+        soup.markup = None
+        soup.original_encoding = self.original_encoding
+        soup.declared_html_encoding = self.declared_html_encoding
+        soup.contains_replacement_characters = self.contains_replacement_characters
+        soup.current_data = []
+        soup.currentTag = None
+        soup.tagStack = []
+        soup.open_tag_counter = Counter()
+        soup.preserve_whitespace_tag_stack = []
+        soup.string_container_stack = []
+        soup._most_recent_element = None
+        if len(document) > 1:
+            soup._snapshot_source = (document, 0)
+        return soup
+
+
+class _SnapshotTag(object):
+    """A Tag made by snapshot(), whose children may not have been
+    copied out of the ColumnarDocument yet.
+    """
+
+    __slots__ = ()
+
+    # The document and the index of the node whose children this Tag
+    # will get, or None once they've been copied.
+    _snapshot_source = None
+
+    @property
+    def contents(self):
+        source = self._snapshot_source
+        if source is not None:
+            self._snapshot_source = None
+            document, index = source
+            Tag.contents.__set__(
+                self, document._snapshot_children(self, index))
+        return Tag.contents.__get__(self, Tag)
+
+    @contents.setter
+    def contents(self, value):
+        self._snapshot_source = None
+        Tag.contents.__set__(self, value)
+
+    def __getstate__(self):
+        # Make sure the children are part of the state.
+        self.contents
+        return super(_SnapshotTag, self).__getstate__()
+
+
+class _SnapshotSoup(_SnapshotTag, LiteSoup):
+    """A BeautifulSoup object made by snapshot()."""
+
+    def __copy__(self):
+        if self.builder is None:
+            # There's no tree builder to make an ordinary copy with.
+            return self.freeze().snapshot()
+        return super(_SnapshotSoup, self).__copy__()
+
+
+_proxy_classes = {}
+
+def _proxy_class(base):
+    """Find or create the proxy class for a Tag or NavigableString
+    subclass.
+    """
+    proxy_class = _proxy_classes.get(base)
+    if proxy_class is None:
+        if issubclass(base, NavigableString):
+            proxy_class = type(
+                'Columnar' + base.__name__, (_ColumnarString, base),
+                dict(_wrapped_class=base)
+            )
+        else:
+            proxy_class = type(
+                'Columnar' + base.__name__, (_ColumnarTag, base),
+                dict(__slots__=('_document', '_index', '_attrs', '_contents'))
+            )
+        _proxy_classes[base] = proxy_class
+    return proxy_class
+
+
+_snapshot_classes = {}
+
+def _snapshot_class(base):
+    """Find or create the class used by snapshot() for a Tag subclass."""
+    snapshot_class = _snapshot_classes.get(base)
+    if snapshot_class is None:
+        if issubclass(base, _SnapshotTag):
+            return base
+        snapshot_class = type(
+            'Snapshot' + base.__name__, (_SnapshotTag, _lite_class(base)),
+            dict(__slots__=('_snapshot_source',))
+        )
+        _snapshot_classes[base] = snapshot_class
+    return snapshot_class
+
+# Create the snapshot version of Tag up front, so that it can be found
+# by name when a tree is unpickled.
+SnapshotTag = _snapshot_class(Tag)
@@ -3,6 +3,7 @@
 # Use of this source code is governed by the MIT license.
 __license__ = "MIT"
 
+import copy
 import cProfile
 from io import BytesIO
 from html.parser import HTMLParser
@@ -229,6 +230,163 @@ def benchmark_parsers(num_elements=100000):
     b = time.time()
     print(("Raw html5lib parsed the markup in %.2fs." % (b-a)))
 
+def benchmark_tree_construction(num_elements=100000):
+    """Compare the cost of parsing a document with the cost of just
+    building its tree, by replaying the tree builder's recorded events.
+    """
+    from bs4.replay import RecordingSoup, replay
+    print(("Tree construction benchmark on Beautiful Soup %s" % __version__))
+    data = rdoc(num_elements)
+    print(("Generated a large invalid HTML document (%d bytes)." % len(data)))
+
+    for parser in ["lxml", "html.parser"]:
+        try:
+            a = time.time()
+            log = RecordingSoup(data, parser).event_log
+            b = time.time()
+            replay(log, parser)
+            c = time.time()
+        except Exception as e:
+            print(("%s could not parse the markup." % parser))
+            traceback.print_exc()
+            continue
+        print(("BS4+%s parsed and recorded the markup in %.2fs; replaying the %d-byte event log took %.2fs." % (parser, b-a, len(log), c-b)))
+
+def benchmark_html5lib(num_elements=100000, other_version=None):
+    """Measure how much time Beautiful Soup adds to html5lib, by
+    comparing it with html5lib's own ElementTree tree builder.
+
+    :param other_version: The directory containing another copy of
+        the bs4 package, such as an unpacked earlier release. If
+        this is given, the same document is also parsed with that
+        version's html5lib tree builder, in a separate process.
+    """
+    import html5lib
+    print(("html5lib tree builder benchmark on Beautiful Soup %s" % __version__))
+    data = rdoc(num_elements)
+    print(("Generated a large invalid HTML document (%d bytes)." % len(data)))
+
+    a = time.time()
+    html5lib.parse(data, treebuilder="etree")
+    b = time.time()
+    BeautifulSoup(data, "html5lib")
+    c = time.time()
+    print(("html5lib built an ElementTree in %.2fs; BS4+html5lib built a Beautiful Soup tree in %.2fs." % (b-a, c-b)))
+
+    if other_version is None:
+        return
+    import subprocess
+    script = (
+        "import sys, time, bs4\n"
+        "data = open(sys.argv[1]).read()\n"
+        "a = time.time()\n"
+        "bs4.BeautifulSoup(data, 'html5lib')\n"
+        "print(bs4.__version__, time.time() - a)\n"
+    )
+    with tempfile.NamedTemporaryFile('w', suffix='.html') as f:
+        f.write(data)
+        f.flush()
+        env = dict(os.environ, PYTHONPATH=other_version)
+        output = subprocess.check_output(
+            [sys.executable, '-c', script, f.name], env=env,
+            cwd=other_version, universal_newlines=True
+        )
+    version, seconds = output.split()
+    print(("BS4 %s+html5lib built the same tree in %.2fs." % (version, float(seconds))))
+
+def benchmark_memory(num_elements=100000, parser="html.parser"):
+    """Measure how much memory a parse tree takes up, per node."""
+    import tracemalloc
+    print(("Memory benchmark on Beautiful Soup %s" % __version__))
+    data = rdoc(num_elements)
+    print(("Generated a large invalid HTML document (%d bytes)." % len(data)))
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        soup = BeautifulSoup(data, parser)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    tags = strings = 0
+    for node in soup.descendants:
+        if isinstance(node, bs4.element.Tag):
+            tags += 1
+        else:
+            strings += 1
+    print(("BS4+%s built a tree of %d tags and %d strings in %d bytes (%.1f bytes per node)." % (parser, tags, strings, after-before, (after-before) / float(tags+strings))))
+
+    # Compare the Tags with the instance dictionaries they had before
+    # Tag used __slots__.
+    tag_list = soup.find_all(True)
+    slotted = sum(sys.getsizeof(tag) for tag in tag_list)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        unslotted = [_UnslottedTag(tag) for tag in tag_list]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    dict_layout = after - before - sys.getsizeof(unslotted)
+    print(("The Tag objects take up %d bytes (%.1f bytes per tag). With an instance dictionary they would take %d bytes (%.1f bytes per tag)." % (slotted, slotted / float(len(tag_list)), dict_layout, dict_layout / float(len(tag_list)))))
+
+    from bs4.columnar import ColumnarDocument
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        document = ColumnarDocument(soup)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    print(("The same tree as a ColumnarDocument takes up %d bytes (%.1f bytes per node)." % (after-before, (after-before) / float(len(document)))))
+
+class _UnslottedTag(object):
+    """Has the same attributes a Tag used to keep in its instance
+    dictionary, for comparison in benchmark_memory().
+    """
+
+    def __init__(self, tag):
+        self.parser_class = tag.parser_class
+        self.name = tag.name
+        self.namespace = tag.namespace
+        self._namespaces = tag._namespaces or {}
+        self.prefix = tag.prefix
+        self.sourceline, self.sourcepos = tag._source_position()
+        self.known_xml = tag.known_xml
+        self.attrs = tag.attrs
+        self.contents = tag.contents
+        self.parent = tag.parent
+        self.previous_element = tag.previous_element
+        self.next_element = tag.next_element
+        self.next_sibling = tag.next_sibling
+        self.previous_sibling = tag.previous_sibling
+        self.hidden = tag.hidden
+        self.can_be_empty_element = tag.can_be_empty_element
+        self.cdata_list_attributes = tag.cdata_list_attributes
+        self.preserve_whitespace_tags = tag.preserve_whitespace_tags
+        self.interesting_string_types = tag.interesting_string_types
+
+def benchmark_deep_trees(depth=20000, parser="html.parser"):
+    """Time copying and comparing a very deeply nested tree, like the
+    ones built from documents with lots of unclosed tags.
+    """
+    print(("Deep tree benchmark on Beautiful Soup %s" % __version__))
+    data = "<div><b>%s" % rsentence() * depth
+    soup = BeautifulSoup(data, parser)
+    print(("Built a tree %d tags deep." % (depth * 2)))
+
+    a = time.time()
+    soup_copy = copy.copy(soup)
+    b = time.time()
+    tag_copy = copy.copy(soup.div)
+    c = time.time()
+    assert soup == soup_copy
+    d = time.time()
+    assert soup.div == tag_copy
+    e = time.time()
+    print(("Copied the whole document in %.2fs and its top tag in %.2fs." % (b-a, c-b)))
+    print(("Compared the document with its copy in %.2fs, and the tag with its copy in %.2fs." % (d-c, e-d)))
+
 def profile(num_elements=100000, parser="lxml"):
     """Use Python's profiler on a randomly generated document."""
     filehandle = tempfile.NamedTemporaryFile()
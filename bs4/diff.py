@@ -0,0 +1,592 @@
+"""Find the differences between two parse trees, and apply them.
+
+diff() compares two versions of a document and produces an edit
+script: a list of the insertions, deletions, moves, attribute changes
+and text changes that turn the old tree into the new one. Every
+element is first given a key that sums up its subtree, in one pass
+over each tree. Unchanged subtrees are recognized by their keys, so
+they don't need to be examined in detail, and when most of a document
+is unchanged, the rest of the work depends mainly on the size of the
+parts that changed.
+
+apply_patch() performs the edits in an edit script.
+
+Each edit is a tuple. The first item says what kind of edit it is,
+and the second is the path to the element being changed: a list of
+indexes into .contents, starting from the root of the tree.
+
+* ('insert', path, element): Insert a copy of `element` so that it
+  ends up at `path`.
+* ('delete', path): Remove the element at `path`.
+* ('move', path, new_path): Move the element at `path` so that it
+  ends up at `new_path`. `new_path` is looked up after the element
+  has been removed from its old location.
+* ('update_attr', path, key, value): Set an attribute of the Tag at
+  `path`. If `value` is None, the attribute is removed.
+* ('update_text', path, text): Replace the string at `path` with a
+  string of the same class containing `text`.
+
+The paths in an edit script take into account the edits that come
+before them, so the edits must be applied in order.
+"""
+
+# Use of this source code is governed by the MIT license.
+__license__ = "MIT"
+
+__all__ = [
+    'apply_patch',
+    'diff',
+]
+
+import bisect
+import copy
+from difflib import SequenceMatcher
+
+from bs4.element import (
+    BatchEdit,
+    Tag,
+    _attribute_hash,
+)
+
+INSERT = 'insert'
+DELETE = 'delete'
+MOVE = 'move'
+UPDATE_ATTR = 'update_attr'
+UPDATE_TEXT = 'update_text'
+
+# Gaps in a list of children smaller than this (measured as the
+# product of the old and new lengths) are compared with
+# SequenceMatcher.
+SMALL_GAP = 2500
+
+
+def _string_class(string):
+    """Find the class of a string, looking through the wrapper
+    classes created by bs4.lite and bs4.columnar.
+    """
+    cls = string.__class__
+    return getattr(cls, '_wrapped_class', None) or cls
+
+
+def _keys(top, keys):
+    """Describe `top` and every element beneath it, so that elements
+    with the same key are the same.
+
+    A string is described by its class and its text, so that turning
+    text into a Comment counts as a change, even though the two Tags
+    would be equal. A Tag is described by a hash of its name, its
+    attributes and the keys of its children. The Tags' own hashes
+    can't be used, since they leave out the attributes of
+    descendants.
+
+    :param keys: A dictionary to fill in, mapping the id() of each
+        element to its key.
+    """
+    if not isinstance(top, Tag):
+        keys[id(top)] = (False, _string_class(top), str(top))
+        return
+    stack = [(top, iter(top.contents), [])]
+    while stack:
+        tag, children, child_keys = stack[-1]
+        for child in children:
+            if isinstance(child, Tag):
+                stack.append((child, iter(child.contents), []))
+                break
+            key = keys[id(child)] = (False, _string_class(child), str(child))
+            child_keys.append(key)
+        else:
+            stack.pop()
+            key = keys[id(tag)] = (True, hash(
+                (tag.name, _attribute_hash(tag.attrs), tuple(child_keys))
+            ))
+            if stack:
+                stack[-1][2].append(key)
+
+
+def _similar(old, new):
+    """Can `old` be turned into `new` by editing it, rather than
+    replacing it?
+    """
+    if isinstance(old, Tag):
+        return isinstance(new, Tag) and old.name == new.name
+    return (not isinstance(new, Tag)
+            and _string_class(old) is _string_class(new))
+
+
+def _matches(a, b):
+    """Find a long sequence of items that appear in the same order in
+    two lists.
+
+    This is patience diff: the items that appear exactly once in
+    each list are used as anchors, and the gaps between them are
+    examined in turn. SequenceMatcher is only used on small gaps,
+    since it can be very slow on long lists with many repeated items
+    (like the whitespace between tags).
+
+    :return: A list of (index into a, index into b) pairs, in order.
+    """
+    matches = []
+    ranges = [(0, len(a), 0, len(b))]
+    while ranges:
+        alo, ahi, blo, bhi = ranges.pop()
+
+        # Match up the items at the start and the end.
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+
+        if (ahi - alo) * (bhi - blo) <= SMALL_GAP:
+            matcher = SequenceMatcher(
+                None, a[alo:ahi], b[blo:bhi], autojunk=False
+            )
+            for i, j, size in matcher.get_matching_blocks():
+                for k in range(size):
+                    matches.append((alo + i + k, blo + j + k))
+            continue
+
+        # Find the items that appear once in each list.
+        counts = {}
+        for i in range(alo, ahi):
+            key = a[i]
+            counts[key] = -1 if key in counts else i
+        unique = []
+        seen = {}
+        for j in range(blo, bhi):
+            key = b[j]
+            if counts.get(key, -1) != -1:
+                seen[key] = -1 if key in seen else j
+        for key, j in seen.items():
+            if j != -1:
+                unique.append((counts[key], j))
+        if not unique:
+            continue
+
+        # Find the longest run of unique items that are in the same
+        # order in both lists.
+        unique.sort()
+        tails = []
+        tails_indexes = []
+        links = []
+        for position, (i, j) in enumerate(unique):
+            k = bisect.bisect_left(tails, j)
+            if k == len(tails):
+                tails.append(j)
+            else:
+                tails[k] = j
+            links.append(tails_indexes[k - 1] if k else -1)
+            if k == len(tails_indexes):
+                tails_indexes.append(position)
+            else:
+                tails_indexes[k] = position
+        anchors = []
+        position = tails_indexes[-1]
+        while position != -1:
+            anchors.append(unique[position])
+            position = links[position]
+        anchors.reverse()
+
+        # Examine the gaps between the anchors.
+        previous_i, previous_j = alo, blo
+        for i, j in anchors:
+            matches.append((i, j))
+            ranges.append((previous_i, i, previous_j, j))
+            previous_i, previous_j = i + 1, j + 1
+        ranges.append((previous_i, ahi, previous_j, bhi))
+    matches.sort()
+    return matches
+
+
+class _Differ(object):
+    """Compares two trees and writes an edit script.
+
+    The comparison happens in three passes:
+
+    1. Starting from the roots, line up the children of each pair of
+       corresponding Tags. A child that's unchanged is matched with
+       its counterpart as a unit, and is never looked at again. A
+       changed Tag is matched with a Tag of the same name in the same
+       area, and their children are lined up in turn.
+
+    2. Look for elements that were removed from one place in the old
+       tree and added somewhere else in the new one.
+
+    3. Walk the new tree in document order, writing the edits that
+       make each Tag's children match, and then delete whatever's
+       left over.
+
+    While writing the edit script, the _Differ keeps track of how
+    the edits it's written so far have rearranged the old tree, so
+    that each edit's path is correct at the point when it's applied.
+    """
+
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.edits = []
+
+        # The key of every element in both trees, keyed by id().
+        self.keys = {}
+        _keys(old, self.keys)
+        _keys(new, self.keys)
+
+        # For every Tag in the new tree whose children need editing,
+        # a list of (new child, how to get it, old element) tuples.
+        self.plans = {}
+
+        # Old elements that have no counterpart in the new tree, in
+        # the order they were found, and new elements that have no
+        # counterpart in the old tree.
+        self.unmatched_old = []
+        self.unmatched_new = []
+
+        # Old Tags that will be moved, keyed by id(), and the old Tag
+        # that will be moved into place to become each new Tag.
+        self.moved = set()
+        self.sources = {}
+
+        # The rearranged .contents and .parent of elements that have
+        # been affected by edits, keyed by id().
+        self.children = {}
+        self.parents = {}
+
+    def run(self):
+        self.match()
+        self.find_moves()
+        self.write()
+        return self.edits
+
+    # Pass 1.
+
+    def match(self):
+        """Line up the children of corresponding Tags, starting from
+        the roots.
+        """
+        pairs = [(self.old, self.new)]
+        while pairs:
+            old, new = pairs.pop()
+            plan = self.plans[id(new)] = []
+            for new_child, how, old_child in self.align(
+                    old.contents, new.contents):
+                plan.append((new_child, how, old_child))
+                if how == 'edit' and isinstance(new_child, Tag):
+                    pairs.append((old_child, new_child))
+
+    def align(self, old_children, new_children):
+        """Match up two lists of children.
+
+        :return: A list of (new child, how, old child) tuples, one for
+            each new child. `how` is 'same' if the old child is equal
+            to the new one, 'edit' if it's similar, and None if
+            there's no corresponding old child. Old children that
+            aren't mentioned are added to self.unmatched_old.
+        """
+        keys = self.keys
+        old_keys = [keys[id(x)] for x in old_children]
+        new_keys = [keys[id(x)] for x in new_children]
+
+        # Turn the matching children into a list of opcodes like the
+        # ones SequenceMatcher.get_opcodes() returns.
+        opcodes = []
+        i = j = 0
+        for i2, j2 in _matches(old_keys, new_keys) + [
+                (len(old_keys), len(new_keys))]:
+            if i < i2 or j < j2:
+                opcodes.append(('change', i, i2, j, j2))
+            opcodes.append(('equal', i2, i2 + 1, j2, j2 + 1))
+            i, j = i2 + 1, j2 + 1
+        # The last opcode is for the sentinel.
+        opcodes.pop()
+
+        aligned = []
+        for op, i1, i2, j1, j2 in opcodes:
+            if op == 'equal':
+                aligned.append((new_children[j1], 'same', old_children[i1]))
+                continue
+            # Within a block of changes, pair each new child with the
+            # next similar old child, if there is one.
+            i = i1
+            for j in range(j1, j2):
+                new_child = new_children[j]
+                for k in range(i, i2):
+                    if _similar(old_children[k], new_child):
+                        self.unmatched_old.extend(old_children[i:k])
+                        aligned.append((new_child, 'edit', old_children[k]))
+                        i = k + 1
+                        break
+                else:
+                    aligned.append((new_child, None, None))
+                    self.unmatched_new.append(new_child)
+            self.unmatched_old.extend(old_children[i:i2])
+        return aligned
+
+    # Pass 2.
+
+    def find_moves(self):
+        """Match new Tags with no counterpart against old Tags that
+        were removed, or that are inside Tags that were removed.
+
+        Only Tags are moved; a string is as easy to insert as to move.
+        """
+        available = {}
+        for top in self.unmatched_old:
+            for element in self._subtree(top):
+                if isinstance(element, Tag):
+                    available.setdefault(
+                        self.keys[id(element)], []).append(element)
+        if not available:
+            return
+        for candidates in available.values():
+            # Use the candidates in document order.
+            candidates.reverse()
+
+        # A new Tag containing a Tag that might be moved from
+        # elsewhere is inserted as an empty shell, and then its
+        # children are moved or inserted individually.
+        shells = set()
+        for top in self.unmatched_new:
+            stop = top.parent
+            for element in self._subtree(top):
+                if element is top or self.keys[id(element)] not in available:
+                    continue
+                parent = element.parent
+                while parent is not stop and id(parent) not in shells:
+                    shells.add(id(parent))
+                    parent = parent.parent
+
+        queue = list(reversed(self.unmatched_new))
+        while queue:
+            new = queue.pop()
+            if not isinstance(new, Tag):
+                continue
+            source = self._take(available, new)
+            if source is not None:
+                self.sources[id(new)] = source
+            elif id(new) in shells:
+                self.plans[id(new)] = [
+                    (child, None, None) for child in new.contents
+                ]
+                queue.extend(reversed(new.contents))
+
+    def _take(self, available, new):
+        """Find an old element equal to `new` that isn't being used
+        for anything else.
+        """
+        candidates = available.get(self.keys[id(new)])
+        while candidates:
+            old = candidates.pop()
+            if self._is_free(old):
+                self.moved.add(id(old))
+                return old
+        return None
+
+    def _is_free(self, old):
+        """Is `old` unused, and not inside or around an element that's
+        being moved?
+        """
+        for element in self._subtree(old):
+            if id(element) in self.moved:
+                return False
+        parent = old.parent
+        while parent is not None and parent is not self.old:
+            if id(parent) in self.moved:
+                return False
+            parent = parent.parent
+        return True
+
+    def _subtree(self, top):
+        """Iterate over an element and its descendants."""
+        yield top
+        if isinstance(top, Tag):
+            for element in top.descendants:
+                yield element
+
+    # Pass 3.
+
+    def write(self):
+        """Write the edit script."""
+        sources = self.sources
+        pending = [(self.old, self.new)]
+        while pending:
+            target, new = pending.pop()
+            if target is not new:
+                self.update_attrs(target, new)
+
+            # Put each of new's children into place, right after the
+            # one before it. Leftovers are deleted at the end.
+            previous = None
+            children_to_visit = []
+            for new_child, how, old_child in self.plans[id(new)]:
+                if how == 'same':
+                    element = old_child
+                elif how == 'edit':
+                    element = old_child
+                    if isinstance(new_child, Tag):
+                        children_to_visit.append((old_child, new_child))
+                    elif str(old_child) != str(new_child):
+                        self.edits.append(
+                            (UPDATE_TEXT, self.path(old_child),
+                             str(new_child))
+                        )
+                elif id(new_child) in sources:
+                    element = sources[id(new_child)]
+                    old_path = self.path(element)
+                    self.remove(element)
+                    self.place(element, target, previous)
+                    self.edits.append(
+                        (MOVE, old_path, self.path(element))
+                    )
+                elif id(new_child) in self.plans:
+                    # An empty shell, to be filled in later.
+                    element = new_child
+                    self.children[id(new_child)] = []
+                    self.place(element, target, previous)
+                    self.edits.append(
+                        (INSERT, self.path(element), new_child._clone())
+                    )
+                    children_to_visit.append((new_child, new_child))
+                else:
+                    element = new_child
+                    self.place(element, target, previous)
+                    self.edits.append(
+                        (INSERT, self.path(element), copy.copy(new_child))
+                    )
+                previous = element
+            # Visit the children in document order.
+            pending.extend(reversed(children_to_visit))
+
+        for old in self.unmatched_old:
+            if id(old) not in self.moved:
+                self.edits.append((DELETE, self.path(old)))
+                self.remove(old)
+
+    def update_attrs(self, old, new):
+        """Write the edits that make old's attributes match new's."""
+        if old.attrs == new.attrs:
+            return
+        path = None
+        for key in sorted(set(old.attrs) | set(new.attrs)):
+            value = new.attrs.get(key)
+            if old.attrs.get(key) == value:
+                continue
+            if path is None:
+                path = self.path(old)
+            if isinstance(value, list):
+                value = list(value)
+            self.edits.append((UPDATE_ATTR, path, key, value))
+
+    def parent(self, element):
+        """Find an element's parent, as rearranged by the edits so far."""
+        return self.parents.get(id(element), element.parent)
+
+    def contents(self, tag):
+        """Find a Tag's children, as rearranged by the edits so far."""
+        return self.children.get(id(tag), tag.contents)
+
+    def path(self, element):
+        """Find the path to an element, as rearranged by the edits so far."""
+        path = []
+        while element is not self.old:
+            parent = self.parent(element)
+            for i, child in enumerate(self.contents(parent)):
+                if child is element:
+                    path.append(i)
+                    break
+            element = parent
+        path.reverse()
+        return path
+
+    def _editable_contents(self, tag):
+        children = self.children.get(id(tag))
+        if children is None:
+            children = self.children[id(tag)] = list(tag.contents)
+        return children
+
+    def remove(self, element):
+        """Remove an element from its parent."""
+        children = self._editable_contents(self.parent(element))
+        for i, child in enumerate(children):
+            if child is element:
+                del children[i]
+                break
+
+    def place(self, element, parent, previous):
+        """Put an element into `parent`, right after `previous`, or at
+        the start if `previous` is None.
+        """
+        children = self._editable_contents(parent)
+        position = 0
+        if previous is not None:
+            for i, child in enumerate(children):
+                if child is previous:
+                    position = i + 1
+                    break
+        children.insert(position, element)
+        self.parents[id(element)] = parent
+
+
+def diff(old, new):
+    """Find the edits that turn one parse tree into another.
+
+    :param old: A Tag or BeautifulSoup object.
+    :param new: A Tag or BeautifulSoup object with the same name
+        as `old`.
+    :return: A list of edits, as described in the module
+        docstring. If `old` == `new`, the list is empty.
+    """
+    if old.name != new.name:
+        raise ValueError(
+            "Can't compare a <%s> tag with a <%s> tag." % (
+                old.name, new.name
+            )
+        )
+    return _Differ(old, new).run()
+
+
+def apply_patch(tree, edits):
+    """Make the edits in an edit script created by diff().
+
+    :param tree: The Tag or BeautifulSoup object corresponding to the
+        `old` argument to diff(). It's modified in place.
+    :param edits: A list of edits.
+    :return: `tree`
+    """
+    def find(path):
+        element = tree
+        for i in path:
+            element = element.contents[i]
+        return element
+
+    with BatchEdit(tree):
+        for edit in edits:
+            op, path = edit[0], edit[1]
+            if op == INSERT:
+                parent = find(path[:-1])
+                parent.insert(path[-1], copy.copy(edit[2]))
+            elif op == DELETE:
+                find(path).extract(_self_index=path[-1])
+            elif op == MOVE:
+                element = find(path).extract(_self_index=path[-1])
+                new_path = edit[2]
+                find(new_path[:-1]).insert(new_path[-1], element)
+            elif op == UPDATE_ATTR:
+                key, value = edit[2], edit[3]
+                element = find(path)
+                if value is None:
+                    del element[key]
+                else:
+                    if isinstance(value, list):
+                        value = list(value)
+                    element[key] = value
+            elif op == UPDATE_TEXT:
+                element = find(path)
+                element.replace_with(type(element)(edit[2]))
+            else:
+                raise ValueError("Unknown edit: %r" % (edit,))
+    return tree
@@ -5,6 +5,7 @@ try:
     from collections.abc import Callable # Python 3.6
 except ImportError as e:
     from collections import Callable
+from operator import attrgetter
 import re
 import sys
 import warnings
@@ -41,6 +42,23 @@ def _alias(attr):
         return setattr(self, attr)
     return alias
 
+def _attribute_hash(attrs):
+    """Hash a Tag's attribute dictionary, for Tag.__hash__.
+
+    Equal dictionaries must have the same hash, whatever order their
+    keys are in.
+    """
+    items = []
+    for key, value in attrs.items():
+        if isinstance(value, list):
+            value = tuple(value)
+        items.append((key, value))
+    try:
+        return hash(frozenset(items))
+    except TypeError as e:
+        # Some unusual attribute value can't be hashed.
+        return len(items)
+
 
 # These encodings are recognized by Python (so PageElement.encode
 # could theoretically support them) but XML and HTML don't recognize
@@ -153,7 +171,9 @@ class PageElement(object):
 
     NavigableString, Tag, etc. are all subclasses of PageElement.
     """
-   
+
+    __slots__ = ()
+
     def setup(self, parent=None, previous_element=None, next_element=None,
               previous_sibling=None, next_sibling=None):
         """Sets up the initial relations between this element and
@@ -313,8 +333,7 @@ class PageElement(object):
         old_parent = self.parent
         my_index = self.parent.index(self)
         self.extract(_self_index=my_index)
-        for idx, replace_with in enumerate(args, start=my_index):
-            old_parent.insert(idx, replace_with)
+        old_parent.insert(my_index, *args)
         return self
     replaceWith = replace_with  # BS3
 
@@ -330,8 +349,7 @@ class PageElement(object):
                 "element is not part of a tree.")
         my_index = self.parent.index(self)
         self.extract(_self_index=my_index)
-        for child in reversed(self.contents[:]):
-            my_parent.insert(my_index, child)
+        my_parent.insert(my_index, *self.contents)
         return self
     replace_with_children = unwrap
     replaceWithChildren = unwrap  # BS3
@@ -356,10 +374,25 @@ class PageElement(object):
 
         :return: `self`, no longer part of the tree.
         """
-        if self.parent is not None:
+        old_parent = self.parent
+        batch = BatchEdit.covering(old_parent or self)
+        if batch is not None:
+            if old_parent is None:
+                batch.changed[id(self)] = self
+            else:
+                if _self_index is None:
+                    _self_index = old_parent.index(self)
+                batch.extract_children(
+                    old_parent, _self_index, _self_index + 1
+                )
+                old_parent._notify('extract', [self], _self_index)
+            return self
+
+        if old_parent is not None:
             if _self_index is None:
-                _self_index = self.parent.index(self)
-            del self.parent.contents[_self_index]
+                _self_index = old_parent.index(self)
+            del old_parent.contents[_self_index]
+            old_parent._children_moved(_self_index)
 
         #Find the two elements that would be next to each other if
         #this element (and any children) hadn't been parsed. Connect
@@ -383,6 +416,8 @@ class PageElement(object):
             and self.next_sibling is not self.previous_sibling):
             self.next_sibling.previous_sibling = self.previous_sibling
         self.previous_sibling = self.next_sibling = None
+        if old_parent is not None:
+            old_parent._notify('extract', [self], _self_index)
         return self
 
     def _last_descendant(self, is_initialized=True, accept_self=True):
@@ -404,87 +439,146 @@ class PageElement(object):
     # BS3: Not part of the API!
     _lastRecursiveChild = _last_descendant
 
-    def insert(self, position, new_child):
-        """Insert a new PageElement in the list of this PageElement's children.
+    def insert(self, position, *new_children):
+        """Insert one or more new PageElements in the list of this
+        PageElement's children.
 
-        This works the same way as `list.insert`.
+        This works the same way as `list.insert`, except that any
+        number of elements can be inserted. They're spliced into the
+        tree all at once, so inserting a lot of elements with one call
+        is much faster than inserting them one at a time.
 
         :param position: The numeric position that should be occupied
-           in `self.children` by the new PageElement. 
-        :param new_child: A PageElement.
+           in `self.children` by the first new PageElement.
+        :param new_children: One or more PageElements.
         """
-        if new_child is None:
-            raise ValueError("Cannot insert None into a tag.")
-        if new_child is self:
-            raise ValueError("Cannot insert a tag into itself.")
-        if (isinstance(new_child, str)
-            and not isinstance(new_child, NavigableString)):
-            new_child = NavigableString(new_child)
-
         from bs4 import BeautifulSoup
-        if isinstance(new_child, BeautifulSoup):
-            # We don't want to end up with a situation where one BeautifulSoup
-            # object contains another. Insert the children one at a time.
-            for subchild in list(new_child.contents):
-                self.insert(position, subchild)
-                position += 1
+        to_insert = []
+        for new_child in new_children:
+            if new_child is None:
+                raise ValueError("Cannot insert None into a tag.")
+            if new_child is self:
+                raise ValueError("Cannot insert a tag into itself.")
+            if (isinstance(new_child, str)
+                and not isinstance(new_child, NavigableString)):
+                new_child = NavigableString(new_child)
+            if isinstance(new_child, BeautifulSoup):
+                # We don't want to end up with a situation where one
+                # BeautifulSoup object contains another. Insert its
+                # children instead.
+                to_insert.extend(new_child.contents)
+            else:
+                to_insert.append(new_child)
+        if not to_insert:
             return
+        if len(set(map(id, to_insert))) != len(to_insert):
+            # The same element is being inserted more than once. Each
+            # insertion moves it, as if they'd been done one at a time.
+            for new_child in to_insert:
+                self.insert(position, new_child)
+                position = min(position, len(self.contents)) + 1
+            return
+
         position = min(position, len(self.contents))
-        if hasattr(new_child, 'parent') and new_child.parent is not None:
-            # We're 'inserting' an element that's already one
-            # of this object's children.
-            if new_child.parent is self:
-                current_index = self.index(new_child)
-                if current_index < position:
-                    # We're moving this element further down the list
-                    # of this object's children. That means that when
-                    # we extract this element, our target index will
-                    # jump down one.
-                    position -= 1
-            new_child.extract()
-
-        new_child.parent = self
-        previous_child = None
+        i = 0
+        while i < len(to_insert):
+            parent = to_insert[i].parent
+            if parent is None:
+                i += 1
+                continue
+            # Take this element out of its current parent, along with
+            # any of the following elements that come right after it.
+            start = end = parent.index(to_insert[i])
+            while (i < len(to_insert) and end < len(parent.contents)
+                   and parent.contents[end] is to_insert[i]):
+                end += 1
+                i += 1
+            if parent is self and start < position:
+                # We're moving elements further down the list of this
+                # object's children. That means that when we extract
+                # them, our target index will jump down.
+                position -= min(end, position) - start
+            parent._extract_children(start, end)
+
+        batch = BatchEdit.covering(self)
+        if batch is not None:
+            batch.insert_children(self, position, to_insert)
+            self._notify('insert', to_insert, position)
+            return
+
+        # Find the elements on either side of the new elements.
         if position == 0:
-            new_child.previous_sibling = None
-            new_child.previous_element = self
+            previous_child = None
+            previous_element = self
         else:
             previous_child = self.contents[position - 1]
-            new_child.previous_sibling = previous_child
-            new_child.previous_sibling.next_sibling = new_child
-            new_child.previous_element = previous_child._last_descendant(False)
-        if new_child.previous_element is not None:
-            new_child.previous_element.next_element = new_child
-
-        new_childs_last_element = new_child._last_descendant(False)
-
-        if position >= len(self.contents):
-            new_child.next_sibling = None
-
+            previous_element = previous_child._last_descendant(False)
+        if position < len(self.contents):
+            next_child = self.contents[position]
+            next_element = next_child
+        else:
+            next_child = None
             parent = self
-            parents_next_sibling = None
-            while parents_next_sibling is None and parent is not None:
-                parents_next_sibling = parent.next_sibling
+            next_element = None
+            while next_element is None and parent is not None:
+                # We found the element that comes next in the document.
+                next_element = parent.next_sibling
                 parent = parent.parent
-                if parents_next_sibling is not None:
-                    # We found the element that comes next in the document.
-                    break
-            if parents_next_sibling is not None:
-                new_childs_last_element.next_element = parents_next_sibling
-            else:
-                # The last element of this tag is the last element in
-                # the document.
-                new_childs_last_element.next_element = None
-        else:
-            next_child = self.contents[position]
-            new_child.next_sibling = next_child
-            if new_child.next_sibling is not None:
-                new_child.next_sibling.previous_sibling = new_child
-            new_childs_last_element.next_element = next_child
 
-        if new_childs_last_element.next_element is not None:
-            new_childs_last_element.next_element.previous_element = new_childs_last_element
-        self.contents.insert(position, new_child)
+        # Connect the new elements to each other, and to their
+        # neighbors.
+        for new_child in to_insert:
+            new_child.parent = self
+            new_child.previous_sibling = previous_child
+            if previous_child is not None:
+                previous_child.next_sibling = new_child
+            new_child.previous_element = previous_element
+            if previous_element is not None:
+                previous_element.next_element = new_child
+            previous_child = new_child
+            previous_element = new_child._last_descendant(False)
+        previous_child.next_sibling = next_child
+        if next_child is not None:
+            next_child.previous_sibling = previous_child
+        previous_element.next_element = next_element
+        if next_element is not None:
+            next_element.previous_element = previous_element
+
+        self.contents[position:position] = to_insert
+        self._children_moved(position)
+        self._notify('insert', to_insert, position)
+
+    def _notify(self, op, nodes, index):
+        """Tell the BeautifulSoup object at the root of this element's
+        tree, if there is one, that the tree has changed. See
+        BeautifulSoup.add_observer().
+
+        :param op: 'insert', 'extract', 'set_attribute',
+           'delete_attribute' or 'rename'.
+        :param nodes: A list of the PageElements that were inserted
+           into or extracted from this element's .contents, in order.
+           For an attribute change or a rename, a list containing
+           this element.
+        :param index: The position in .contents of the first of
+           `nodes`. For an attribute change, the attribute's name;
+           for a rename, the old name.
+        """
+        # On the way up, forget the hashes of this element and its
+        # ancestors, since they all depend on this element's state.
+        root = self
+        root._hash = None
+        while root.parent is not None:
+            root = root.parent
+            root._hash = None
+        root._tree_changed(op, nodes, self, index)
+
+    def _tree_changed(self, op, nodes, parent, index):
+        """Called on the root of a tree whenever the tree changes.
+
+        Only a BeautifulSoup object keeps track of changes, so this
+        does nothing.
+        """
+        pass
 
     def append(self, tag):
         """Appends the given PageElement to the contents of this one.
@@ -503,8 +597,7 @@ class PageElement(object):
             # the list we're iterating over. Make a list that won't
             # change.
             tags = list(tags.contents)
-        for tag in tags:
-            self.append(tag)
+        self.insert(len(self.contents), *tags)
 
     def insert_before(self, *args):
         """Makes the given element(s) the immediate predecessor of this one.
@@ -520,13 +613,12 @@ class PageElement(object):
                 "Element has no parent, so 'before' has no meaning.")
         if any(x is self for x in args):
                 raise ValueError("Can't insert an element before itself.")
+        # Extract first so that the index won't be screwed up if they
+        # are siblings.
         for predecessor in args:
-            # Extract first so that the index won't be screwed up if they
-            # are siblings.
             if isinstance(predecessor, PageElement):
                 predecessor.extract()
-            index = parent.index(self)
-            parent.insert(index, predecessor)
+        parent.insert(parent.index(self), *args)
 
     def insert_after(self, *args):
         """Makes the given element(s) the immediate successor of this one.
@@ -544,15 +636,12 @@ class PageElement(object):
         if any(x is self for x in args):
             raise ValueError("Can't insert an element after itself.")
         
-        offset = 0
+        # Extract first so that the index won't be screwed up if they
+        # are siblings.
         for successor in args:
-            # Extract first so that the index won't be screwed up if they
-            # are siblings.
             if isinstance(successor, PageElement):
                 successor.extract()
-            index = parent.index(self)
-            parent.insert(index+1+offset, successor)
-            offset += 1
+        parent.insert(parent.index(self) + 1, *args)
 
     def find_next(self, name=None, attrs={}, string=None, **kwargs):
         """Find the first PageElement that matches the given criteria and
@@ -1169,6 +1258,87 @@ class RubyParenthesisString(NavigableString):
     pass
 
 
+class _TagConfiguration(object):
+    """The settings a Tag gets from its TreeBuilder.
+
+    Almost every Tag created by a given TreeBuilder has the same
+    settings, so rather than storing them on every Tag, each Tag
+    refers to one of these objects. They're never modified once
+    created: changing a setting on a Tag gives it a new
+    _TagConfiguration.
+    """
+
+    __slots__ = FIELDS = (
+        'parser_class', 'known_xml', 'can_be_empty_element',
+        'cdata_list_attributes', 'preserve_whitespace_tags',
+        'interesting_string_types', 'hidden',
+    )
+
+    # Objects with the same settings are shared. There aren't usually
+    # many distinct configurations, but just in case, the cache is
+    # emptied when it gets too big.
+    _cache = {}
+    MAX_CACHE_SIZE = 1024
+
+    def __init__(self, *values):
+        for field, value in zip(self.FIELDS, values):
+            setattr(self, field, value)
+
+    def __reduce__(self):
+        return (_TagConfiguration.get, self.values())
+
+    def values(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    @classmethod
+    def get(cls, *values):
+        """Find or create a _TagConfiguration with the given settings,
+        in the order given by FIELDS.
+        """
+        # Data structures like the set of whitespace-preserving tags
+        # are compared by identity, as they would be if each Tag
+        # stored its own reference to them. A cached object keeps
+        # those data structures alive, so their ids can't be reused
+        # while it's in the cache.
+        key = tuple(
+            value if value is None or isinstance(value, (str, type, tuple))
+            else (value.__class__, value) if isinstance(value, int)
+            else id(value)
+            for value in values
+        )
+        try:
+            config = cls._cache.get(key)
+        except TypeError as e:
+            # Some unusual value can't be hashed.
+            return cls(*values)
+        if config is None:
+            if len(cls._cache) >= cls.MAX_CACHE_SIZE:
+                cls._cache.clear()
+            config = cls._cache[key] = cls(*values)
+        return config
+
+    def replace(self, field, value):
+        """Find or create a _TagConfiguration just like this one,
+        except for one setting.
+        """
+        if getattr(self, field) is value:
+            return self
+        values = list(self.values())
+        values[self.FIELDS.index(field)] = value
+        return self.get(*values)
+
+    @staticmethod
+    def tag_property(field, doc):
+        """Create a Tag property for one of these settings."""
+        def fset(tag, value):
+            tag._config = tag._config.replace(field, value)
+        return property(attrgetter('_config.' + field), fset, doc=doc)
+
+_TagConfiguration.DEFAULT = _TagConfiguration.get(
+    None, None, None, None, None, None, False
+)
+
+
 class Tag(PageElement):
     """Represents an HTML or XML tag that is part of a parse tree, along
     with its attributes and contents.
@@ -1177,6 +1347,21 @@ class Tag(PageElement):
     create a Tag object representing the <b> tag.
     """
 
+    # A big parse tree contains a lot of Tags, so they don't store
+    # their attributes in a dictionary. The settings a Tag gets from
+    # its TreeBuilder are kept in a _TagConfiguration shared with
+    # other Tags.
+    #
+    # A Tag still has a __dict__ for any other attributes that get
+    # set on it, but it's not created until it's needed.
+    __slots__ = (
+        '_name', 'namespace', 'prefix', 'attrs', 'contents',
+        'parent', 'previous_element', 'next_element',
+        'previous_sibling', 'next_sibling',
+        'sourceline', 'sourcepos', '_namespaces', '_config',
+        '_hash', '_child_positions', '__dict__', '__weakref__',
+    )
+
     def __init__(self, parser=None, builder=None, name=None, namespace=None,
                  prefix=None, attrs=None, parent=None, previous=None,
                  is_xml=None, sourceline=None, sourcepos=None,
@@ -1221,16 +1406,16 @@ class Tag(PageElement):
             construct CSS selectors.
         """
         if parser is None:
-            self.parser_class = None
+            parser_class = None
         else:
             # We don't actually store the parser object: that lets extracted
             # chunks be garbage-collected.
-            self.parser_class = parser.__class__
+            parser_class = parser.__class__
         if name is None:
             raise ValueError("No value provided for new tag's name.")
-        self.name = name
+        self._name = name
         self.namespace = namespace
-        self._namespaces = namespaces or {}
+        self._namespaces = namespaces or None
         self.prefix = prefix
         if ((not builder or builder.store_line_numbers)
             and (sourceline is not None or sourcepos is not None)):
@@ -1250,69 +1435,209 @@ class Tag(PageElement):
         # If possible, determine ahead of time whether this tag is an
         # XML tag.
         if builder:
-            self.known_xml = builder.is_xml
+            known_xml = builder.is_xml
         else:
-            self.known_xml = is_xml
+            known_xml = is_xml
         self.attrs = attrs
         self.contents = []
+        self._hash = None
+        self._child_positions = None
         self.setup(parent, previous)
-        self.hidden = False
 
         if builder is None:
             # In the absence of a TreeBuilder, use whatever values were
             # passed in here. They're probably None, unless this is a copy of some
             # other tag.
-            self.can_be_empty_element = can_be_empty_element
-            self.cdata_list_attributes = cdata_list_attributes
-            self.preserve_whitespace_tags = preserve_whitespace_tags
-            self.interesting_string_types = interesting_string_types
+            self._config = _TagConfiguration.get(
+                parser_class, known_xml, can_be_empty_element,
+                cdata_list_attributes, preserve_whitespace_tags,
+                interesting_string_types, False
+            )
         else:
+            # Ask the TreeBuilder whether this tag might be an
+            # empty-element tag, and which sort of string container
+            # it uses for most of its strings. Tags that use a special
+            # string container treat that kind of string as the
+            # interesting kind when we ask for the tag's strings.
+            #
+            # The whole cdata_list_attributes and
+            # preserve_whitespace_tags data structures are stored
+            # rather than asking the question of every tag. (Unlike
+            # can_be_empty_element, we almost never need to check
+            # them.)
+            self._config = _TagConfiguration.get(
+                parser_class, known_xml, builder.can_be_empty_element(name),
+                builder.cdata_list_attributes,
+                builder.preserve_whitespace_tags,
+                builder.string_containers.get(
+                    self.name, self.DEFAULT_INTERESTING_STRING_TYPES
+                ), False
+            )
+
             # Set up any substitutions for this tag, such as the charset in a META tag.
             builder.set_up_substitutions(self)
 
-            # Ask the TreeBuilder whether this tag might be an empty-element tag.
-            self.can_be_empty_element = builder.can_be_empty_element(name)
+    parser_class = _TagConfiguration.tag_property(
+        'parser_class',
+        "The class of the BeautifulSoup object that created this Tag."
+    )
+    known_xml = _TagConfiguration.tag_property(
+        'known_xml', "True if this Tag is known to be part of an XML tree."
+    )
+    can_be_empty_element = _TagConfiguration.tag_property(
+        'can_be_empty_element',
+        "True if this Tag should be represented as <tag/> when empty."
+    )
+    cdata_list_attributes = _TagConfiguration.tag_property(
+        'cdata_list_attributes',
+        "The attributes whose values should be treated as lists."
+    )
+    preserve_whitespace_tags = _TagConfiguration.tag_property(
+        'preserve_whitespace_tags',
+        "The names of tags whose whitespace should be preserved."
+    )
+    interesting_string_types = _TagConfiguration.tag_property(
+        'interesting_string_types',
+        "The NavigableString subclasses found by Tag.strings and Tag.get_text."
+    )
+    hidden = _TagConfiguration.tag_property(
+        'hidden', "If this is true, the Tag itself is not part of the output."
+    )
 
-            # Keep track of the list of attributes of this tag that
-            # might need to be treated as a list.
-            #
-            # For performance reasons, we store the whole data structure
-            # rather than asking the question of every tag. Asking would
-            # require building a new data structure every time, and
-            # (unlike can_be_empty_element), we almost never need
-            # to check this.
-            self.cdata_list_attributes = builder.cdata_list_attributes
-
-            # Keep track of the names that might cause this tag to be treated as a
-            # whitespace-preserved tag.
-            self.preserve_whitespace_tags = builder.preserve_whitespace_tags
-
-            if self.name in builder.string_containers:
-                # This sort of tag uses a special string container
-                # subclass for most of its strings. When we ask the
-                self.interesting_string_types = builder.string_containers[self.name]
-            else:
-                self.interesting_string_types = self.DEFAULT_INTERESTING_STRING_TYPES
-            
     parserClass = _alias("parser_class")  # BS3
 
     def __copy__(self):
         """A copy of a Tag is a new Tag, unconnected to the parse tree.
         Its contents are a copy of the old Tag's contents.
         """
+        clone = self._clone()
+        self._copy_descendants(clone)
+        return clone
+
+    def _copy_descendants(self, clone):
+        """Fill an empty copy of this Tag with copies of its descendants.
+
+        The tree is walked without recursion, so that deeply nested
+        Tags can be copied, and each copy is linked in directly
+        rather than going through append(). Since the copies are
+        created in document order, each one's previous_element is the
+        one created before it.
+
+        :param clone: A Tag with no contents, usually created by _clone().
+        :return: The last element copied, or `clone` itself if this
+            Tag has no contents.
+        """
+        previous = clone
+        stack = [(clone, iter(self.contents))]
+        while stack:
+            parent, children = stack[-1]
+            for child in children:
+                is_tag = isinstance(child, Tag)
+                if is_tag:
+                    copied = child._clone()
+                else:
+                    copied = child.__copy__()
+                copied.setup(parent, previous)
+                parent.contents.append(copied)
+                previous = copied
+                if is_tag and child.contents:
+                    stack.append((copied, iter(child.contents)))
+                    break
+            else:
+                stack.pop()
+        return previous
+
+    def _clone(self):
+        """Create a new Tag just like this one, but with no contents and
+        no connection to the parse tree.
+        """
+        sourceline, sourcepos = self._source_position()
         clone = type(self)(
-            None, self.builder, self.name, self.namespace,
-            self.prefix, self.attrs, is_xml=self._is_xml,
-            sourceline=self.sourceline, sourcepos=self.sourcepos,
+            None, None, self.name, self.namespace,
+            self.prefix, None, is_xml=self._is_xml,
+            sourceline=sourceline, sourcepos=sourcepos,
             can_be_empty_element=self.can_be_empty_element,
             cdata_list_attributes=self.cdata_list_attributes,
-            preserve_whitespace_tags=self.preserve_whitespace_tags
+            preserve_whitespace_tags=self.preserve_whitespace_tags,
+            interesting_string_types=self.interesting_string_types,
+            namespaces=self._namespaces
         )
-        for attr in ('can_be_empty_element', 'hidden'):
-            setattr(clone, attr, getattr(self, attr))
-        for child in self.contents:
-            clone.append(child.__copy__())
+        # Multi-valued attributes are lists, which must not be shared
+        # with the original.
+        attrs = clone.attrs
+        for key, value in self.attrs.items():
+            if isinstance(value, list):
+                value = list(value)
+            attrs[key] = value
+        clone.parser_class = self.parser_class
+        clone.hidden = self.hidden
         return clone
+
+    # The slots that hold this Tag's state, as opposed to caches
+    # (see __hash__ and index()), __dict__ and __weakref__.
+    _STATE_SLOTS = __slots__[:-4]
+
+    def _slot_values(self):
+        """Yield (name, value) for every slot that's been set."""
+        for name in self._STATE_SLOTS:
+            try:
+                value = getattr(Tag, name).__get__(self, Tag)
+            except AttributeError as e:
+                continue
+            yield name, value
+
+    def _clear_slots(self):
+        for descriptor in _TAG_STATE_DESCRIPTORS:
+            try:
+                descriptor.__delete__(self)
+            except AttributeError as e:
+                pass
+        self._hash = None
+        self._child_positions = None
+
+    def _source_position(self):
+        """Find where this Tag was found in its source document.
+
+        Unlike looking up .sourceline and .sourcepos, this won't
+        search for a tag called <sourceline> if the position wasn't
+        recorded.
+
+        :return: A (sourceline, sourcepos) 2-tuple. Either value
+           may be None.
+        """
+        try:
+            sourceline = Tag.sourceline.__get__(self, Tag)
+        except AttributeError as e:
+            sourceline = None
+        try:
+            sourcepos = Tag.sourcepos.__get__(self, Tag)
+        except AttributeError as e:
+            sourcepos = None
+        return sourceline, sourcepos
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.update(self._slot_values())
+        return state
+
+    def __setstate__(self, state):
+        # This also works for objects pickled before Tag used
+        # __slots__, which had the TreeBuilder settings in their
+        # __dict__.
+        for name, value in state.items():
+            if name == 'name':
+                # Don't treat this as a change to the tree.
+                name = '_name'
+            setattr(self, name, value)
+
+    def _set_name(self, value):
+        old_name = self._name
+        self._name = value
+        if value != old_name:
+            self._notify('rename', [self], old_name)
+    name = property(
+        attrgetter('_name'), _set_name, doc="The name of this Tag."
+    )
     
     @property
     def is_empty_element(self):
@@ -1409,31 +1734,215 @@ class Tag(PageElement):
         whether an element has been decomposed, you can use the
         `decomposed` property.
         """
+        batch = BatchEdit.covering(self)
         self.extract()
+        if batch is not None:
+            # Everything beneath this element is found by following
+            # next_element, so its linkage can't wait for the batch
+            # to end.
+            batch.relink(self)
         i = self
         while i is not None:
             n = i.next_element
+            if batch is not None:
+                batch.changed.pop(id(i), None)
             i.__dict__.clear()
+            if isinstance(i, Tag):
+                i._clear_slots()
             i.contents = []
             i._decomposed = True
             i = n
            
     def clear(self, decompose=False):
-        """Wipe out all children of this PageElement by calling extract()
-           on them.
+        """Wipe out all children of this PageElement by extracting
+           them.
+
+        The children are taken out all at once, so the tree only has
+        to be relinked around this PageElement one time.
 
         :param decompose: If this is True, decompose() (a more
-            destructive method) will be called instead of extract().
+            destructive method) will be called on each child Tag
+            once it's been extracted.
         """
+        children = self._extract_children(0, len(self.contents))
         if decompose:
-            for element in self.contents[:]:
+            for element in children:
                 if isinstance(element, Tag):
                     element.decompose()
+
+    def _find_all_for_bulk(self, match, selector):
+        """Find the descendants that extract_all() and similar
+        methods should operate on.
+
+        :param match: A SoupStrainer, or anything you could pass in
+           as the `name` argument to find_all().
+        :param selector: A CSS selector, used instead of `match`.
+        :return: A list of PageElements, in document order.
+        """
+        if selector is not None:
+            if match is not None:
+                raise ValueError("Pass in match or selector, not both.")
+            return self.select(selector)
+        if match is None:
+            raise ValueError("Pass in either match or selector.")
+        return self.find_all(match)
+
+    def _find_for_removal(self, match, selector):
+        """Find the descendants of this Tag that match, leaving out
+        the ones inside other matches.
+
+        :return: A list of (parent, index, element) 3-tuples, in
+           document order.
+        """
+        found = self._find_all_for_bulk(match, selector)
+        matches = set(map(id, found))
+        # The ids of Tags known to be inside a match, and of Tags
+        # known not to be. Each Tag goes into one or the other the
+        # first time it's seen, so no ancestor is looked at twice.
+        inside = set()
+        outside = {id(self)}
+        results = []
+        for element in found:
+            path = []
+            parent = element.parent
+            while True:
+                key = id(parent)
+                if key in outside:
+                    outside.update(path)
+                    results.append(
+                        (element.parent, element.parent.index(element),
+                         element)
+                    )
+                    break
+                if key in inside or key in matches:
+                    inside.update(path)
+                    break
+                path.append(key)
+                parent = parent.parent
+        return results
+
+    def extract_all(self, match=None, selector=None):
+        """Take every descendant that matches out of the tree, in a
+        single pass.
+
+        A match inside another match stays where it is, inside the
+        element being extracted. Matches that are next to each
+        other are taken out together.
+
+        :param match: A SoupStrainer, or anything you could pass in
+           as the `name` argument to find_all().
+        :param selector: A CSS selector, to use instead of `match`.
+        :return: A list of the extracted PageElements, in the order
+           they appeared in the document.
+        """
+        found = self._find_for_removal(match, selector)
+
+        # Group the matches into runs of adjacent siblings.
+        runs = []
+        for parent, i, element in found:
+            if runs and runs[-1][0] is parent and runs[-1][2] == i:
+                runs[-1][2] = i + 1
+            else:
+                runs.append([parent, i, i + 1])
+
+        # Extract the runs from last to first, so that the earlier
+        # positions are still good.
+        for parent, start, end in reversed(runs):
+            parent._extract_children(start, end)
+        return [element for parent, i, element in found]
+
+    def decompose_all(self, match=None, selector=None):
+        """Destroy every descendant that matches, in a single pass.
+
+        See extract_all() and decompose().
+
+        :param match: A SoupStrainer, or anything you could pass in
+           as the `name` argument to find_all().
+        :param selector: A CSS selector, to use instead of `match`.
+        """
+        for element in self.extract_all(match, selector):
+            if isinstance(element, Tag):
+                element.decompose()
+
+    def unwrap_all(self, match=None, selector=None):
+        """Replace every descendant Tag that matches with its
+        contents.
+
+        Matches inside other matches are unwrapped too. After the
+        search, only the Tags that have matches among their children
+        are looked at, and each of them gets a new .contents list
+        once, no matter how many of its children were unwrapped.
+
+        :param match: A SoupStrainer, or anything you could pass in
+           as the `name` argument to find_all().
+        :param selector: A CSS selector, to use instead of `match`.
+        :return: A list of the unwrapped Tags, in the order they
+           appeared in the document.
+        """
+        unwrapped = [
+            x for x in self._find_all_for_bulk(match, selector)
+            if isinstance(x, Tag)
+        ]
+        matches = set(map(id, unwrapped))
+        batch = BatchEdit.covering(self)
+
+        # The Tags that are staying in the tree and have matches
+        # among their children. A match inside another match is
+        # taken care of along with the outer one.
+        parents = {}
+        for tag in unwrapped:
+            parent = tag.parent
+            if id(parent) not in matches:
+                parents[id(parent)] = parent
+
+        for tag in parents.values():
+            # Replace each match with its contents, and each match
+            # in those contents with its own contents.
+            new_contents = []
+            work = list(reversed(tag.contents))
+            while work:
+                child = work.pop()
+                if id(child) in matches:
+                    work.extend(reversed(child.contents))
                 else:
-                    element.extract()
-        else:
-            for element in self.contents[:]:
-                element.extract()
+                    new_contents.append(child)
+            previous = None
+            for child in new_contents:
+                child.parent = tag
+                child.previous_sibling = previous
+                if previous is not None:
+                    previous.next_sibling = child
+                previous = child
+            if previous is not None:
+                previous.next_sibling = None
+            old_contents = tag.contents
+            tag.contents = new_contents
+            tag._children_moved(0)
+            if batch is not None:
+                batch.changed[id(tag)] = tag
+            tag._notify('extract', old_contents, 0)
+            tag._notify('insert', new_contents, 0)
+
+        # Unwrapping doesn't change the order of the elements that
+        # remain, so each unwrapped Tag just has to be cut out of the
+        # chain of elements. This is done from last to first, so
+        # that a Tag inside another unwrapped Tag is still connected
+        # to the root of the tree when it's time to report that it's
+        # been emptied.
+        for tag in reversed(unwrapped):
+            if tag.contents:
+                tag._notify('extract', tag.contents, 0)
+            if batch is None:
+                previous_element = tag.previous_element
+                next_element = tag.next_element
+                if previous_element is not None:
+                    previous_element.next_element = next_element
+                if next_element is not None:
+                    next_element.previous_element = previous_element
+            tag.contents = []
+            tag.parent = tag.previous_sibling = tag.next_sibling = None
+            tag.previous_element = tag.next_element = None
+        return unwrapped
 
     def smooth(self):
         """Smooth out this element's children by consolidating consecutive
@@ -1441,37 +1950,89 @@ class Tag(PageElement):
 
         This makes pretty-printed output look more natural following a
         lot of operations that modified the tree.
-        """
-        # Mark the first position of every pair of children that need
-        # to be consolidated.  Do this rather than making a copy of
-        # self.contents, since in most cases very few strings will be
-        # affected.
-        marked = []
-        for i, a in enumerate(self.contents):
-            if isinstance(a, Tag):
-                # Recursively smooth children.
-                a.smooth()
-            if i == len(self.contents)-1:
-                # This is the last item in .contents, and it's not a
-                # tag. There's no chance it needs any work.
-                continue
-            b = self.contents[i+1]
-            if (isinstance(a, NavigableString)
-                and isinstance(b, NavigableString)
-                and not isinstance(a, PreformattedString)
-                and not isinstance(b, PreformattedString)
-            ):
-                marked.append(i)
-
-        # Go over the marked positions in reverse order, so that
-        # removing items from .contents won't affect the remaining
-        # positions.
-        for i in reversed(marked):
-            a = self.contents[i]
-            b = self.contents[i+1]
-            b.extract()
-            n = NavigableString(a+b)
-            a.replace_with(n)
+
+        Each run of consecutive strings is replaced with a single
+        string, and each Tag gets a new .contents list at most once,
+        so this takes time proportional to the size of the tree.
+        """
+        batch = BatchEdit.covering(self)
+        stack = [self]
+        while stack:
+            tag = stack.pop()
+            contents = tag.contents
+            # This stays None until a run of strings turns up.
+            new_contents = None
+            i = 0
+            while i < len(contents):
+                child = contents[i]
+                end = i + 1
+                if (isinstance(child, NavigableString)
+                    and not isinstance(child, PreformattedString)):
+                    while (end < len(contents)
+                           and isinstance(contents[end], NavigableString)
+                           and not isinstance(
+                               contents[end], PreformattedString)):
+                        end += 1
+                if end - i > 1:
+                    if new_contents is None:
+                        new_contents = contents[:i]
+                        first_change = i
+                    strings = contents[i:end]
+                    merged = tag._merge_strings(strings, batch)
+                    tag._notify('extract', strings, len(new_contents))
+                    tag._notify('insert', [merged], len(new_contents))
+                    new_contents.append(merged)
+                else:
+                    if new_contents is not None:
+                        new_contents.append(child)
+                    if isinstance(child, Tag):
+                        stack.append(child)
+                i = end
+            if new_contents is not None:
+                tag.contents = new_contents
+                tag._children_moved(first_change)
+                if batch is not None:
+                    batch.changed[id(tag)] = tag
+
+    def _merge_strings(self, strings, batch=None):
+        """Create one NavigableString to take the place of a run of
+        consecutive strings in this Tag, and connect it to their
+        neighbors.
+
+        The caller is responsible for putting the new string into
+        .contents.
+
+        :param strings: A list of NavigableStrings.
+        :param batch: The BatchEdit in effect, if any. If there is
+           one, the neighbors will be connected when it ends.
+        :return: A NavigableString.
+        """
+        merged = NavigableString("".join(strings))
+        merged.parent = self
+        first = strings[0]
+        last = strings[-1]
+        if batch is None:
+            merged.previous_element = first.previous_element
+            if merged.previous_element is not None:
+                merged.previous_element.next_element = merged
+            merged.next_element = last.next_element
+            if merged.next_element is not None:
+                merged.next_element.previous_element = merged
+            merged.previous_sibling = first.previous_sibling
+            if merged.previous_sibling is not None:
+                merged.previous_sibling.next_sibling = merged
+            merged.next_sibling = last.next_sibling
+            if merged.next_sibling is not None:
+                merged.next_sibling.previous_sibling = merged
+        for string in strings:
+            string.parent = None
+            string.previous_element = string.next_element = None
+            string.previous_sibling = string.next_sibling = None
+        return merged
+
+    # Tags with fewer children than this don't bother keeping track
+    # of where their children are.
+    CHILD_POSITIONS_THRESHOLD = 16
 
     def index(self, element):
         """Find the index of a child by identity, not value.
@@ -1479,13 +2040,201 @@ class Tag(PageElement):
         Avoids issues with tag.contents.index(element) getting the
         index of equal elements.
 
+        A Tag with a lot of children remembers where it found each
+        one, so that finding a child again is quick as long as the
+        children before it haven't moved. When they have, only the
+        children between the first one that moved and `element` are
+        looked at again. This makes it cheap to remove many children
+        from a big Tag in document order or in reverse, but removing
+        them in random order still takes quadratic time.
+
         :param element: Look for this PageElement in `self.contents`.
         """
-        for i, child in enumerate(self.contents):
+        contents = self.contents
+        if len(contents) < self.CHILD_POSITIONS_THRESHOLD:
+            for i, child in enumerate(contents):
+                if child is element:
+                    return i
+            raise ValueError("Tag.index: element not in tag")
+
+        # _child_positions is a 2-item list: a dictionary mapping the
+        # id() of each child to where it was last seen, and the number
+        # of children at the start of .contents that haven't moved
+        # since then.
+        cache = self._child_positions
+        if cache is None:
+            cache = self._child_positions = [{}, 0]
+        positions, unmoved = cache
+        i = positions.get(id(element))
+        if i is not None and i < len(contents) and contents[i] is element:
+            return i
+
+        # Renumber the children that might have moved, until
+        # `element` turns up. Children that were taken out of this
+        # Tag leave their positions behind, so once there are too
+        # many of those, start from scratch.
+        start = min(unmoved, len(contents))
+        if start == 0 or len(positions) > 2 * len(contents):
+            start = 0
+            positions = cache[0] = {}
+        for i in range(start, len(contents)):
+            child = contents[i]
+            positions[id(child)] = i
+            if child is element:
+                cache[1] = i + 1
+                return i
+        cache[1] = len(contents)
+
+        # .contents must have been changed directly. Start over.
+        for i in range(start):
+            child = contents[i]
+            positions[id(child)] = i
             if child is element:
+                cache[1] = i + 1
                 return i
         raise ValueError("Tag.index: element not in tag")
 
+    def _extract_children(self, start, end):
+        """Take the children in `self.contents[start:end]` out of the
+        tree, connecting the elements on either side of them once
+        instead of once per child.
+
+        :return: A list of the extracted PageElements.
+        """
+        batch = BatchEdit.covering(self)
+        if batch is not None:
+            children = batch.extract_children(self, start, end)
+            if children:
+                self._notify('extract', children, start)
+            return children
+        children = self.contents[start:end]
+        if not children:
+            return children
+        first = children[0]
+        last_element = children[-1]._last_descendant()
+        previous_element = first.previous_element
+        next_element = last_element.next_element
+        if (previous_element is not None and
+            previous_element is not next_element):
+            previous_element.next_element = next_element
+        if next_element is not None and next_element is not previous_element:
+            next_element.previous_element = previous_element
+
+        previous_sibling = first.previous_sibling
+        next_sibling = children[-1].next_sibling
+        if previous_sibling is not None:
+            previous_sibling.next_sibling = next_sibling
+        if next_sibling is not None:
+            next_sibling.previous_sibling = previous_sibling
+
+        # Cut each child off from the others. A child's last
+        # descendant is whatever comes just before its next sibling.
+        for child in children:
+            if child is children[-1]:
+                child_last_element = last_element
+            else:
+                child_last_element = child.next_sibling.previous_element
+            child_last_element.next_element = None
+            child.previous_element = None
+            child.parent = child.previous_sibling = child.next_sibling = None
+
+        del self.contents[start:end]
+        self._children_moved(start)
+        self._notify('extract', children, start)
+        return children
+
+    def _children_moved(self, position):
+        """Note that the children at `position` and later in
+        .contents have moved. See index().
+        """
+        cache = self._child_positions
+        if cache is not None and cache[1] > position:
+            cache[1] = position
+
+    # The categories used by memory_report().
+    MEMORY_CATEGORIES = (
+        'tags', 'text', 'instance_dicts', 'attribute_dicts',
+        'attribute_values', 'child_lists', 'other'
+    )
+
+    def memory_report(self):
+        """Estimate how much memory this Tag and everything beneath it
+        takes up.
+
+        Sizes come from sys.getsizeof(). An object shared between
+        several elements, like a tag's settings or an attribute value
+        used in many places, is only counted the first time it's
+        found.
+
+        :return: A dictionary with these keys:
+           'total': The total number of bytes.
+           'nodes': The number of PageElements, including this one.
+           'by_category': Bytes used for each of MEMORY_CATEGORIES:
+              the Tag objects, the strings (including their text),
+              instance dictionaries, attribute dictionaries, attribute
+              names and values, .contents lists, and anything else.
+           'by_class': For each PageElement subclass name, a
+              dictionary with 'count' and 'bytes'.
+           'by_name': The same, for each tag name.
+        """
+        import gc
+        seen = set()
+        by_category = dict((category, 0) for category in self.MEMORY_CATEGORIES)
+        by_class = {}
+        by_name = {}
+
+        def size(obj, category):
+            if obj is None or id(obj) in seen:
+                return 0
+            seen.add(id(obj))
+            value = sys.getsizeof(obj)
+            by_category[category] += value
+            return value
+
+        def add(table, key, value):
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = dict(count=0, bytes=0)
+            entry['count'] += 1
+            entry['bytes'] += value
+
+        nodes = 0
+        elements = [self]
+        elements.extend(self.descendants)
+        for element in elements:
+            nodes += 1
+            if isinstance(element, Tag):
+                total = size(element, 'tags')
+                attrs = element.attrs
+                total += size(attrs, 'attribute_dicts')
+                for key, value in attrs.items():
+                    total += size(key, 'attribute_values')
+                    total += size(value, 'attribute_values')
+                    if isinstance(value, list):
+                        for item in value:
+                            total += size(item, 'attribute_values')
+                total += size(element.contents, 'child_lists')
+                total += size(element._config, 'other')
+                total += size(element._namespaces, 'other')
+                exclude = (attrs, element._namespaces)
+            else:
+                total = size(element, 'text')
+                exclude = ()
+            # Looking at an object's __dict__ would create it if it
+            # didn't exist, so look for it among the objects it
+            # refers to.
+            for referent in gc.get_referents(element):
+                if (type(referent) is dict
+                    and not any(referent is x for x in exclude)):
+                    total += size(referent, 'instance_dicts')
+            add(by_class, element.__class__.__name__, total)
+            if isinstance(element, Tag):
+                add(by_name, element.name, total)
+        return dict(
+            total=sum(by_category.values()), nodes=nodes,
+            by_category=by_category, by_class=by_class, by_name=by_name
+        )
+
     def get(self, key, default=None):
         """Returns the value of the 'key' attribute for the tag, or
         the value given for 'default' if it doesn't have that
@@ -1511,7 +2260,59 @@ class Tag(PageElement):
         return key in self.attrs
 
     def __hash__(self):
-        return str(self).__hash__()
+        """A Tag's hash is calculated from its attributes and the shape
+        of its tree: its name and the names and strings of its
+        descendants. Equal Tags have the same hash.
+
+        The hash of the shape is remembered until this Tag or one of
+        its descendants is renamed, or has elements added or removed.
+        Attribute values are often changed in place
+        (tag['class'].append('x')), so they're left out of the
+        remembered part: this Tag's own attributes are hashed every
+        time, and its descendants' attributes aren't hashed at all.
+        """
+        value = self._cached_hash()
+        if value is None:
+            value = self._structural_hash()
+        return hash((value, _attribute_hash(self.attrs)))
+
+    def _cached_hash(self):
+        """Return the hash of this Tag's shape if it's been
+        calculated since the last time the shape changed, or None
+        otherwise.
+        """
+        return self._hash
+
+    def _cache_hash(self, value):
+        """Remember the hash of this Tag's shape until it changes."""
+        self._hash = value
+
+    def _structural_hash(self):
+        """Calculate the hash of this Tag's shape, and of the shape
+        of every descendant Tag that doesn't have one remembered.
+
+        The tree is walked without recursion, and each Tag's hash is
+        calculated after the hashes of its children.
+        """
+        stack = [(self, iter(self.contents), [])]
+        while stack:
+            tag, children, hashes = stack[-1]
+            for child in children:
+                if not isinstance(child, Tag):
+                    hashes.append(hash(child))
+                    continue
+                value = child._cached_hash()
+                if value is None:
+                    stack.append((child, iter(child.contents), []))
+                    break
+                hashes.append(value)
+            else:
+                stack.pop()
+                value = hash((tag.name, tuple(hashes)))
+                tag._cache_hash(value)
+                if stack:
+                    stack[-1][2].append(value)
+        return value
 
     def __getitem__(self, key):
         """tag[key] returns the value of the 'key' attribute for the Tag,
@@ -1527,6 +2328,9 @@ class Tag(PageElement):
         return len(self.contents)
 
     def __contains__(self, x):
+        if getattr(x, 'parent', None) is self:
+            # Membership by identity is cheap.
+            return True
         return x in self.contents
 
     def __bool__(self):
@@ -1537,10 +2341,13 @@ class Tag(PageElement):
         """Setting tag[key] sets the value of the 'key' attribute for the
         tag."""
         self.attrs[key] = value
+        self._notify('set_attribute', [self], key)
 
     def __delitem__(self, key):
         "Deleting tag[key] deletes all 'key' attributes for the tag."
-        self.attrs.pop(key, None)
+        if key in self.attrs:
+            del self.attrs[key]
+            self._notify('delete_attribute', [self], key)
 
     def __call__(self, *args, **kwargs):
         """Calling a Tag like a function is the same as calling its
@@ -1561,6 +2368,16 @@ class Tag(PageElement):
                 DeprecationWarning
             )
             return self.find(tag_name)
+        elif tag == '_config':
+            # This Tag was created without calling the constructor.
+            return _TagConfiguration.DEFAULT
+        elif tag in ('_hash', '_child_positions'):
+            # A cache that hasn't been set up.
+            return None
+        elif tag == '_decomposed':
+            # Don't search the tree just to find out this Tag hasn't
+            # been decomposed.
+            return False
         # We special case contents to avoid recursion.
         elif not tag.startswith("__") and not tag == "contents":
             return self.find(tag)
@@ -1570,18 +2387,35 @@ class Tag(PageElement):
     def __eq__(self, other):
         """Returns true iff this Tag has the same name, the same attributes,
         and the same contents (recursively) as `other`."""
-        if self is other:
-            return True
-        if (not hasattr(other, 'name') or
-            not hasattr(other, 'attrs') or
-            not hasattr(other, 'contents') or
-            self.name != other.name or
-            self.attrs != other.attrs or
-            len(self) != len(other)):
-            return False
-        for i, my_child in enumerate(self.contents):
-            if my_child != other.contents[i]:
+        # The trees are compared without recursion, so that deeply
+        # nested Tags can be compared.
+        pairs = [(self, other)]
+        while pairs:
+            mine, theirs = pairs.pop()
+            if mine is theirs:
+                continue
+            if isinstance(theirs, Tag):
+                # If the hashes of both trees' shapes are known,
+                # they're a quick way to tell that two Tags are
+                # different.
+                my_hash = mine._cached_hash()
+                their_hash = theirs._cached_hash()
+                if (my_hash is not None and their_hash is not None
+                    and my_hash != their_hash):
+                    return False
+            if (not hasattr(theirs, 'name') or
+                not hasattr(theirs, 'attrs') or
+                not hasattr(theirs, 'contents') or
+                mine.name != theirs.name or
+                mine.attrs != theirs.attrs or
+                len(mine.contents) != len(theirs.contents)):
                 return False
+            children = list(zip(mine.contents, theirs.contents))
+            for my_child, their_child in reversed(children):
+                if isinstance(my_child, Tag) and isinstance(their_child, Tag):
+                    pairs.append((my_child, their_child))
+                elif my_child != their_child:
+                    return False
         return True
 
     def __ne__(self, other):
@@ -1912,6 +2746,15 @@ class Tag(PageElement):
         """
         if not len(self.contents):
             return
+        if BatchEdit.covering(self) is not None:
+            # next_element might be out of date, so go by .contents.
+            stack = list(reversed(self.contents))
+            while stack:
+                current = stack.pop()
+                yield current
+                if isinstance(current, Tag):
+                    stack.extend(reversed(current.contents))
+            return
         stopNode = self._last_descendant().next_element
         current = self.contents[0]
         while current is not stopNode:
@@ -1997,6 +2840,10 @@ class Tag(PageElement):
         )
         return self.has_attr(key)
 
+# The descriptors for Tag._STATE_SLOTS, looked up once so that
+# Tag._clear_slots() doesn't have to.
+_TAG_STATE_DESCRIPTORS = tuple(Tag.__dict__[name] for name in Tag._STATE_SLOTS)
+
 # Next, a couple classes to represent queries and their results.
 class SoupStrainer(object):
     """Encapsulates a number of ways of matching a markup element (tag or
@@ -2289,3 +3136,232 @@ class ResultSet(list):
         raise AttributeError(
             "ResultSet object has no attribute '%s'. You're probably treating a list of elements like a single element. Did you call find_all() when you meant to call find()?" % key
         )
+
+
+class BatchEdit(object):
+    """Keeps track of the changes made inside a
+    `BeautifulSoup.batch_edit()` block, so that the linkage of the
+    changed trees can be repaired all at once when the block ends.
+
+    While a BatchEdit is in effect, moving an element around only
+    updates .contents and .parent. The other attributes that connect
+    elements -- next_element, previous_element, next_sibling and
+    previous_sibling -- are rebuilt on the way out, for the changed
+    parts of the tree only.
+
+    A BatchEdit covers the changes made to `soup` and everything
+    beneath it, including elements taken out of it during the batch.
+    Changes to other trees are made as usual.
+    """
+
+    # The BatchEdits in effect, keyed by the id() of their `soup`.
+    _active = {}
+
+    def __init__(self, soup):
+        """Constructor.
+
+        :param soup: The BeautifulSoup object whose batch_edit()
+           method was called, or any other PageElement.
+        """
+        self.soup = soup
+        # The Tags whose .contents have changed, and the elements
+        # that have been extracted, keyed by id().
+        self.changed = {}
+        # The ids of elements known to be beneath `soup`, so that
+        # covering() doesn't have to walk all the way up every time.
+        self.inside = set([id(soup)])
+
+    @classmethod
+    def covering(cls, element):
+        """Find the BatchEdit in effect for the tree `element` belongs
+        to, if any.
+        """
+        active = cls._active
+        if not active:
+            return None
+        batches = list(active.values())
+        path = []
+        while True:
+            key = id(element)
+            for batch in batches:
+                if key in batch.inside:
+                    batch.inside.update(path)
+                    return batch
+            path.append(key)
+            if element.parent is None:
+                break
+            element = element.parent
+
+        # `element` is the root of its tree. If it was taken out of a
+        # tree during a batch, its linkage will be repaired when the
+        # batch ends, so it's still covered.
+        for batch in batches:
+            if key in batch.changed:
+                batch.inside.update(path)
+                return batch
+        return None
+
+    def __enter__(self):
+        # If this block is inside another one that covers the same
+        # tree, the outer block will take care of everything.
+        self.outer = self.covering(self.soup)
+        if self.outer is None:
+            self._active[id(self.soup)] = self
+        return self.soup
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.outer is None:
+            del self._active[id(self.soup)]
+            self.inside = None
+            self.repair()
+
+    def insert_children(self, tag, position, new_children):
+        """Put PageElements into `tag.contents`, leaving the linkage
+        to be repaired later.
+        """
+        for child in new_children:
+            child.parent = tag
+        tag.contents[position:position] = new_children
+        tag._children_moved(position)
+        self.changed[id(tag)] = tag
+
+    def extract_children(self, tag, start, end):
+        """Take the children in `tag.contents[start:end]` out of the
+        tree, leaving the linkage to be repaired later.
+
+        :return: A list of the extracted PageElements.
+        """
+        children = tag.contents[start:end]
+        inside = self.inside
+        for child in children:
+            child.parent = None
+            self.changed[id(child)] = child
+        if any(id(child) in inside for child in children):
+            # The elements beneath the extracted ones may end up in
+            # another tree, so they can't be assumed to be inside this
+            # one any more.
+            inside.clear()
+            inside.add(id(self.soup))
+        del tag.contents[start:end]
+        tag._children_moved(start)
+        self.changed[id(tag)] = tag
+        return children
+
+    def repair(self):
+        """Rebuild the linkage of every part of the tree that changed."""
+        changed = self.changed
+        self.changed = {}
+
+        # Only the changed elements that aren't inside other changed
+        # elements need to be relinked; relinking them takes care of
+        # everything beneath them. Beneath those, only the changed
+        # elements and their ancestors need to be looked at; every
+        # other subtree is still linked up correctly inside.
+        #
+        # The ids of elements known to be inside a changed element,
+        # and of elements known not to be, are kept so that no
+        # ancestor is looked at twice.
+        walk = set(changed)
+        inside = set()
+        outside = set()
+        tops = []
+        for element in changed.values():
+            path = []
+            parent = element.parent
+            while parent is not None:
+                key = id(parent)
+                if key in changed or key in inside:
+                    break
+                if key in outside:
+                    parent = None
+                    break
+                path.append(key)
+                parent = parent.parent
+            if parent is None:
+                outside.update(path)
+                tops.append(element)
+            else:
+                inside.update(path)
+                walk.update(path)
+
+        # Nothing can be relinked until `walk` is complete, since a
+        # top element may have been found before the changes beneath
+        # it.
+        for element in tops:
+            self.relink(element, walk)
+
+    def relink(self, top, walk=None):
+        """Rebuild the linkage of `top` and everything beneath it, and
+        connect it to its neighbors.
+
+        `top`'s parent, if any, must have correct linkage.
+
+        :param walk: The ids of the elements beneath `top` whose
+           linkage needs to be rebuilt. A subtree that contains none
+           of them is assumed to be linked up correctly inside, and
+           is only connected to its neighbors. By default, everything
+           beneath `top` is rebuilt.
+        """
+        # Put the siblings of every Tag in order, and list the
+        # elements in document order. Each subtree that doesn't need
+        # to be walked is listed along with its last descendant.
+        elements = []
+        stack = [top]
+        while stack:
+            element = stack.pop()
+            if (walk is not None and element is not top
+                and id(element) not in walk):
+                elements.append((element, element._last_descendant(False)))
+                continue
+            elements.append((element, element))
+            if isinstance(element, Tag) and element.contents:
+                previous = None
+                for child in element.contents:
+                    child.previous_sibling = previous
+                    if previous is not None:
+                        previous.next_sibling = child
+                    previous = child
+                previous.next_sibling = None
+                stack.extend(reversed(element.contents))
+
+        previous = None
+        for element, last in elements:
+            element.previous_element = previous
+            if previous is not None:
+                previous.next_element = element
+            previous = last
+        last = previous
+
+        parent = top.parent
+        if parent is None:
+            top.previous_sibling = top.next_sibling = None
+            last.next_element = None
+            return
+
+        # Find the elements on either side of `top`.
+        contents = parent.contents
+        i = parent.index(top)
+        if i == 0:
+            top.previous_sibling = None
+            previous_element = parent
+        else:
+            previous_sibling = contents[i - 1]
+            top.previous_sibling = previous_sibling
+            previous_sibling.next_sibling = top
+            previous_element = previous_sibling._last_descendant(False)
+        if i + 1 < len(contents):
+            next_element = contents[i + 1]
+            top.next_sibling = next_element
+            next_element.previous_sibling = top
+        else:
+            top.next_sibling = None
+            next_element = None
+            while next_element is None and parent is not None:
+                next_element = parent.next_sibling
+                parent = parent.parent
+
+        top.previous_element = previous_element
+        previous_element.next_element = top
+        last.next_element = next_element
+        if next_element is not None:
+            next_element.previous_element = last
@@ -0,0 +1,372 @@
+"""Parse trees that don't keep track of parse order.
+
+Every PageElement in an ordinary parse tree knows its parent, its
+children and its siblings. It also knows the elements parsed
+immediately before and after it (.previous_element and
+.next_element). Keeping that second chain of links consistent is a
+large part of the work done when a tree is built or modified.
+
+The elements of a LiteSoup tree only keep their parent, children and
+siblings up to date. .next_element and .previous_element are worked
+out from those links when something asks for them, so .descendants,
+find_next() and the other methods that go through the document in
+parse order still work, but building the tree and moving elements
+around is cheaper.
+
+This saves work more than memory. A LiteTag inherits Tag's slots
+for the two links and leaves them empty, so it's the same size as a
+Tag; only strings, which keep their links in a dictionary, get a
+little smaller.
+"""
+
+# Use of this source code is governed by the MIT license.
+__license__ = "MIT"
+
+__all__ = [
+    'LiteSoup',
+    'LiteTag',
+    'LiteNavigableString',
+]
+
+from bs4 import BeautifulSoup
+from bs4.element import (
+    CData,
+    Comment,
+    Declaration,
+    Doctype,
+    NavigableString,
+    PageElement,
+    PreformattedString,
+    ProcessingInstruction,
+    RubyParenthesisString,
+    RubyTextString,
+    Script,
+    Stylesheet,
+    Tag,
+    TemplateString,
+    XMLProcessingInstruction,
+)
+
+
+def _last_descendant(element):
+    """Find the last element beneath `element`, using only the
+    .contents of each Tag.
+    """
+    while isinstance(element, Tag) and element.contents:
+        element = element.contents[-1]
+    return element
+
+
+class _LiteElement(object):
+    """Behavior common to all the elements of a LiteSoup tree."""
+
+    __slots__ = ()
+
+    @property
+    def next_element(self):
+        """The element parsed immediately after this one, or None."""
+        if isinstance(self, Tag) and self.contents:
+            return self.contents[0]
+        element = self
+        while element is not None:
+            if element.next_sibling is not None:
+                return element.next_sibling
+            element = element.parent
+        return None
+
+    @next_element.setter
+    def next_element(self, value):
+        # Parse order is worked out from the structure of the tree,
+        # so there's nothing to store.
+        pass
+
+    @property
+    def previous_element(self):
+        """The element parsed immediately before this one, or None."""
+        if self.previous_sibling is not None:
+            return _last_descendant(self.previous_sibling)
+        return self.parent
+
+    @previous_element.setter
+    def previous_element(self, value):
+        pass
+
+    def setup(self, parent=None, previous_element=None, next_element=None,
+              previous_sibling=None, next_sibling=None):
+        """Sets up the initial relations between this element and
+        other elements.
+
+        `previous_element` and `next_element` are accepted for
+        compatibility with PageElement.setup(), and ignored.
+        """
+        self.parent = parent
+
+        self.next_sibling = next_sibling
+        if next_sibling is not None:
+            next_sibling.previous_sibling = self
+
+        if (previous_sibling is None
+            and parent is not None and parent.contents):
+            previous_sibling = parent.contents[-1]
+
+        self.previous_sibling = previous_sibling
+        if previous_sibling is not None:
+            previous_sibling.next_sibling = self
+
+    def _last_descendant(self, is_initialized=True, accept_self=True):
+        last_child = _last_descendant(self)
+        if not accept_self and last_child is self:
+            last_child = None
+        return last_child
+    _lastRecursiveChild = _last_descendant
+
+    def extract(self, _self_index=None):
+        """Destructively rips this element out of the tree.
+
+        :param _self_index: The location of this element in its parent's
+           .contents, if known.
+
+        :return: `self`, no longer part of the tree.
+        """
+        if (self.parent is not None
+            and not isinstance(self.parent, _LiteElement)):
+            # This element was inserted into an ordinary tree, whose
+            # elements need their parse order links fixed.
+            return PageElement.extract(self, _self_index)
+        if self.parent is not None:
+            if _self_index is None:
+                _self_index = self.parent.index(self)
+            del self.parent.contents[_self_index]
+            self.parent._children_moved(_self_index)
+        self.parent = None
+        if self.previous_sibling is not None:
+            self.previous_sibling.next_sibling = self.next_sibling
+        if self.next_sibling is not None:
+            self.next_sibling.previous_sibling = self.previous_sibling
+        self.previous_sibling = self.next_sibling = None
+        return self
+
+    def insert(self, position, *new_children):
+        """Insert one or more new PageElements in the list of this
+        PageElement's children.
+
+        This works the same way as `list.insert`. If a new child is
+        an ordinary PageElement, it and everything beneath it become
+        lite elements.
+
+        :param position: The numeric position that should be occupied
+           in `self.children` by the first new PageElement.
+        :param new_children: One or more PageElements.
+        """
+        # With no parse order links to fix, there's nothing to be
+        # gained by inserting the elements all at once.
+        for new_child in new_children:
+            position = self._insert(position, new_child)
+
+    def _insert(self, position, new_child):
+        """Insert a single PageElement.
+
+        :return: The position immediately after the new PageElement.
+        """
+        if new_child is None:
+            raise ValueError("Cannot insert None into a tag.")
+        if new_child is self:
+            raise ValueError("Cannot insert a tag into itself.")
+        if (isinstance(new_child, str)
+            and not isinstance(new_child, NavigableString)):
+            new_child = LiteNavigableString(new_child)
+
+        if isinstance(new_child, BeautifulSoup):
+            # Insert the children one at a time.
+            for subchild in list(new_child.contents):
+                position = self._insert(position, subchild)
+            return position
+        position = min(position, len(self.contents))
+        if hasattr(new_child, 'parent') and new_child.parent is not None:
+            if new_child.parent is self:
+                current_index = self.index(new_child)
+                if current_index < position:
+                    position -= 1
+            new_child.extract()
+        _make_lite(new_child)
+
+        new_child.parent = self
+        if position == 0:
+            previous_child = None
+        else:
+            previous_child = self.contents[position - 1]
+            previous_child.next_sibling = new_child
+        new_child.previous_sibling = previous_child
+        if position < len(self.contents):
+            next_child = self.contents[position]
+            next_child.previous_sibling = new_child
+        else:
+            next_child = None
+        new_child.next_sibling = next_child
+        self.contents.insert(position, new_child)
+        self._children_moved(position)
+        return position + 1
+
+
+class _LiteTag(_LiteElement):
+    """Behavior common to LiteTag and LiteSoup."""
+
+    __slots__ = ()
+
+    @property
+    def descendants(self):
+        """Iterate over all children of this Tag in document order.
+
+        :yield: A sequence of PageElements.
+        """
+        stack = [iter(self.contents)]
+        while stack:
+            for child in stack[-1]:
+                yield child
+                if isinstance(child, Tag) and child.contents:
+                    stack.append(iter(child.contents))
+                    break
+            else:
+                stack.pop()
+
+    def decompose(self):
+        """Recursively destroys this PageElement and its children."""
+        self.extract()
+        elements = [self]
+        elements.extend(self.descendants)
+        for i in elements:
+            i.__dict__.clear()
+            if isinstance(i, Tag):
+                i._clear_slots()
+            i.contents = []
+            i._decomposed = True
+
+    def _merge_strings(self, strings, batch=None):
+        merged = super(_LiteTag, self)._merge_strings(strings, batch)
+        _make_lite(merged)
+        return merged
+
+
+class LiteTag(_LiteTag, Tag):
+    """A Tag that doesn't keep its .next_element or .previous_element
+    up to date.
+
+    A LiteTag has all of Tag's slots, so it's exactly the same size
+    as a Tag.
+    """
+
+    __slots__ = ()
+
+    _wrapped_class = Tag
+
+
+class LiteNavigableString(_LiteElement, NavigableString):
+    """A NavigableString that doesn't keep its .next_element or
+    .previous_element up to date.
+
+    Strings keep those links in their instance dictionaries, so a
+    LiteNavigableString is a little smaller than a NavigableString.
+    """
+
+    __slots__ = ()
+
+    _wrapped_class = NavigableString
+
+
+_lite_classes = {
+    Tag: LiteTag,
+    NavigableString: LiteNavigableString,
+}
+
+def _lite_class(base):
+    """Find or create the lite version of a PageElement subclass."""
+    lite_class = _lite_classes.get(base)
+    if lite_class is None:
+        if issubclass(base, _LiteElement):
+            return base
+        if issubclass(base, Tag):
+            mixin = _LiteTag
+        else:
+            mixin = _LiteElement
+        lite_class = type('Lite' + base.__name__, (mixin, base),
+                          dict(__slots__=(), _wrapped_class=base))
+        _lite_classes[base] = lite_class
+    return lite_class
+
+# Create the lite versions of the standard string classes up front, so
+# that they can be found by name when a tree is unpickled.
+for _base in (
+        PreformattedString, CData, ProcessingInstruction,
+        XMLProcessingInstruction, Comment, Declaration, Doctype,
+        Stylesheet, Script, TemplateString, RubyTextString,
+        RubyParenthesisString,
+):
+    globals()[_lite_class(_base).__name__] = _lite_class(_base)
+del _base
+
+def _make_lite(element):
+    """Turn an element and everything beneath it into lite elements,
+    in place.
+    """
+    stack = [element]
+    while stack:
+        element = stack.pop()
+        if isinstance(element, _LiteElement):
+            # Everything beneath a lite element is already lite.
+            continue
+        if isinstance(element, Tag):
+            for name in ('next_element', 'previous_element'):
+                try:
+                    getattr(Tag, name).__delete__(element)
+                except AttributeError as e:
+                    pass
+            stack.extend(element.contents)
+        else:
+            element.__dict__.pop('next_element', None)
+            element.__dict__.pop('previous_element', None)
+        element.__class__ = _lite_class(type(element))
+
+
+class LiteSoup(_LiteTag, BeautifulSoup):
+    """A BeautifulSoup object whose tree doesn't keep track of parse
+    order.
+
+    The tree is made of LiteTag, LiteNavigableString and lite versions
+    of the other NavigableString subclasses. It acts just like an
+    ordinary tree, but .next_element and .previous_element are
+    calculated each time they're used, so code that follows them one
+    step at a time through a large document will be slower. Building
+    and changing the tree is faster, but it takes up about the same
+    amount of memory as an ordinary tree.
+    """
+
+    def __init__(self, markup="", features=None, builder=None,
+                 parse_only=None, from_encoding=None, exclude_encodings=None,
+                 element_classes=None, **kwargs):
+        element_classes = dict(element_classes or {})
+        element_classes[Tag] = _lite_class(element_classes.get(Tag, Tag))
+        super(LiteSoup, self).__init__(
+            markup, features, builder, parse_only, from_encoding,
+            exclude_encodings, element_classes, **kwargs
+        )
+
+    def string_container(self, base_class=None):
+        return _lite_class(
+            super(LiteSoup, self).string_container(base_class)
+        )
+
+    def object_was_parsed(self, o, parent=None, most_recent_element=None):
+        """Method called by the TreeBuilder to integrate an object into the parse tree."""
+        # Unlike BeautifulSoup.object_was_parsed(), there are no
+        # parse order links to fix if `o` is added to an element
+        # that was parsed earlier.
+        if parent is None:
+            parent = self.currentTag
+        _make_lite(o)
+        previous_sibling = next_sibling = None
+        if isinstance(o, Tag):
+            next_sibling = o.next_sibling
+            previous_sibling = o.previous_sibling
+        o.setup(parent, None, None, previous_sibling, next_sibling)
+        self._most_recent_element = o
+        parent.contents.append(o)
@@ -0,0 +1,474 @@
+"""Record the calls a tree builder makes while building a parse tree,
+and replay them later.
+
+A tree builder turns markup into a series of calls to
+BeautifulSoup.handle_starttag(), handle_data(), endData(),
+handle_endtag() and object_was_parsed(). A RecordingSoup writes those
+calls to a compact binary log as it parses a document. replay() feeds
+the log to a fresh BeautifulSoup object, which rebuilds an identical
+tree without tokenizing the markup, decoding entities or detecting the
+encoding.
+
+This is useful for rebuilding a tree in another process, and for
+measuring the cost of tree construction separately from the cost of
+parsing.
+"""
+
+# Use of this source code is governed by the MIT license.
+__license__ = "MIT"
+
+__all__ = [
+    'RecordingSoup',
+    'replay',
+]
+
+from bs4 import BeautifulSoup
+import bs4.element
+from bs4.builder import HTML_5
+from bs4.element import (
+    NamespacedAttribute,
+    NavigableString,
+    Tag,
+)
+
+MAGIC = b'BS4EVENTS'
+FORMAT_VERSION = 1
+
+# Opcodes for the events in the log.
+END_OF_EVENTS = 0
+START_TAG = 1
+END_TAG = 2
+DATA = 3
+END_DATA = 4
+OBJECT_PARSED = 5
+
+# Markers for attribute names and values.
+PLAIN_NAME = 0
+NAMESPACED_NAME = 1
+STRING_VALUE = 0
+NO_VALUE = 1
+LIST_VALUE = 2
+
+
+class _EventWriter(object):
+    """Writes events to a bytearray.
+
+    Strings, class references and namespace mappings are written out
+    the first time they're used, and referred to by number after
+    that. Reference 0 means None, reference 1 means a new value
+    follows, and reference n refers to the (n-2)th value seen so far.
+    """
+
+    def __init__(self):
+        self.out = bytearray(MAGIC)
+        self.out.append(FORMAT_VERSION)
+        self.strings = {}
+        self.classes = {}
+        self.namespace_mappings = {}
+
+    def byte(self, value):
+        self.out.append(value)
+
+    def number(self, value):
+        """Write a non-negative integer as a varint."""
+        out = self.out
+        while value > 0x7f:
+            out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    def optional_number(self, value):
+        if value is None:
+            self.number(0)
+        else:
+            self.number(value + 1)
+
+    def string(self, value):
+        if value is None:
+            self.number(0)
+            return
+        # NamespacedAttribute and other str subclasses are stored
+        # as plain strings.
+        value = str(value)
+        ref = self.strings.get(value)
+        if ref is not None:
+            self.number(ref)
+            return
+        self.strings[value] = len(self.strings) + 2
+        encoded = value.encode("utf8", "surrogatepass")
+        self.number(1)
+        self.number(len(encoded))
+        self.out += encoded
+
+    def class_reference(self, cls):
+        if cls is None:
+            self.number(0)
+            return
+        ref = self.classes.get(cls)
+        if ref is not None:
+            self.number(ref)
+            return
+        self.classes[cls] = len(self.classes) + 2
+        self.number(1)
+        self.string(cls.__module__)
+        self.string(cls.__qualname__)
+
+    def namespaces(self, mapping):
+        if mapping is None:
+            self.number(0)
+            return
+        key = tuple(mapping.items())
+        ref = self.namespace_mappings.get(key)
+        if ref is not None:
+            self.number(ref)
+            return
+        self.namespace_mappings[key] = len(self.namespace_mappings) + 2
+        self.number(1)
+        self.number(len(key))
+        for prefix, namespace in key:
+            self.string(prefix)
+            self.string(namespace)
+
+    def attributes(self, attrs):
+        if not attrs:
+            self.number(0)
+            return
+        self.number(len(attrs))
+        for key, value in attrs.items():
+            if isinstance(key, NamespacedAttribute):
+                self.byte(NAMESPACED_NAME)
+                self.string(key.prefix)
+                self.string(key.name)
+                self.string(key.namespace)
+            else:
+                self.byte(PLAIN_NAME)
+                self.string(key)
+            if value is None:
+                self.byte(NO_VALUE)
+            elif isinstance(value, str):
+                self.byte(STRING_VALUE)
+                self.string(value)
+            else:
+                self.byte(LIST_VALUE)
+                self.number(len(value))
+                for item in value:
+                    self.string(item)
+
+
+class _EventReader(object):
+    """Reads events written by an _EventWriter."""
+
+    def __init__(self, log, known_classes):
+        """Constructor.
+
+        :param log: The event log.
+        :param known_classes: A dictionary mapping (module name,
+            qualified name) to each string class the log may mention.
+        """
+        if not isinstance(log, (bytes, bytearray, memoryview)):
+            raise TypeError("An event log must be a bytestring.")
+        log = bytes(log)
+        if not log.startswith(MAGIC):
+            raise ValueError("This is not an event log.")
+        version = log[len(MAGIC)]
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                "Unsupported event log version: %d" % version)
+        self.log = log
+        self.pos = len(MAGIC) + 1
+        self.strings = []
+        self.known_classes = known_classes
+        self.classes = []
+        self.namespace_mappings = []
+
+    def byte(self):
+        value = self.log[self.pos]
+        self.pos += 1
+        return value
+
+    def number(self):
+        log = self.log
+        pos = self.pos
+        value = log[pos]
+        pos += 1
+        if value > 0x7f:
+            value &= 0x7f
+            shift = 7
+            while True:
+                b = log[pos]
+                pos += 1
+                value |= (b & 0x7f) << shift
+                if b < 0x80:
+                    break
+                shift += 7
+        self.pos = pos
+        return value
+
+    def optional_number(self):
+        value = self.number()
+        if value == 0:
+            return None
+        return value - 1
+
+    def string(self):
+        ref = self.number()
+        if ref == 0:
+            return None
+        if ref > 1:
+            return self.strings[ref - 2]
+        length = self.number()
+        start = self.pos
+        self.pos = start + length
+        value = self.log[start:self.pos].decode("utf8", "surrogatepass")
+        self.strings.append(value)
+        return value
+
+    def class_reference(self):
+        ref = self.number()
+        if ref == 0:
+            return None
+        if ref > 1:
+            return self.classes[ref - 2]
+        module_name = self.string()
+        qualname = self.string()
+        # Never import a module just because a log names it.
+        cls = self.known_classes.get((module_name, qualname))
+        if cls is None:
+            raise ValueError(
+                "%s.%s is not a string class this document can use." % (
+                    module_name, qualname))
+        self.classes.append(cls)
+        return cls
+
+    def namespaces(self):
+        ref = self.number()
+        if ref == 0:
+            return None
+        if ref > 1:
+            return self.namespace_mappings[ref - 2]
+        mapping = {}
+        for i in range(self.number()):
+            prefix = self.string()
+            mapping[prefix] = self.string()
+        self.namespace_mappings.append(mapping)
+        return mapping
+
+    def attributes(self):
+        attrs = {}
+        for i in range(self.number()):
+            if self.byte() == NAMESPACED_NAME:
+                prefix = self.string()
+                name = self.string()
+                key = NamespacedAttribute(prefix, name, self.string())
+            else:
+                key = self.string()
+            kind = self.byte()
+            if kind == STRING_VALUE:
+                value = self.string()
+            elif kind == NO_VALUE:
+                value = None
+            else:
+                value = [self.string() for j in range(self.number())]
+            attrs[key] = value
+        return attrs
+
+
+def _known_string_classes(soup):
+    """Find the string classes an event log may mention when it's
+    replayed into `soup`: the ones defined in bs4.element, plus any
+    the BeautifulSoup object or its tree builder is configured to use.
+    """
+    candidates = list(vars(bs4.element).values())
+    candidates.extend(soup.element_classes.values())
+    candidates.extend((soup.builder.string_containers or {}).values())
+    known = {}
+    for cls in candidates:
+        if isinstance(cls, type) and issubclass(cls, NavigableString):
+            known[(cls.__module__, cls.__qualname__)] = cls
+    return known
+
+
+class RecordingSoup(BeautifulSoup):
+    """A BeautifulSoup object that records the calls its tree builder
+    makes while building the tree.
+
+    Once the document is parsed, the recording is available as
+    `event_log`, a bytestring that can be passed into replay().
+
+    html5lib builds its tree directly rather than through these
+    calls, so it can't be used with a RecordingSoup.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._event_writer = None
+        self._recording_depth = 0
+        super(RecordingSoup, self).__init__(*args, **kwargs)
+        writer = self._event_writer
+        writer.byte(END_OF_EVENTS)
+        writer.string(self.original_encoding)
+        writer.string(self.declared_html_encoding)
+        writer.byte(1 if self.contains_replacement_characters else 0)
+        writer.namespaces(self._namespaces)
+        self.event_log = bytes(writer.out)
+        self._event_writer = None
+
+    def _feed(self):
+        if HTML_5 in self.builder.features:
+            raise ValueError(
+                "%s builds the tree directly, so its work can't be recorded."
+                % self.builder.NAME
+            )
+        # If the builder rejects the markup and we try again with a
+        # different encoding, the old recording is thrown away.
+        self._event_writer = _EventWriter()
+        super(RecordingSoup, self)._feed()
+
+    # Only calls made by the tree builder are recorded. Calls these
+    # methods make to each other are not.
+
+    def handle_starttag(self, name, namespace, nsprefix, attrs,
+                        sourceline=None, sourcepos=None, namespaces=None):
+        if self._recording_depth == 0:
+            # The Tag constructor modifies attrs, so it has to be
+            # recorded before the call.
+            writer = self._event_writer
+            writer.byte(START_TAG)
+            writer.string(name)
+            writer.string(namespace)
+            writer.string(nsprefix)
+            writer.attributes(attrs)
+            writer.optional_number(sourceline)
+            writer.optional_number(sourcepos)
+            writer.namespaces(namespaces)
+        self._recording_depth += 1
+        try:
+            return super(RecordingSoup, self).handle_starttag(
+                name, namespace, nsprefix, attrs, sourceline=sourceline,
+                sourcepos=sourcepos, namespaces=namespaces
+            )
+        finally:
+            self._recording_depth -= 1
+
+    def handle_endtag(self, name, nsprefix=None):
+        if self._recording_depth == 0:
+            writer = self._event_writer
+            writer.byte(END_TAG)
+            writer.string(name)
+            writer.string(nsprefix)
+        self._recording_depth += 1
+        try:
+            super(RecordingSoup, self).handle_endtag(name, nsprefix)
+        finally:
+            self._recording_depth -= 1
+
+    def handle_data(self, data):
+        if self._recording_depth == 0:
+            self._event_writer.byte(DATA)
+            self._event_writer.string(data)
+        super(RecordingSoup, self).handle_data(data)
+
+    def endData(self, containerClass=None):
+        if self._recording_depth == 0 and self._event_writer is not None:
+            self._event_writer.byte(END_DATA)
+            self._event_writer.class_reference(containerClass)
+        self._recording_depth += 1
+        try:
+            super(RecordingSoup, self).endData(containerClass)
+        finally:
+            self._recording_depth -= 1
+
+    def object_was_parsed(self, o, parent=None, most_recent_element=None):
+        if self._recording_depth == 0:
+            if (isinstance(o, Tag) or parent is not None
+                or most_recent_element is not None):
+                raise ValueError(
+                    "Only strings added to the current tag can be recorded."
+                )
+            self._event_writer.byte(OBJECT_PARSED)
+            self._event_writer.class_reference(o.__class__)
+            self._event_writer.string(o)
+        self._recording_depth += 1
+        try:
+            super(RecordingSoup, self).object_was_parsed(
+                o, parent, most_recent_element)
+        finally:
+            self._recording_depth -= 1
+
+
+def replay(event_log, features=None, builder=None, **kwargs):
+    """Rebuild a parse tree from the event log of a RecordingSoup.
+
+    A log can only mention the string classes defined in bs4.element
+    and the ones the new BeautifulSoup object is configured to use
+    through `element_classes` or the tree builder's
+    `string_containers`. Any other class is a ValueError.
+
+    :param event_log: The `event_log` of a RecordingSoup.
+    :param features: The tree builder to use, as for the BeautifulSoup
+        constructor. The tree builder doesn't parse anything, but it
+        decides things like which attributes are multi-valued. To get an
+        identical tree, use the same tree builder, options and
+        `parse_only` that were used to make the recording.
+    :param builder: A TreeBuilder class or instance, as for the
+        BeautifulSoup constructor.
+    :param kwargs: Any other arguments to the BeautifulSoup
+        constructor. `from_encoding` and `exclude_encodings` are
+        ignored.
+    :return: A BeautifulSoup object.
+    """
+    # The encoding was already detected when the log was recorded.
+    kwargs.pop('from_encoding', None)
+    kwargs.pop('exclude_encodings', None)
+    soup = BeautifulSoup("", features, builder, **kwargs)
+    reader = _EventReader(event_log, _known_string_classes(soup))
+    soup.reset()
+    soup.builder.initialize_soup(soup)
+
+    handle_starttag = soup.handle_starttag
+    handle_endtag = soup.handle_endtag
+    handle_data = soup.handle_data
+    endData = soup.endData
+    object_was_parsed = soup.object_was_parsed
+    next_event = reader.byte
+    string = reader.string
+    while True:
+        event = next_event()
+        if event == DATA:
+            handle_data(string())
+        elif event == START_TAG:
+            name = string()
+            namespace = string()
+            nsprefix = string()
+            attrs = reader.attributes()
+            sourceline = reader.optional_number()
+            sourcepos = reader.optional_number()
+            handle_starttag(
+                name, namespace, nsprefix, attrs, sourceline=sourceline,
+                sourcepos=sourcepos, namespaces=reader.namespaces()
+            )
+        elif event == END_TAG:
+            name = string()
+            handle_endtag(name, string())
+        elif event == END_DATA:
+            endData(reader.class_reference())
+        elif event == OBJECT_PARSED:
+            cls = reader.class_reference()
+            object_was_parsed(cls(string()))
+        elif event == END_OF_EVENTS:
+            break
+        else:
+            raise ValueError("Unknown event in event log: %d" % event)
+
+    # Close out the document the same way BeautifulSoup._feed does.
+    endData()
+    while soup.currentTag.name != soup.ROOT_TAG_NAME:
+        soup.popTag()
+
+    soup.original_encoding = string()
+    soup.declared_html_encoding = string()
+    soup.contains_replacement_characters = bool(next_event())
+    namespaces = reader.namespaces()
+    if namespaces:
+        soup._namespaces.update(namespaces)
+    soup.builder.soup = None
+    return soup
@@ -0,0 +1,147 @@
+"""Tests of the on-disk parse cache."""
+
+import os
+import pytest
+import warnings
+
+try:
+    import lxml.etree
+    LXML_PRESENT = True
+except ImportError as e:
+    LXML_PRESENT = False
+
+from bs4 import BeautifulSoup
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.cache import ParseCache
+from bs4.element import (
+    Comment,
+    SoupStrainer,
+)
+
+from . import SoupTest
+
+class TestParseCache(SoupTest):
+
+    markup = (
+        '<html><head><title>A title</title></head>'
+        '<body><p class="a b" id="1">Some <b>bold</b> text'
+        '<!--a comment--></p><pre>\n  pre</pre></body></html>'
+    )
+
+    def test_second_parse_is_loaded_from_cache(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        soup1 = cache.parse(self.markup, "html.parser")
+        soup2 = cache.parse(self.markup, "html.parser")
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert soup1 is not soup2
+        assert soup1 == soup2
+        assert soup1.decode() == soup2.decode()
+        self.linkage_validator(soup2)
+
+        # The cached tree is a normal tree: multi-valued attributes,
+        # string subclasses and line numbers survive the round trip.
+        p = soup2.p
+        assert p['class'] == ['a', 'b']
+        assert isinstance(p.contents[-1], Comment)
+        assert (p.sourceline, p.sourcepos) == (soup1.p.sourceline, soup1.p.sourcepos)
+        assert soup2.b.parent is p
+        p.b.string = "changed"
+        assert "changed" in soup2.decode()
+
+    def test_key_depends_on_markup_and_configuration(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        key = cache.key(self.markup, "html.parser")
+        assert key == cache.key(self.markup, "html.parser")
+        assert key != cache.key(self.markup + " ", "html.parser")
+        assert key != cache.key(self.markup.encode("utf8"), "html.parser")
+        assert key != cache.key(self.markup, "html5lib")
+        assert key != cache.key(
+            self.markup, "html.parser", multi_valued_attributes=None)
+        assert key != cache.key(
+            self.markup, builder=HTMLParserTreeBuilder(store_line_numbers=False)
+        )
+
+    def test_key_depends_on_tree_builder_not_features(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        key = cache.key(self.markup, "html.parser")
+        assert key == cache.key(self.markup, ["strict"])
+        assert key == cache.key(self.markup, builder=HTMLParserTreeBuilder)
+
+    def test_from_encoding_is_not_used_on_cache_hit(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        markup = self.markup.encode("utf8")
+        cache.parse(markup, "html.parser", from_encoding="utf8")
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            soup = cache.parse(markup, "html.parser", from_encoding="utf8")
+        assert [] == w
+        assert 1 == cache.hits
+        assert "bold" == soup.b.string
+
+    def test_parse_only_is_not_cached(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        strainer = SoupStrainer("b")
+        soup = cache.parse(self.markup, "html.parser", parse_only=strainer)
+        assert soup.decode() == "<b>bold</b>"
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_deeply_nested_document(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        markup = "<div>" * 5000 + "text" + "</div>" * 5000
+        cache.parse(markup, "html.parser")
+        soup = cache.parse(markup, "html.parser")
+        assert cache.hits == 1
+        assert soup.find(string="text").parent.name == "div"
+        assert len(soup.find_all("div")) == 5000
+
+    def test_least_recently_used_trees_are_evicted(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        documents = ["<p>%s</p>" % (str(i) * 1000) for i in range(3)]
+        for i, doc in enumerate(documents):
+            cache.parse(doc, "html.parser")
+            path = cache._path(cache.key(doc, "html.parser"))
+            os.utime(path, (i, i))
+        size = os.path.getsize(path)
+
+        # Use the oldest document, so the second one becomes the
+        # least recently used.
+        cache.parse(documents[0], "html.parser")
+        assert cache.hits == 1
+
+        cache.max_bytes = size * 3
+        cache.parse("<p>%s</p>" % ("x" * 1000), "html.parser")
+        assert len(cache._entries()) == 3
+        assert not os.path.exists(
+            cache._path(cache.key(documents[1], "html.parser")))
+        assert os.path.exists(
+            cache._path(cache.key(documents[0], "html.parser")))
+
+    def test_corrupt_entry_is_treated_as_a_miss(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        path = cache._path(cache.key(self.markup, "html.parser"))
+        with open(path, "wb") as fh:
+            fh.write(b"not a pickle")
+        soup = cache.parse(self.markup, "html.parser")
+        assert cache.misses == 1
+        assert soup.title.string == "A title"
+        assert cache.parse(self.markup, "html.parser") == soup
+        assert cache.hits == 1
+
+    def test_clear(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        cache.parse(self.markup, "html.parser")
+        cache.clear()
+        assert os.listdir(str(tmp_path)) == []
+
+    @pytest.mark.skipif(not LXML_PRESENT, reason="lxml is not installed")
+    def test_namespaces_survive_round_trip(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        markup = '<root xmlns:a="http://a/"><a:child a:attr="1"/></root>'
+        soup1 = cache.parse(markup, "xml")
+        soup2 = cache.parse(markup, "xml")
+        assert cache.hits == 1
+        assert soup2.decode() == soup1.decode()
+        assert soup2._namespaces == soup1._namespaces
+        child = soup2.find("a:child")
+        assert child.prefix == "a"
+        assert child.namespace == "http://a/"
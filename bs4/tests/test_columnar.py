@@ -0,0 +1,455 @@
+"""Tests of the array-backed, read-only document representation."""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import pytest
+
+try:
+    import lxml.etree
+    LXML_PRESENT = True
+except ImportError as e:
+    LXML_PRESENT = False
+
+from bs4 import BeautifulSoup
+import bs4.columnar
+from bs4.columnar import ColumnarDocument
+from bs4.element import (
+    Comment,
+    NavigableString,
+    ResultSet,
+    Tag,
+)
+
+from . import SoupTest
+
+class TestColumnarDocument(SoupTest):
+
+    markup = (
+        '<!DOCTYPE html><html><head><title>A title</title></head>'
+        '<body><p class="a b" id="1">Some <b>bold</b> text'
+        '<!--a comment--></p><p>Another <a href="x">link</a></p>'
+        '<pre>\n  pre</pre><br/></body></html>'
+    )
+
+    def document(self, markup=None):
+        soup = self.soup(markup or self.markup)
+        return soup, ColumnarDocument(soup)
+
+    def test_output_matches_original_tree(self):
+        soup, document = self.document()
+        root = document.root
+        assert isinstance(root, BeautifulSoup)
+        assert root.decode() == soup.decode()
+        assert root.prettify() == soup.prettify()
+        assert root == soup
+        assert root.get_text() == soup.get_text()
+        assert root.get_text("|", strip=True) == soup.get_text("|", strip=True)
+        assert list(root.strings) == list(soup.strings)
+
+    def test_navigation(self):
+        soup, document = self.document()
+        root = document.root
+        p = root.p
+        assert isinstance(p, Tag)
+        assert p.name == "p"
+        assert p['class'] == ['a', 'b']
+        assert p.parent is root.body
+        assert p.next_sibling is root.find_all('p')[1]
+        assert p.next_sibling.previous_sibling is p
+        assert p.previous_sibling is None
+        assert p.contents[0] == "Some "
+        assert isinstance(p.contents[0], NavigableString)
+        assert isinstance(p.contents[-1], Comment)
+        assert p.next_element is p.contents[0]
+        assert p.b.string.parent is p.b
+        assert p.sourceline == soup.p.sourceline
+        assert p.sourcepos == soup.p.sourcepos
+        assert root.br.is_empty_element
+        assert [x.name for x in p.parents] == ['body', 'html', '[document]']
+        assert list(root.descendants) == list(soup.descendants)
+        assert [str(x) for x in p.next_elements] == [
+            str(x) for x in soup.p.next_elements]
+        assert root.find(string="link").find_previous("b") is p.b
+
+    def test_search(self):
+        soup, document = self.document()
+        root = document.root
+        assert root.find_all("p") == soup.find_all("p")
+        assert root.find_all(class_="b")[0] is root.p
+        assert root.select("p > a")[0]['href'] == "x"
+        assert root.select_one("html > head > title").string == "A title"
+        assert root.a.string == "link"
+
+    def test_proxies_are_reused(self):
+        soup, document = self.document()
+        p = document.root.p
+        assert document.root.p is p
+        assert p.b.parent is p
+
+    def test_read_only(self):
+        soup, document = self.document()
+        p = document.root.p
+        for method, args in (
+                (p.append, ("x",)), (p.extract, ()), (p.decompose, ()),
+                (p.insert, (0, "x")), (p.clear, ()),
+                (p.contents[0].replace_with, ("x",)),
+        ):
+            with pytest.raises(TypeError):
+                method(*args)
+        with pytest.raises(TypeError):
+            p['id'] = 2
+        with pytest.raises(TypeError):
+            p.string = "new"
+        with pytest.raises(TypeError):
+            p.name = "div"
+        with pytest.raises(TypeError):
+            p.attrs['id'] = 2
+        assert document.root.decode() == soup.decode()
+
+    def test_copy_is_an_ordinary_tree(self):
+        soup, document = self.document()
+        p = copy.copy(document.root.p)
+        assert p.__class__ is Tag
+        assert p == soup.p
+        p['class'].append('c')
+        p.append("more")
+        assert p.contents[0].__class__ is NavigableString
+        assert p.contents[-2].__class__ is Comment
+        assert document.root.p['class'] == ['a', 'b']
+        self.linkage_validator(p)
+
+    def test_copy_and_pickle_frozen_document(self):
+        import pickle
+        soup, document = self.document()
+        root = document.root
+        for copied in (
+                copy.copy(root), copy.deepcopy(root),
+                pickle.loads(pickle.dumps(root))
+        ):
+            # The copy is a snapshot that can be modified.
+            assert isinstance(copied, BeautifulSoup)
+            assert copied == soup
+            copied.p.decompose()
+            assert root == soup
+        for copied in (
+                copy.deepcopy(root.p), pickle.loads(pickle.dumps(root.p))
+        ):
+            assert copied.__class__ is Tag
+            assert copied == soup.p
+
+    def test_frozen_document_cant_create_elements(self):
+        soup, document = self.document()
+        with pytest.raises(TypeError):
+            document.root.new_tag("a")
+        with pytest.raises(TypeError):
+            document.root.new_string("a")
+
+    def test_private_attributes_are_not_tag_names(self):
+        soup, document = self.document("<p><_private>x</_private></p>")
+        with pytest.raises(AttributeError):
+            document.root._private
+
+    def test_vectorized_queries(self):
+        soup, document = self.document("<div>" + self.markup * 3 + "</div>")
+        assert document.count("p") == 6
+        assert document.count() == len(soup.find_all(True))
+        assert document.tag_indices("a") == [
+            i for i, node in enumerate(soup.descendants, 1)
+            if getattr(node, 'name', None) == "a"
+        ]
+        assert document.find_all("title") == soup.find_all("title")
+        assert document.depth_histogram() == Counter(
+            len(list(tag.parents)) for tag in soup.find_all(True)
+        )
+        assert document.depth_histogram("b") == {5: 3}
+        assert document.count("nosuchtag") == 0
+        assert document.tag_indices("nosuchtag") == []
+
+    def test_vectorized_queries_without_numpy(self):
+        numpy = bs4.columnar.numpy
+        bs4.columnar.numpy = None
+        try:
+            self.test_vectorized_queries()
+            assert isinstance(
+                self.document()[1].column("depth"), bs4.columnar.array)
+        finally:
+            bs4.columnar.numpy = numpy
+
+    def test_deeply_nested_document(self):
+        soup, document = self.document(
+            "<div>" * 2000 + "text" + "</div>" * 2000)
+        assert document.count("div") == 2000
+        assert max(document.depth_histogram()) == 2000
+        assert document.root.find(string="text").parent.name == "div"
+
+    def test_uses_less_memory(self):
+        soup, document = self.document(self.markup * 100)
+        assert len(document) == len(list(soup.descendants)) + 1
+        assert document.nbytes < len(document) * 100
+
+    @pytest.mark.skipif(not LXML_PRESENT, reason="lxml is not installed")
+    def test_xml_namespaces(self):
+        markup = b'<root xmlns:a="http://a/"><a:child a:attr="1">text</a:child></root>'
+        soup = BeautifulSoup(markup, "xml")
+        document = ColumnarDocument(soup)
+        root = document.root
+        assert root.decode() == soup.decode()
+        child = root.find("a:child")
+        assert (child.prefix, child.namespace) == ("a", "http://a/")
+        assert list(child.attrs.keys())[0].namespace == "http://a/"
+        assert document.count("a:child") == 1
+        assert root.select("a|child", namespaces={"a": "http://a/"}) == [child]
+
+    def test_output_is_formatted_from_the_text_buffer(self):
+        markup = (
+            '<p>A &amp; B<!--c &amp; d--><script>if (a < b) {}</script>'
+            '<![CDATA[x < y]]></p><pre>\n  pre</pre>'
+        )
+        soup, document = self.document(markup)
+        root = document.root
+        for formatter in ("minimal", "html", None):
+            assert root.decode(formatter=formatter) == soup.decode(
+                formatter=formatter)
+        assert root.prettify() == soup.prettify()
+
+        # No proxies were created for the strings.
+        assert not any(
+            isinstance(x, NavigableString) for x in document._proxies.values()
+        )
+
+    def test_span(self):
+        soup, document = self.document()
+        b = document.root.b
+        start, end = document.span(b._index)
+        assert document.text[start:end] == "bold"
+        start, end = document.span(b.string._index)
+        assert document.text[start:end] == "bold"
+        start, end = document.span(0)
+        assert (start, end) == (0, len(document.text))
+        with pytest.raises(IndexError):
+            document.span(len(document))
+
+
+class TestFreeze(SoupTest):
+
+    markup = TestColumnarDocument.markup
+
+    def test_freeze(self):
+        soup = self.soup(self.markup)
+        frozen = soup.freeze()
+        assert isinstance(frozen, BeautifulSoup)
+        assert frozen.decode() == soup.decode()
+        assert isinstance(frozen.body.contents, tuple)
+        assert frozen.body.contents is frozen.body.contents
+        with pytest.raises(TypeError):
+            frozen.p['id'] = 2
+        with pytest.raises(TypeError):
+            frozen.p.string = "new"
+
+        # The original is unaffected, and can still be changed.
+        soup.p['id'] = 2
+        assert frozen.p['id'] == '1'
+
+    def test_find_all_by_name_uses_index(self):
+        soup = self.soup("<div>" + self.markup * 3 + "</div>")
+        frozen = soup.freeze()
+        for tag in (frozen, frozen.body, frozen.find_all('p')[2]):
+            original = soup.find_all(tag.name)[0] if tag is not frozen else soup
+            for name in ("p", "b", "br", "nosuchtag"):
+                found = tag.find_all(name)
+                assert isinstance(found, ResultSet)
+                assert found == original.find_all(name)
+            assert tag.find_all("p", limit=2) == original.find_all("p", limit=2)
+        assert frozen.body.b is frozen.find_all("b")[0]
+        assert "b" in frozen._document._tag_indexes
+
+        # Other searches still work.
+        assert frozen.find_all("p", class_="a") == soup.find_all("p", class_="a")
+        assert frozen.body.find_all("p", recursive=False) == soup.body.find_all(
+            "p", recursive=False)
+
+    def test_hash_is_cached(self):
+        soup = self.soup(self.markup)
+        frozen = soup.freeze()
+        assert hash(frozen.p) == hash(soup.p)
+        assert frozen._document._hashes[frozen.p._index] == soup.p._hash
+
+    def test_shared_between_threads(self):
+        soup = self.soup(self.markup * 50)
+        frozen = soup.freeze()
+        expected = soup.decode()
+        paragraphs = frozen.find_all("p")
+
+        def work(i):
+            same = all(
+                a is b for a, b in zip(frozen.find_all("p"), paragraphs))
+            return frozen.decode(), same, frozen.get_text()
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(work, range(16)))
+        for decoded, same, text in results:
+            assert decoded == expected
+            assert same
+            assert text == soup.get_text()
+
+
+class TestSnapshot(SoupTest):
+
+    markup = TestColumnarDocument.markup
+
+    def test_snapshot_of_frozen_document(self):
+        soup = self.soup(self.markup)
+        frozen = soup.freeze()
+        snapshot = frozen.snapshot()
+        assert isinstance(snapshot, BeautifulSoup)
+        assert snapshot.decode() == soup.decode()
+        assert snapshot == soup
+        self.linkage_validator(snapshot)
+        assert isinstance(snapshot.find(string="a comment"), Comment)
+        assert snapshot.p.sourceline == soup.p.sourceline
+
+        # Change the snapshot the same way as the original.
+        for tree in (snapshot, soup):
+            tree.p['class'].append('c')
+            tree.b.string = "changed"
+            tree.a.extract()
+            tree.br.insert_before(tree.new_tag("hr"))
+            tree.title.replace_with(tree.new_string("No title"))
+        assert snapshot.decode() == soup.decode()
+        self.linkage_validator(snapshot)
+
+        # The frozen document hasn't changed, so new snapshots start
+        # from the original.
+        assert frozen.p['class'] == ['a', 'b']
+        assert frozen.snapshot().decode() == frozen.decode()
+
+    def test_only_reached_elements_are_copied(self):
+        soup = self.soup("<div>" + "<p><b>bold</b></p>" * 100 + "</div>"
+                         + "<span>end</span>")
+        snapshot = soup.freeze().snapshot()
+        span = snapshot.contents[1]
+        span.string = "changed"
+        div = snapshot.div
+        assert Tag.contents.__get__(span, Tag) == ["changed"]
+        # The <div>'s children haven't been copied.
+        assert div._snapshot_source is not None
+        assert div.p.b.string == "bold"
+        assert div._snapshot_source is None
+        assert all(
+            p._snapshot_source is not None for p in Tag.contents.__get__(div, Tag)[1:])
+        assert snapshot.decode() == soup.decode().replace("end", "changed")
+
+    def test_snapshot_of_tag(self):
+        soup = self.soup(self.markup)
+        frozen = soup.freeze()
+        p = frozen.p.snapshot()
+        assert isinstance(p, Tag)
+        assert p.parent is None
+        assert p == soup.p
+        p.b.decompose()
+        assert "bold" not in p.decode()
+        assert "bold" in frozen.p.decode()
+
+    def test_soup_keeps_frozen_copy_until_changed(self):
+        soup = self.soup(self.markup)
+        first = soup.snapshot()
+        frozen = soup._frozen[1]
+        first.b.string = "changed"
+        second = soup.snapshot()
+        assert soup._frozen[1] is frozen
+        assert second.decode() == soup.decode()
+
+        soup.b.string = "changed"
+        third = soup.snapshot()
+        assert soup._frozen[1] is not frozen
+        assert third.decode() == soup.decode()
+        assert "changed" in third.b.decode()
+
+    def test_copy_and_pickle(self):
+        import pickle
+        soup = self.soup(self.markup)
+        snapshot = soup.snapshot()
+        snapshot.b.string = "changed"
+        for copied in (copy.copy(snapshot), pickle.loads(pickle.dumps(snapshot))):
+            assert copied.decode() == snapshot.decode()
+
+
+def _read_shared_document(name):
+    """Attach to a shared document from another process."""
+    document = ColumnarDocument.attach(name)
+    try:
+        root = document.root
+        return (root.decode(), [a['href'] for a in root.find_all('a')],
+                document.count('p'))
+    finally:
+        del root
+        document.close()
+
+
+@pytest.mark.skipif(
+    bs4.columnar.shared_memory is None, reason="Requires Python 3.8")
+class TestSharedMemory(SoupTest):
+
+    markup = TestColumnarDocument.markup
+
+    def test_share_and_attach(self):
+        soup = self.soup(self.markup)
+        block = ColumnarDocument(soup).share()
+        try:
+            document = ColumnarDocument.attach(block.name)
+            root = document.root
+            assert root.decode() == soup.decode()
+            assert root.get_text() == soup.get_text()
+            assert root.p['class'] == ['a', 'b']
+            assert root.p.b.parent is root.p
+            assert root.find_all('p') == soup.find_all('p')
+            assert document.count('p') == 2
+            assert document.tag_indices('a') == ColumnarDocument(
+                soup).tag_indices('a')
+            assert root.snapshot() == soup
+            del root
+            document.close()
+        finally:
+            block.close()
+            block.unlink()
+
+    def test_text_encodings(self):
+        for text in ("caf\N{LATIN SMALL LETTER E WITH ACUTE}",
+                     "\N{SNOWMAN} and \N{REPLACEMENT CHARACTER}",
+                     "\N{PILE OF POO}", "lone \ud800\udc00 surrogates", ""):
+            soup = self.soup("<p>%s</p><b>after</b>" % text)
+            block = ColumnarDocument(soup).share()
+            try:
+                document = ColumnarDocument.attach(block.name)
+                assert document.root.p.get_text() == text
+                assert document.root.b.string == "after"
+                assert document.root.decode() == soup.decode()
+                document.close()
+            finally:
+                block.close()
+                block.unlink()
+
+    def test_attach_from_other_process(self):
+        from concurrent.futures import ProcessPoolExecutor
+        soup = self.soup(self.markup * 10)
+        block = ColumnarDocument(soup).share()
+        try:
+            with ProcessPoolExecutor(2) as executor:
+                results = list(executor.map(
+                    _read_shared_document, [block.name] * 2))
+        finally:
+            block.close()
+            block.unlink()
+        for decoded, hrefs, count in results:
+            assert decoded == soup.decode()
+            assert hrefs == ['x'] * 10
+            assert count == 20
+
+    def test_not_a_document(self):
+        block = bs4.columnar.shared_memory.SharedMemory(create=True, size=64)
+        try:
+            with pytest.raises(ValueError):
+                ColumnarDocument.attach(block.name)
+        finally:
+            block.close()
+            block.unlink()
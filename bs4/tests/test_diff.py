@@ -0,0 +1,170 @@
+"""Tests of finding and applying the differences between parse trees."""
+
+import copy
+import pickle
+import random
+import pytest
+
+from bs4.diagnose import rdoc
+from bs4.diff import (
+    apply_patch,
+    diff,
+)
+from bs4.element import Comment
+
+from . import SoupTest
+
+class TestDiff(SoupTest):
+
+    def assert_patch_works(self, old_markup, new_markup):
+        old = self.soup(old_markup)
+        new = self.soup(new_markup)
+        old_before = old.decode()
+        new_before = new.decode()
+        edits = diff(old, new)
+
+        # Finding the differences doesn't change either tree.
+        assert old.decode() == old_before
+        assert new.decode() == new_before
+
+        patched = apply_patch(copy.copy(old), edits)
+        assert patched == new
+        assert patched.decode() == new.decode()
+        self.linkage_validator(patched)
+        return edits
+
+    def test_identical_trees(self):
+        markup = '<p class="a">Some <b>bold</b> text</p>'
+        assert [] == self.assert_patch_works(markup, markup)
+
+    def test_update_text(self):
+        edits = self.assert_patch_works(
+            "<p>a<b>b</b></p>", "<p>a<b>c</b></p>"
+        )
+        assert [('update_text', [0, 1, 0], 'c')] == edits
+
+    def test_update_text_keeps_string_class(self):
+        old = self.soup("<p><!--a comment--></p>")
+        new = self.soup("<p><!--another comment--></p>")
+        patched = apply_patch(old, diff(old, new))
+        assert isinstance(patched.p.contents[0], Comment)
+        assert patched.p.contents[0] == "another comment"
+
+    def test_string_class_change(self):
+        edits = self.assert_patch_works("<p>x</p>", "<p><!--x--></p>")
+        assert [('insert', [0, 0], Comment("x")), ('delete', [0, 1])] == edits
+        assert isinstance(edits[0][2], Comment)
+
+    def test_rename_after_hashing(self):
+        old = self.soup("<div><b>x</b></div>")
+        new = self.soup("<div><b>x</b></div>")
+        assert [] == diff(old, new)
+        new.div.b.name = "i"
+        edits = diff(old, new)
+        assert edits != []
+        assert apply_patch(old, edits) == new
+
+    def test_descendant_attribute_changed_in_place(self):
+        old = self.soup('<div><p class="a">x</p></div>')
+        new = self.soup('<div><p class="a">x</p></div>')
+        hash(old.div)
+        hash(new.div)
+        new.p['class'].append('b')
+        assert [('update_attr', [0, 0], 'class', ['a', 'b'])] == diff(old, new)
+
+    def test_update_attr(self):
+        edits = self.assert_patch_works(
+            '<p class="a" id="1" title="x">text</p>',
+            '<p class="a b" id="2">text</p>'
+        )
+        assert [
+            ('update_attr', [0], 'class', ['a', 'b']),
+            ('update_attr', [0], 'id', '2'),
+            ('update_attr', [0], 'title', None),
+        ] == edits
+
+    def test_insert_and_delete(self):
+        edits = self.assert_patch_works(
+            "<a>1</a><b>2</b><c>3</c>", "<a>1</a><c>3</c><d>4</d>"
+        )
+        assert [('insert', [3], self.soup("<d>4</d>").d),
+                ('delete', [1])] == edits
+
+    def test_move(self):
+        edits = self.assert_patch_works(
+            "<ul><li>a</li><li>b</li></ul><ol></ol>",
+            "<ul><li>a</li></ul><ol><li>b</li></ol>"
+        )
+        assert [('move', [0, 1], [1, 0])] == edits
+
+    def test_move_out_of_deleted_tag(self):
+        edits = self.assert_patch_works(
+            "<div><section><p>keep <b>this</b></p></section></div>",
+            "<div><p>keep <b>this</b></p></div>",
+        )
+        assert [('move', [0, 0, 0], [0, 0]), ('delete', [0, 1])] == edits
+
+    def test_move_into_inserted_tag(self):
+        edits = self.assert_patch_works(
+            "<div><p>keep <b>this</b></p></div>",
+            "<div><section><p>keep <b>this</b></p></section></div>",
+        )
+        assert 'move' == edits[-1][0]
+
+    def test_reorder(self):
+        self.assert_patch_works(
+            "<p>1</p><p>2</p><p>3</p><p>4</p>",
+            "<p>4</p><p>2</p><p>1</p><p>3</p>",
+        )
+
+    def test_many_repeated_children(self):
+        old = "<p>" + "<br/>\n" * 500 + "<b>old</b>" + "<br/>\n" * 500 + "</p>"
+        new = "<p>" + "<br/>\n" * 400 + "<b>new</b>" + "<br/>\n" * 600 + "</p>"
+        self.assert_patch_works(old, new)
+
+    def test_deeply_nested_tree(self):
+        markup = "<div>" * 2000 + "%s" + "</div>" * 2000
+        old = self.soup(markup % "old")
+        new = self.soup(markup % "new")
+        edits = diff(old, new)
+        assert [('update_text', [0] * 2001, 'new')] == edits
+        assert apply_patch(old, edits) == new
+
+    def test_random_changes(self):
+        random.seed(0)
+        for i in range(20):
+            old = self.soup(rdoc(200))
+            new = copy.copy(old)
+            tags = new.find_all(True)
+            for tag in random.sample(tags, min(len(tags), 3)):
+                tag['data-changed'] = 'yes'
+                tag.append("added text")
+            for tag in random.sample(tags, min(len(tags), 3)):
+                if tag.parent is not None:
+                    tag.unwrap()
+            self.assert_patch_works(old.decode(), new.decode())
+
+    def test_unrelated_documents(self):
+        random.seed(1)
+        self.assert_patch_works(rdoc(200), rdoc(200))
+
+    def test_patch_can_be_reused(self):
+        old = self.soup("<p>a</p>")
+        edits = diff(old, self.soup("<p>a</p><b>new</b>"))
+        edits = pickle.loads(pickle.dumps(edits))
+        for i in range(2):
+            patched = apply_patch(copy.copy(old), edits)
+            assert patched.decode() == "<p>a</p><b>new</b>"
+
+    def test_diff_tags(self):
+        old = self.soup("<div><p>a</p></div><span></span>")
+        new = self.soup("<div><p>b</p></div>")
+        edits = diff(old.div, new.div)
+        assert [('update_text', [0, 0], 'b')] == edits
+        apply_patch(old.div, edits)
+        assert old.decode() == "<div><p>b</p></div><span></span>"
+
+    def test_different_names(self):
+        soup = self.soup("<a></a><b></b>")
+        with pytest.raises(ValueError):
+            diff(soup.a, soup.b)
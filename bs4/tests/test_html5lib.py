@@ -24,15 +24,32 @@ class TestHTML5LibBuilder(SoupTest, HTML5TreeBuilderSmokeTest):
     def default_builder(self):
         return HTML5TreeBuilder
 
-    def test_soupstrainer(self):
-        # The html5lib tree builder does not support SoupStrainers.
+    def test_soupstrainer_sees_tree_after_html5lib_rearranges_it(self):
+        # The strainer is applied to the tree html5lib ends up with,
+        # not to the markup.
         strainer = SoupStrainer("b")
-        markup = "<p>A <b>bold</b> statement.</p>"
         with warnings.catch_warnings(record=True) as w:
-            soup = self.soup(markup, parse_only=strainer)
-        assert soup.decode() == self.document_for(markup)
+            soup = self.soup("<b>1<p>2</b>3</p>", parse_only=strainer)
+        assert [] == w
+        assert soup.decode() == "<b>1</b><b>2</b>"
+        self.linkage_validator(soup)
 
-        assert "the html5lib tree builder doesn't support parse_only" in str(w[0].message)
+        # Text moved out of a matching table is left out.
+        strainer = SoupStrainer("table", class_="keep")
+        markup = ('<table class="keep">stray<tr><td>cell</td></tr></table>'
+                  '<table><tr><td>other</td></tr></table>')
+        soup = self.soup(markup, parse_only=strainer)
+        assert soup.decode() == (
+            '<table class="keep"><tbody><tr><td>cell</td></tr></tbody></table>'
+        )
+        self.linkage_validator(soup)
+
+    def test_soupstrainer_for_strings(self):
+        strainer = SoupStrainer(string=["bold", "comment"])
+        markup = "<p>A <b>bold</b> statement</p><!--comment-->"
+        soup = self.soup(markup, parse_only=strainer)
+        assert soup.decode() == "bold<!--comment-->"
+        self.linkage_validator(soup)
 
     def test_correctly_nested_tables(self):
         """html5lib inserts <tbody> tags where other parsers don't."""
@@ -221,3 +238,76 @@ class TestHTML5LibBuilder(SoupTest, HTML5TreeBuilderSmokeTest):
             with_element = div.encode(formatter="html")
             expect = b"<div>%s</div>" % output_element
             assert with_element == expect
+
+    def test_text_is_coalesced(self):
+        # html5lib adds text to the tree a few characters at a time.
+        # The pieces end up in a single string.
+        markup = "<p>" + "a</a>" * 1000 + "<b>bold</b>" + "b</a>" * 10 + "</p>"
+        soup = self.soup(markup)
+        assert soup.p.contents == ["a" * 1000, soup.b, "b" * 10]
+        assert soup.b.next_element == "bold"
+        self.linkage_validator(soup)
+
+        # Text that's moved in front of a table is coalesced too.
+        soup = self.soup("<table>a</a>b</a>c<tr><td>cell</td></tr>d</a>e</table>")
+        assert soup.body.contents[0] == "abcde"
+        assert soup.body.contents[1].name == "table"
+        self.linkage_validator(soup)
+
+        # So is text in a document fragment.
+        from bs4.builder._html5lib import TreeBuilderForHtml5lib
+        import html5lib
+        parser = html5lib.HTMLParser(tree=TreeBuilderForHtml5lib)
+        fragment = parser.parseFragment("x</a>y</a>z<i>i</i>")
+        assert fragment.contents[0] == "xyz"
+        assert fragment.contents[0].next_element is fragment.i
+
+    def test_custom_string_classes(self):
+        # Text is coalesced, and comments are created, using the
+        # classes passed in as element_classes.
+        from bs4.element import Comment, NavigableString
+        class MyString(NavigableString):
+            pass
+        class MyComment(Comment):
+            pass
+        soup = self.soup(
+            "<table>a</a>b<tr><td>cell</td></tr></table><!--c-->",
+            element_classes={NavigableString: MyString, Comment: MyComment}
+        )
+        assert soup.body.contents[0] == "ab"
+        assert isinstance(soup.body.contents[0], MyString)
+        assert isinstance(soup.find(string="c"), MyComment)
+        self.linkage_validator(soup)
+
+    def test_formatting_elements_with_same_attributes(self):
+        # When a formatting element is reopened, html5lib reopens at
+        # most three copies of an element with the same attributes.
+        markup = '<p>' + '<b class="x y">' * 4 + 'x<p>y'
+        soup = self.soup(markup)
+        first, second = soup.find_all('p')
+        assert len(first.find_all('b')) == 4
+        assert len(second.find_all('b')) == 3
+        assert second.b['class'] == ['x', 'y']
+        self.linkage_validator(soup)
+
+    def test_cloned_element_has_its_own_attribute_values(self):
+        # The <b> tag is cloned when it's reopened inside the second
+        # <p> tag.
+        soup = self.soup('<p><b class="x y">1<p>2')
+        original, clone = soup.find_all('b')
+        assert original.parent is soup.p
+        assert clone['class'] == ['x', 'y']
+        assert clone['class'] is not original['class']
+        clone['class'].append('z')
+        assert original['class'] == ['x', 'y']
+
+    def test_attributes_are_set_when_tag_is_created(self):
+        markup = ('<html lang="en"><meta charset="utf8">'
+                  '<svg xlink:href="#a" class="a b"></svg><html class="c">')
+        soup = self.soup(markup)
+        assert soup.html.attrs == {'lang': 'en', 'class': ['c']}
+        assert soup.meta['charset'].original_value == 'utf8'
+        href, cls = list(soup.svg.attrs.items())
+        assert href == ('xlink:href', '#a')
+        assert href[0].namespace == 'http://www.w3.org/1999/xlink'
+        assert cls == ('class', ['a', 'b'])
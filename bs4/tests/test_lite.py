@@ -0,0 +1,155 @@
+"""Tests of trees that don't store parse order."""
+
+import copy
+import pickle
+import pytest
+
+try:
+    import lxml.etree
+    LXML_PRESENT = True
+except ImportError as e:
+    LXML_PRESENT = False
+
+try:
+    import html5lib
+    HTML5LIB_PRESENT = True
+except ImportError as e:
+    HTML5LIB_PRESENT = False
+
+from bs4 import BeautifulSoup
+from bs4.element import (
+    Comment,
+    NavigableString,
+    Script,
+    Tag,
+)
+from bs4.lite import (
+    LiteNavigableString,
+    LiteSoup,
+    LiteTag,
+)
+
+from . import SoupTest
+
+class TestLiteSoup(SoupTest):
+
+    markup = (
+        '<!DOCTYPE html><html><head><title>A title</title></head>'
+        '<body><p class="a b" id="1">Some <b>bold</b> text'
+        '<!--a comment--></p><p>Another <a href="x">link</a></p>'
+        '<script>if (a < b) {}</script><br/>tail</body></html>'
+    )
+
+    def assert_same_tree(self, lite, soup):
+        assert lite.decode() == soup.decode()
+        assert lite == soup
+        assert [str(x) for x in lite.descendants] == [
+            str(x) for x in soup.descendants]
+        self.linkage_validator(lite)
+        for tag in lite.find_all(True):
+            assert isinstance(tag, LiteTag)
+        for string in lite.find_all(string=True):
+            assert type(string).__name__ == 'Lite' + type(string).__bases__[-1].__name__
+
+    def test_tree_matches_ordinary_tree(self):
+        lite = LiteSoup(self.markup, "html.parser")
+        soup = self.soup(self.markup)
+        self.assert_same_tree(lite, soup)
+        assert isinstance(lite.find(string="a comment"), Comment)
+        assert isinstance(lite.script.string, Script)
+
+        b = lite.b
+        assert b.next_element == "bold"
+        assert b.previous_element == "Some "
+        assert b.string.next_element == " text"
+        assert lite.find(string="a comment").next_element.name == "p"
+        assert b.find_next("a")['href'] == "x"
+        assert b.find_previous("title").string == "A title"
+        assert [x.name for x in b.find_all_next(True)] == [
+            x.name for x in soup.b.find_all_next(True)]
+        assert lite.find(string="tail").next_element is None
+
+    def test_parse_order_is_not_stored(self):
+        lite = LiteSoup(self.markup, "html.parser")
+        string = lite.b.string
+        assert 'next_element' not in string.__dict__
+        assert 'previous_element' not in string.__dict__
+        with pytest.raises(AttributeError):
+            Tag.next_element.__get__(lite.b, Tag)
+
+    def test_modification(self):
+        lite = LiteSoup(self.markup, "html.parser")
+        soup = self.soup(self.markup)
+        for tree in (lite, soup):
+            tree.b.insert_after(tree.new_tag("i"))
+            tree.i.append("italic")
+            tree.a.extract()
+            tree.p.insert(0, tree.find_all("p")[1])
+            tree.br.replace_with("replaced")
+            tree.title.string = "New title"
+            tree.find(string="Another ").wrap(tree.new_tag("em"))
+            tree.em.unwrap()
+            tree.p.append(copy.copy(tree.b))
+            tree.script.decompose()
+            tree.body.smooth()
+        self.assert_same_tree(lite, soup)
+
+    def test_inserted_elements_become_lite(self):
+        lite = LiteSoup("<p>text</p>", "html.parser")
+        soup = self.soup("<div><b>bold</b>after</div>")
+        div = soup.div
+        lite.p.append(soup.b)
+        assert isinstance(lite.b, LiteTag)
+        assert isinstance(lite.b.string, LiteNavigableString)
+        assert 'next_element' not in lite.b.string.__dict__
+        self.linkage_validator(lite)
+
+        # The ordinary tree's links were updated.
+        self.linkage_validator(soup)
+        assert div.next_element == "after"
+
+        lite.p.append("plain string")
+        assert isinstance(lite.p.contents[-1], LiteNavigableString)
+
+    def test_lite_element_in_ordinary_tree(self):
+        lite = LiteSoup("<p><b>bold</b></p>", "html.parser")
+        soup = self.soup("<div>before<i>x</i>after</div>")
+        soup.i.insert_before(lite.b)
+        self.linkage_validator(soup)
+        soup.b.extract()
+        self.linkage_validator(soup)
+        assert soup.div.next_element == "before"
+        assert soup.find(string="before").next_element is soup.i
+
+    def test_copy_and_pickle(self):
+        lite = LiteSoup(self.markup, "html.parser")
+        for copied in (copy.copy(lite), pickle.loads(pickle.dumps(lite))):
+            assert isinstance(copied, LiteSoup)
+            assert copied.decode() == lite.decode()
+            self.linkage_validator(copied)
+            assert isinstance(copied.find(string="a comment"), Comment)
+            assert 'next_element' not in copied.b.string.__dict__
+
+    def test_deeply_nested_document(self):
+        markup = "<div>" * 2000 + "text" + "</div>" * 2000
+        lite = LiteSoup(markup, "html.parser")
+        assert len(list(lite.descendants)) == 2001
+        text = lite.find(string="text")
+        assert text.next_element is None
+        assert text.previous_element.name == "div"
+        assert text.find_previous("div") is text.parent
+        lite.div.decompose()
+        assert lite.contents == []
+
+    @pytest.mark.skipif(not LXML_PRESENT, reason="lxml is not installed")
+    def test_lxml(self):
+        self.assert_same_tree(
+            LiteSoup(self.markup, "lxml"), BeautifulSoup(self.markup, "lxml"))
+
+    @pytest.mark.skipif(not HTML5LIB_PRESENT, reason="html5lib is not installed")
+    def test_html5lib(self):
+        # html5lib moves elements around after they're parsed.
+        markup = '<table><tr><td>cell</td></tr>stray<b>text</b></table>'
+        for markup in (self.markup, markup, "<b><p>a</b>b</p>"):
+            self.assert_same_tree(
+                LiteSoup(markup, "html5lib"), BeautifulSoup(markup, "html5lib"))
@@ -2,6 +2,7 @@
 import copy
 import pickle
 import pytest
+import sys
 
 from soupsieve import SelectorSyntaxError
 
@@ -749,3 +750,70 @@ class TestPersistence(SoupTest):
         assert None == div_copy.find(string='Bar').next_element
         assert None != div.find(string='Bar').next_element
 
+
+    def test_copy_entire_soup_does_not_reparse(self):
+        soup = self.soup(self.page)
+
+        def feed(markup):
+            raise AssertionError("The document was parsed again.")
+        soup.builder.feed = feed
+        try:
+            soup_copy = copy.copy(soup)
+        finally:
+            del soup.builder.feed
+        assert soup_copy.decode() == soup.decode()
+        assert soup_copy.builder is soup.builder
+        self.linkage_validator(soup_copy)
+
+    def test_copy_entire_soup_preserves_tree_details(self):
+        html = '<p class="a b" id="1">Foo<!--comment--><br/></p>\n<b>Bar</b>'
+        soup = self.soup(html)
+        soup_copy = copy.copy(soup)
+        assert soup_copy == soup
+        p = soup_copy.p
+        assert (p.sourceline, p.sourcepos) == (
+            soup.p.sourceline, soup.p.sourcepos)
+        assert isinstance(p.contents[1], Comment)
+        assert p.parent is soup_copy
+        assert soup_copy.b.previous_element is soup_copy.contents[1]
+
+        # The copy can be modified without affecting the original.
+        p['class'].append("c")
+        p.br.decompose()
+        soup_copy.b.string = "Baz"
+        assert soup.p['class'] == ['a', 'b']
+        assert soup.decode() == html
+        self.linkage_validator(soup_copy)
+
+        # New markup can be parsed into the copy as if it were the
+        # original soup.
+        soup_copy.handle_starttag("i", None, None, {})
+        soup_copy.handle_endtag("i")
+        assert soup_copy.contents[-1].name == "i"
+
+    def test_copy_deeply_nested_soup(self):
+        soup = self.soup("<div>" * 2000 + "text" + "</div>" * 2000)
+        soup_copy = copy.copy(soup)
+        assert len(soup_copy.find_all("div")) == 2000
+        assert soup_copy.find(string="text").parent is soup_copy.find_all("div")[-1]
+
+    def test_copy_and_compare_deeply_nested_tag(self):
+        # Copying and comparing Tags doesn't use recursion, so it
+        # works on trees deeper than the recursion limit.
+        depth = sys.getrecursionlimit() + 100
+        soup = self.soup("<div>" * depth + "text" + "</div>" * depth)
+        div = soup.div
+        div_copy = copy.copy(div)
+        assert div_copy.parent is None
+        assert len(div_copy.find_all("div")) == depth - 1
+        assert len(list(div_copy.next_elements)) == depth
+        assert div == div_copy
+
+        # A difference at the bottom of the tree is noticed.
+        div_copy.find(string="text").replace_with("other text")
+        assert div != div_copy
+
+    def test_copy_soup_without_builder_reparses(self):
+        soup = pickle.loads(pickle.dumps(self.soup("<p>Foo</p>")))
+        soup.builder = None
+        assert copy.copy(soup).p.string == "Foo"
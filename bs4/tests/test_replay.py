@@ -0,0 +1,129 @@
+"""Tests of recording and replaying tree builder events."""
+
+import pytest
+import sys
+
+try:
+    import lxml.etree
+    LXML_PRESENT = True
+except ImportError as e:
+    LXML_PRESENT = False
+
+try:
+    import html5lib
+    HTML5LIB_PRESENT = True
+except ImportError as e:
+    HTML5LIB_PRESENT = False
+
+from bs4.element import (
+    Comment,
+    Doctype,
+    SoupStrainer,
+)
+from bs4.replay import (
+    RecordingSoup,
+    replay,
+)
+
+from . import SoupTest
+
+class TestReplay(SoupTest):
+
+    markup = (
+        '<!DOCTYPE html><html><head><title>A &amp; B</title></head>'
+        '<body>\n<p class="a b" id="1">Some <b>bold</b> text'
+        '<!--a comment--><br>after</p>\n<pre>\n  pre</pre>'
+        '<script>if (a < b) {}</script></body></html>'
+    )
+
+    def assert_replay_matches(self, markup, features, **kwargs):
+        recording = RecordingSoup(markup, features, **kwargs)
+        replayed = replay(recording.event_log, features, **kwargs)
+        assert replayed.decode() == recording.decode()
+        assert replayed == recording
+        self.linkage_validator(replayed)
+        assert replayed.original_encoding == recording.original_encoding
+        return recording, replayed
+
+    def test_html_parser(self):
+        recording, replayed = self.assert_replay_matches(
+            self.markup, "html.parser")
+        assert isinstance(replayed.contents[0], Doctype)
+        assert isinstance(replayed.find(string="a comment"), Comment)
+        assert replayed.p['class'] == ['a', 'b']
+        assert replayed.p.sourceline == recording.p.sourceline
+        assert replayed.p.sourcepos == recording.p.sourcepos
+        assert replayed.script.string.__class__ == recording.script.string.__class__
+
+    def test_encoding_is_recorded(self):
+        markup = '<p>caf\N{LATIN SMALL LETTER E WITH ACUTE}</p>'.encode("latin-1")
+        recording, replayed = self.assert_replay_matches(
+            markup, "html.parser", from_encoding="latin-1")
+        assert replayed.original_encoding == "latin-1"
+
+    def test_parse_only(self):
+        strainer = SoupStrainer("b")
+        recording, replayed = self.assert_replay_matches(
+            self.markup, "html.parser", parse_only=strainer)
+        assert replayed.decode() == "<b>bold</b>"
+
+    def test_event_log_is_compact(self):
+        markup = "<p class='x'>text</p>" * 1000
+        log = RecordingSoup(markup, "html.parser").event_log
+        # Repeated names, attribute values and strings are only
+        # written out once.
+        assert len(log) < len(markup)
+        assert log.count(b"text") == 1
+
+    def test_deeply_nested_document(self):
+        markup = "<div>" * 2000 + "text" + "</div>" * 2000
+        log = RecordingSoup(markup, "html.parser").event_log
+        soup = replay(log, "html.parser")
+        assert len(soup.find_all("div")) == 2000
+        assert soup.find(string="text").parent.parent.name == "div"
+
+    def test_only_known_string_classes_are_used(self):
+        recording = RecordingSoup("<p><!--a comment--></p>", "html.parser")
+        assert b"bs4.element" in recording.event_log
+        # A log can't make replay() import a module.
+        log = recording.event_log.replace(b"bs4.element", b"http.server")
+        already_imported = 'http.server' in sys.modules
+        with pytest.raises(ValueError):
+            replay(log, "html.parser")
+        assert ('http.server' in sys.modules) == already_imported
+
+    def test_invalid_log(self):
+        with pytest.raises(ValueError):
+            replay(b"<p>not a log</p>", "html.parser")
+        with pytest.raises(TypeError):
+            replay("a string", "html.parser")
+
+    @pytest.mark.skipif(not LXML_PRESENT, reason="lxml is not installed")
+    def test_lxml(self):
+        self.assert_replay_matches(self.markup, "lxml")
+
+    @pytest.mark.skipif(not LXML_PRESENT, reason="lxml is not installed")
+    def test_lxml_xml_namespaces(self):
+        markup = (
+            b'<?xml version="1.0"?><!DOCTYPE root><root xmlns:a="http://a/">'
+            b'<a:child a:attr="1"/><?pi data?><![CDATA[cdata]]></root>'
+        )
+        recording, replayed = self.assert_replay_matches(markup, "xml")
+        assert replayed._namespaces == recording._namespaces
+        child = replayed.find("a:child")
+        assert (child.prefix, child.namespace) == ("a", "http://a/")
+        assert list(child.attrs.keys())[0].namespace == "http://a/"
+        assert replayed.root._namespaces == recording.root._namespaces
+
+    @pytest.mark.skipif(not HTML5LIB_PRESENT, reason="html5lib is not installed")
+    def test_html5lib_cannot_be_recorded(self):
+        with pytest.raises(ValueError):
+            RecordingSoup(self.markup, "html5lib")
+
+    @pytest.mark.skipif(not HTML5LIB_PRESENT, reason="html5lib is not installed")
+    def test_replay_with_different_builder(self):
+        # The log can be replayed with any builder that builds trees
+        # through BeautifulSoup's event methods.
+        log = RecordingSoup(self.markup, "html.parser").event_log
+        soup = replay(log, "html5lib")
+        assert soup.p['class'] == ['a', 'b']
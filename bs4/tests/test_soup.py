@@ -385,6 +385,113 @@ class TestNewString(SoupTest):
         assert isinstance(s, Comment)
 
 
+class TestObservers(SoupTest):
+    """Test BeautifulSoup.version and BeautifulSoup.add_observer()."""
+
+    def observed(self, markup):
+        soup = self.soup(markup)
+        events = []
+        def observer(op, node, parent, index):
+            events.append((op, str(node), parent.name, index))
+        soup.add_observer(observer)
+        return soup, events, observer
+
+    def test_version_goes_up_on_every_change(self):
+        soup = self.soup("<a>1</a><b>2</b>")
+        version = soup.version
+        soup.a.append("x")
+        assert soup.version > version
+        version = soup.version
+        soup.b["class"] = "c"
+        assert soup.version > version
+        version = soup.version
+        soup.find(string="2").extract()
+        assert soup.version > version
+
+        # Looking at the tree doesn't change it.
+        version = soup.version
+        soup.decode()
+        soup.find_all(True)
+        assert version == soup.version
+
+    def test_parsing_is_not_a_change(self):
+        # html5lib fixes up misnested markup by moving elements
+        # around, but a freshly parsed document is at version 0
+        # whichever tree builder made it.
+        markup = "<b><p>x</b>y</p><table><tr>a<td>b</td></tr></table>"
+        for features in ('html.parser', 'lxml', 'html5lib'):
+            if builder_registry.lookup(features) is None:
+                continue
+            soup = BeautifulSoup(markup, features)
+            assert 0 == soup.version
+
+    def test_changes_to_detached_elements_are_not_counted(self):
+        soup = self.soup("<a>1</a>")
+        tag = soup.new_tag("b")
+        version = soup.version
+        tag.append("x")
+        tag["id"] = "y"
+        assert version == soup.version
+
+    def test_insert_and_extract(self):
+        soup, events, observer = self.observed("<a>1</a><b>2</b>")
+        soup.a.insert(0, "0")
+        soup.b.extend(["3", "4"])
+        soup.find(string="1").extract()
+        assert [
+            ('insert', '0', 'a', 0),
+            ('insert', '3', 'b', 1),
+            ('insert', '4', 'b', 2),
+            ('extract', '1', 'a', 1),
+        ] == events
+
+    def test_moving_an_element(self):
+        soup, events, observer = self.observed("<a>1</a><b>2</b>")
+        soup.b.append(soup.a)
+        assert [
+            ('extract', '<a>1</a>', '[document]', 0),
+            ('insert', '<a>1</a>', 'b', 1),
+        ] == events
+
+    def test_attributes(self):
+        soup, events, observer = self.observed("<a id='1'>1</a>")
+        soup.a["class"] = "x"
+        del soup.a["id"]
+        # Deleting an attribute that isn't there changes nothing.
+        del soup.a["id"]
+        assert [
+            ('set_attribute', '<a class="x" id="1">1</a>', 'a', 'class'),
+            ('delete_attribute', '<a class="x">1</a>', 'a', 'id'),
+        ] == events
+
+    def test_string_setter_and_smooth(self):
+        soup, events, observer = self.observed("<a>1</a>")
+        soup.a.string = "2"
+        soup.a.append("3")
+        del events[:]
+        soup.smooth()
+        assert [
+            ('extract', '2', 'a', 0),
+            ('extract', '3', 'a', 1),
+            ('insert', '23', 'a', 0),
+        ] == events
+
+    def test_remove_observer(self):
+        soup, events, observer = self.observed("<a>1</a>")
+        soup.remove_observer(observer)
+        soup.a.append("2")
+        assert [] == events
+
+    def test_observer_is_not_pickled(self):
+        # The observer is a local function, so it can't be pickled.
+        soup, events, observer = self.observed("<a>1</a>")
+        soup.a.append("2")
+        unpickled = pickle.loads(pickle.dumps(soup))
+        assert soup.version == unpickled.version
+        unpickled.a.append("3")
+        assert 1 == len(events)
+
+
 class TestPickle(SoupTest):
    # Test our ability to pickle the BeautifulSoup object itself.
 
@@ -462,3 +569,119 @@ class TestEncodingConversion(SoupTest):
 
 
 
+
+
+class TestReparseRange(SoupTest):
+    """Test the BeautifulSoup.reparse_range() method."""
+
+    markup = (
+        "<html><body>\n"
+        "<div id='a'><p>Hello <b>world</b></p>\n<p>second</p></div>\n"
+        "<div id='b'>x<i>y</i></div>\n"
+        "</body></html>"
+    )
+
+    def assert_matches_full_parse(self, soup, markup):
+        full = self.soup(markup)
+        assert soup.decode() == full.decode()
+        assert ([(t.name, t.sourceline, t.sourcepos)
+                 for t in soup.find_all(True)]
+                == [(t.name, t.sourceline, t.sourcepos)
+                    for t in full.find_all(True)])
+        self.linkage_validator(soup)
+
+    def test_edit_reparses_only_enclosing_element(self):
+        soup = self.soup(self.markup)
+        first_div = soup.find(id='a')
+        second_div = soup.find(id='b')
+        start = self.markup.index("world")
+        new_markup = soup.reparse_range(
+            (start, start + len("world")), "there", self.markup
+        )
+        assert new_markup == self.markup.replace("world", "there")
+        self.assert_matches_full_parse(soup, new_markup)
+
+        # Elements outside the edited region were left alone.
+        assert soup.find(id='a') is first_div
+        assert soup.find(id='b') is second_div
+        assert first_div.p.b.string == "there"
+
+    def test_edit_changing_line_numbers(self):
+        soup = self.soup(self.markup)
+        second_div = soup.find(id='b')
+        start = self.markup.index("Hello")
+        new_markup = soup.reparse_range(
+            (start, start + len("Hello")), "Hi<br>\n\n<i>there</i>",
+            self.markup
+        )
+        self.assert_matches_full_parse(soup, new_markup)
+        assert soup.find(id='b') is second_div
+        assert 6 == second_div.sourceline
+
+    def test_successive_edits(self):
+        soup = self.soup(self.markup)
+        markup = self.markup
+        for word in ["second", "x", "Hello"]:
+            start = markup.index(word)
+            markup = soup.reparse_range(
+                (start, start + len(word)), word.upper() + "\n", markup
+            )
+            self.assert_matches_full_parse(soup, markup)
+
+    def test_edit_that_leaves_tag_open_reparses_whole_document(self):
+        soup = self.soup(self.markup)
+        start = self.markup.index("second")
+        new_markup = soup.reparse_range((start, start), "<b>", self.markup)
+        self.assert_matches_full_parse(soup, new_markup)
+
+    def test_edit_that_closes_enclosing_tag_reparses_whole_document(self):
+        soup = self.soup(self.markup)
+        start = self.markup.index("world")
+        new_markup = soup.reparse_range(
+            (start, start), "</div>", self.markup
+        )
+        self.assert_matches_full_parse(soup, new_markup)
+
+    def test_edit_that_leaves_markup_unfinished_reparses_whole_document(self):
+        markup = "<div><p id='x'>a</p>\n<p id='y'>b</p><!--c--></div>"
+        for old, new in (("x'", "x"), ("'y'>", "'y'"), ("-->", "--")):
+            soup = self.soup(markup)
+            start = markup.index(old)
+            new_markup = soup.reparse_range(
+                (start, start + len(old)), new, markup
+            )
+            self.assert_matches_full_parse(soup, new_markup)
+
+    def test_edit_that_finishes_earlier_markup_reparses_whole_document(self):
+        # The comment is never closed, so html.parser treats '<!--'
+        # as text, until an edit further on closes it.
+        markup = "<b><!-->\n</i>x<p>y</p>\n<p>z</p></b>"
+        soup = self.soup(markup)
+        start = markup.index("y")
+        new_markup = soup.reparse_range((start, start), "-->", markup)
+        self.assert_matches_full_parse(soup, new_markup)
+
+    def test_successive_edits_moving_backwards(self):
+        # Each edit is located relative to the one before it.
+        markup = "".join("<p>line %d</p>\n" % i for i in range(20))
+        soup = self.soup(markup)
+        for i in (15, 3, 17, 0, 19):
+            start = markup.index("line %d<" % i)
+            markup = soup.reparse_range(
+                (start, start + 4), "LINE\n", markup
+            )
+            self.assert_matches_full_parse(soup, markup)
+
+    def test_edit_outside_any_element(self):
+        markup = "before<p>inside</p>after"
+        soup = self.soup(markup)
+        new_markup = soup.reparse_range((0, 6), "BEFORE", markup)
+        assert "BEFORE<p>inside</p>after" == soup.decode()
+        assert new_markup == soup.decode()
+
+    def test_invalid_span(self):
+        soup = self.soup(self.markup)
+        with pytest.raises(ValueError):
+            soup.reparse_range((5, 2), "", self.markup)
+        with pytest.raises(TypeError):
+            soup.reparse_range((0, 1), "", self.markup.encode("utf8"))
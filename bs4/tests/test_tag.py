@@ -1,7 +1,11 @@
+import copy
+import gc
+import sys
 import warnings
 from bs4.element import (
     Comment,
     NavigableString,
+    Tag,
 )
 from . import SoupTest
 
@@ -219,3 +223,229 @@ class TestMultiValuedAttributes(SoupTest):
         )
         assert soup.a['class'] == 'foo'
         assert soup.a['id'] == ['bar']
+
+
+class TestTagLayout(SoupTest):
+    """Test the memory-saving way Tag stores its data."""
+
+    def test_tags_have_no_instance_dictionary_by_default(self):
+        soup = self.soup('<p class="a">text</p>')
+        assert gc.get_referents(soup.p).count(soup.p.attrs) == 1
+        assert not any(
+            isinstance(x, dict) and x is not soup.p.attrs
+            for x in gc.get_referents(soup.p)
+        )
+
+    def test_builder_settings_are_shared(self):
+        soup = self.soup('<p>1</p><p>2</p><br/>')
+        p1, p2 = soup.find_all('p')
+        assert p1._config is p2._config
+        assert p1._config is not soup.br._config
+        assert p1.parser_class is soup.__class__
+        assert soup.hidden
+        assert not p1.hidden
+
+        # Changing a setting on one tag doesn't affect the others.
+        p1.hidden = True
+        p1.can_be_empty_element = True
+        assert p1.hidden and p1.can_be_empty_element
+        assert not p2.hidden and not p2.can_be_empty_element
+        assert str(soup) == '1<p>2</p><br/>'
+
+    def test_arbitrary_attributes_can_still_be_set(self):
+        tag = self.soup('<p>').p
+        tag.custom_attribute = "value"
+        assert tag.custom_attribute == "value"
+        assert tag.__getstate__()['custom_attribute'] == "value"
+
+    def test_unset_source_position_is_a_tag_lookup(self):
+        soup = self.soup(
+            '<p><sourceline>1</sourceline></p>', store_line_numbers=False
+        )
+        assert soup.p.sourceline.name == 'sourceline'
+        assert soup.p._source_position() == (None, None)
+
+    def test_unpickle_old_style_state(self):
+        # Objects pickled before Tag used __slots__ have all their
+        # state in one dictionary.
+        tag = Tag.__new__(Tag)
+        tag.__setstate__(dict(
+            name='b', namespace=None, prefix=None, attrs={}, contents=[],
+            parent=None, previous_element=None, next_element=None,
+            previous_sibling=None, next_sibling=None, _namespaces={},
+            parser_class=None, known_xml=False, hidden=False,
+            can_be_empty_element=False, cdata_list_attributes=None,
+            preserve_whitespace_tags=None,
+            interesting_string_types=(NavigableString,)
+        ))
+        tag.append("text")
+        assert tag.decode() == '<b>text</b>'
+        assert tag.get_text() == 'text'
+
+    def test_decompose_clears_slots(self):
+        soup = self.soup('<p><b>bold</b></p>')
+        b = soup.b
+        b.decompose()
+        assert b.decomposed
+        assert b.contents == []
+        assert b._source_position() == (None, None)
+
+
+class TestHash(SoupTest):
+    """Test the structural hash of a Tag."""
+
+    def test_equal_tags_have_equal_hashes(self):
+        soup = self.soup(
+            '<p class="a b" id="1">foo<b>bar</b></p>'
+            '<p id="1" class="a b">foo<b>bar</b></p>'
+            '<p class="a b" id="1">foo<b>baz</b></p>'
+        )
+        p1, p2, p3 = soup.find_all('p')
+        assert p1 == p2
+        assert hash(p1) == hash(p2)
+        assert p1 != p3
+        assert hash(p1) != hash(p3)
+        assert 2 == len(set([p1, p2, p3]))
+
+    def test_string_class_is_not_compared(self):
+        # As with str, a Comment is equal to a NavigableString with
+        # the same text.
+        soup = self.soup('<p>x</p><p><!--x--></p>')
+        p1, p2 = soup.find_all('p')
+        assert p1 == p2
+        assert hash(p1) == hash(p2)
+
+    def test_hash_is_cached(self):
+        soup = self.soup('<div><p><b>bold</b></p></div>')
+        hash(soup.div)
+        for tag in soup.find_all(True):
+            assert tag._hash is not None
+
+    def test_change_invalidates_hash(self):
+        soup = self.soup('<div><p><b>bold</b></p><p></p></div>')
+        div, p1, b, p2 = soup.find_all(True)
+        hash(p2)
+        unchanged = p2._hash
+
+        def changed(change, hash_changes=True):
+            # The change invalidates the hash of the Tag that
+            # changed and all of its ancestors, but not the hashes of
+            # other Tags.
+            before = hash(div)
+            change()
+            assert div._hash is None
+            assert p2._hash == unchanged
+            # A descendant's attributes aren't part of the hash.
+            assert (hash(div) != before) == hash_changes
+            assert hash(div) == hash(copy.copy(div))
+
+        changed(lambda: b.append("!"))
+        changed(lambda: b.__setitem__('id', 'x'), False)
+        changed(lambda: b.__delitem__('id'), False)
+        changed(lambda: setattr(b, 'name', 'strong'))
+        changed(lambda: b.contents[0].replace_with("new text"))
+        changed(lambda: b.wrap(soup.new_tag("i")))
+        changed(lambda: b.extract())
+
+        # The extracted Tag's hash is unaffected by its removal.
+        assert b._hash is not None
+        assert hash(b) == hash(copy.copy(b))
+
+    def test_rename_after_hashing(self):
+        soup = self.soup('<div><b>x</b></div><div><i>x</i></div>')
+        d1, d2 = soup.find_all('div')
+        assert d1 != d2
+        hash(d1)
+        hash(d2)
+        d1.b.name = "i"
+        assert d1 == d2
+        assert d1 in set([d2])
+
+    def test_attribute_change_after_hashing(self):
+        soup = self.soup('<div><b id="1">x</b></div><div><b>x</b></div>')
+        d1, d2 = soup.find_all('div')
+        hash(d1)
+        hash(d2)
+        del d1.b['id']
+        assert d1 == d2
+        assert d1 in set([d2])
+        d2.b['id'] = '1'
+        assert d1 != d2
+
+    def test_direct_attrs_change_after_hashing(self):
+        # Modifying .attrs directly, or changing an attribute value in
+        # place, doesn't stop equal Tags from having equal hashes.
+        soup = self.soup('<div><b id="1">x</b></div><div><b>x</b></div>')
+        d1, d2 = soup.find_all('div')
+        hash(d1)
+        hash(d2)
+        d1.b.attrs.clear()
+        assert d1 == d2
+        assert hash(d1) == hash(d2)
+
+        soup = self.soup('<p class="a">x</p><p class="a b">x</p>')
+        p1, p2 = soup.find_all('p')
+        assert hash(p1) != hash(p2)
+        p1['class'].append('b')
+        assert p1 == p2
+        assert hash(p1) == hash(p2)
+        p1.attrs['id'] = 'x'
+        assert p1 != p2
+        p2.attrs['id'] = 'x'
+        assert hash(p1) == hash(p2)
+
+    def test_hash_rejects_different_shapes(self):
+        soup = self.soup('<p><b>x</b></p><p><i>x</i></p><p><b>x</b></p>')
+        p1, p2, p3 = soup.find_all('p')
+        hash(p1)
+        hash(p2)
+        hash(p3)
+        assert p1 != p2
+        assert p1 == p3
+
+    def test_deeply_nested_tree(self):
+        depth = sys.getrecursionlimit() + 100
+        soup = self.soup("<div>" * depth + "text" + "</div>" * depth)
+        assert hash(soup.div) == hash(copy.copy(soup.div))
+
+
+class TestMemoryReport(SoupTest):
+
+    def test_memory_report(self):
+        soup = self.soup(
+            '<p class="a b">text<b>bold</b><!--comment--></p>' * 3
+        )
+        report = soup.memory_report()
+        assert report['nodes'] == len(list(soup.descendants)) + 1
+        assert report['total'] == sum(report['by_category'].values())
+        assert report['total'] == sum(
+            x['bytes'] for x in report['by_class'].values())
+        assert report['by_class']['Comment']['count'] == 3
+        assert report['by_class']['NavigableString']['count'] == 6
+        assert report['by_name']['p']['count'] == 3
+        assert report['by_name']['b']['count'] == 3
+        assert report['by_category']['text'] > 0
+        assert report['by_category']['child_lists'] > 0
+
+        # Walking the tree doesn't give Tags instance dictionaries.
+        assert soup.p.__class__.__name__ == 'Tag'
+        assert gc.get_referents(soup.p).count(soup.p.attrs) == 1
+        assert not any(
+            type(x) is dict and x is not soup.p.attrs
+            for x in gc.get_referents(soup.p)
+        )
+
+    def test_shared_objects_are_counted_once(self):
+        soup = self.soup('<p>text</p>')
+        report1 = soup.p.memory_report()
+        soup.p.append(soup.new_tag("b"))
+        soup.p.b['id'] = soup.p.b['class'] = "shared"
+        report2 = soup.p.memory_report()
+        value = sys.getsizeof("shared")
+        assert report2['by_category']['attribute_values'] == (
+            report1['by_category']['attribute_values'] + value
+            + sys.getsizeof("id") + sys.getsizeof("class"))
+
+    def test_deeply_nested_tree(self):
+        soup = self.soup("<div>" * 5000 + "</div>" * 5000)
+        assert soup.memory_report()['by_name']['div']['count'] == 5000
@@ -19,6 +19,7 @@ from bs4.builder import (
     HTMLParserTreeBuilder,
 )
 from bs4.element import (
+    BatchEdit,
     CData,
     Comment,
     Declaration,
@@ -432,6 +433,38 @@ class TestSmooth(SoupTest):
         # meaning of the HTML.
         assert 'Comment 1' == div.contents[1]
         assert 'Comment 2' == div.contents[2]
+        self.linkage_validator(soup)
+
+    def test_smooth_long_runs(self):
+        soup = self.soup("<div><b>x</b></div>")
+        div = soup.div
+        for i in range(100):
+            div.insert(0, str(i % 10))
+            div.append(str(i % 10))
+        div.b.append("y")
+        soup.smooth()
+        assert 3 == len(div.contents)
+        assert "9876543210" * 10 == div.contents[0]
+        assert "0123456789" * 10 == div.contents[2]
+        assert "xy" == div.b.string
+        assert all(type(x) is NavigableString for x in soup.strings)
+        self.linkage_validator(soup)
+
+    def test_smooth_deep_tree(self):
+        # smooth() doesn't use recursion, so it can handle a tree
+        # deeper than the recursion limit.
+        import sys
+        depth = sys.getrecursionlimit() + 100
+        soup = self.soup("")
+        tag = soup
+        for i in range(depth):
+            new_tag = soup.new_tag("b")
+            tag.append(new_tag)
+            tag = new_tag
+            tag.append("a")
+            tag.append("b")
+        soup.smooth()
+        assert ["ab"] * depth == list(soup.strings)
 
 
 class TestIndex(SoupTest):
@@ -452,6 +485,69 @@ class TestIndex(SoupTest):
         with pytest.raises(ValueError):
             tree.index(1)
 
+    def test_index_in_large_tag(self):
+        markup = "<table>" + "<tr><td>Identical</td></tr>" * 100 + "</table>"
+        table = self.soup(markup).table
+        rows = list(table.contents)
+        for i, row in enumerate(rows):
+            assert i == table.index(row)
+        assert row in table
+        assert self.soup("<tr><td>Identical</td></tr>").tr in table
+
+        # Children that moved are found in their new positions.
+        table.insert(0, rows[50])
+        table.append(rows[10])
+        rows[20].extract()
+        for i, element in enumerate(table.contents):
+            assert i == table.index(element)
+
+        # So are children added directly to .contents.
+        table.contents.insert(0, rows[20])
+        for i, element in enumerate(table.contents):
+            assert i == table.index(element)
+        with pytest.raises(ValueError):
+            table.index(self.soup("<tr></tr>").tr)
+
+    def test_removing_many_children_takes_linear_time(self):
+        class CountingList(list):
+            lookups = 0
+            def __getitem__(self, i):
+                CountingList.lookups += 1
+                return list.__getitem__(self, i)
+            def __iter__(self):
+                for item in list.__iter__(self):
+                    CountingList.lookups += 1
+                    yield item
+
+        size = 2000
+        markup = "<table>" + "<tr><td>Identical</td></tr>" * size + "</table>"
+        for order in ("forward", "reverse", "alternate"):
+            soup = self.soup(markup)
+            rows = list(soup.table.contents)
+            if order == "reverse":
+                rows.reverse()
+            elif order == "alternate":
+                rows = rows[::2]
+            soup.table.contents = CountingList(soup.table.contents)
+            CountingList.lookups = 0
+            for row in rows:
+                row.extract()
+            assert CountingList.lookups < size * 5
+            self.linkage_validator(soup)
+
+    def test_child_positions_forget_removed_children(self):
+        soup = self.soup("<table>" + "<tr></tr>" * 100 + "</table>")
+        table = soup.table
+        removed = []
+        for i in range(20000):
+            tr = soup.new_tag("tr")
+            table.append(tr)
+            table.index(tr)
+            removed.append(tr.extract())
+        assert len(table._child_positions[0]) <= 2 * len(table.contents)
+        for i, element in enumerate(table.contents):
+            assert i == table.index(element)
+
 
 class TestParentOperations(SoupTest):
     """Test navigation and searching through an element's parents."""
@@ -918,7 +1014,61 @@ class TestTreeModification(SoupTest):
         d2.extend(d1)
         assert '<div id="d1"></div>' == d1.decode()
         assert '<div id="d2"><a>1</a><a>2</a><a>3</a><a>4</a></div>' == d2.decode()
-        
+        self.linkage_validator(soup)
+
+    def test_insert_multiple(self):
+        soup = self.soup("<div><a>1</a><a>2</a></div><p>after</p>")
+        new_soup = self.soup("<i>from</i>another soup")
+        b = soup.new_tag("b")
+        b.string = "bold"
+        soup.div.insert(1, "text", b, new_soup)
+        assert soup.div.decode() == (
+            "<div><a>1</a>text<b>bold</b><i>from</i>another soup<a>2</a></div>"
+        )
+        assert new_soup.contents == []
+        self.linkage_validator(soup)
+        assert soup.find(string="another soup").next_element.name == "a"
+
+        # Inserting at the end connects the last new element to
+        # whatever comes after the tag.
+        soup.div.insert(len(soup.div.contents), "x", "y")
+        assert soup.find(string="y").next_element.name == "p"
+        self.linkage_validator(soup)
+
+        with pytest.raises(ValueError):
+            soup.div.insert(0, "fine", None)
+        assert soup.div.contents[0] == soup.a
+
+    def test_insert_multiple_existing_children(self):
+        soup = self.soup("<div><a>1</a><a>2</a><a>3</a><a>4</a><a>5</a></div>")
+        a1, a2, a3, a4, a5 = soup.div.contents
+        # Moving a run of children that includes the target position.
+        soup.div.insert(3, a2, a3, a4)
+        assert soup.div.contents == [a1, a2, a3, a4, a5]
+        soup.div.insert(5, a1, a2)
+        assert soup.div.contents == [a3, a4, a5, a1, a2]
+        soup.div.insert(0, a5, a2, a4)
+        assert soup.div.contents == [a5, a2, a4, a3, a1]
+        self.linkage_validator(soup)
+
+        # An element given more than once ends up in its last position.
+        soup.div.insert(0, a1, a3, a1)
+        assert soup.div.contents == [a3, a1, a5, a2, a4]
+        self.linkage_validator(soup)
+
+    def test_extend_splices_once(self):
+        soup = self.soup("<ul></ul><p>after</p>")
+        items = []
+        for i in range(3):
+            li = soup.new_tag("li")
+            li.string = str(i)
+            items.append(li)
+        soup.ul.extend(items)
+        assert soup.ul.decode() == "<ul><li>0</li><li>1</li><li>2</li></ul>"
+        assert soup.ul.next_element is items[0]
+        assert items[2].string.next_element is soup.p
+        self.linkage_validator(soup)
+
     def test_move_tag_to_beginning_of_parent(self):
         data = "<a><b></b><c></c><d></d></a>"
         soup = self.soup(data)
@@ -1233,6 +1383,29 @@ class TestTreeModification(SoupTest):
         a.clear(decompose=True)
         assert 0 == len(em.contents)
 
+    def test_clear_wide_tag(self):
+        soup = self.soup(
+            "<ul>" + "<li><b>x</b>y</li>" * 100 + "</ul><p>after</p>"
+        )
+        items = soup.find_all("li")
+        soup.ul.clear()
+        assert [] == soup.ul.contents
+        assert soup.p == soup.ul.next_element
+        assert soup.ul == soup.p.previous_element
+        self.linkage_validator(soup)
+        for li in items:
+            assert None == li.parent
+            assert None == li.previous_element
+            assert None == li.next_sibling
+            assert None == li.contents[-1].next_element
+            self.linkage_validator(li)
+
+        soup.p.extend(items)
+        soup.p.clear(decompose=True)
+        assert "<ul></ul><p></p>" == soup.decode()
+        assert all(li.decomposed for li in items)
+        self.linkage_validator(soup)
+
        
     def test_decompose(self):
         # Test PageElement.decompose() and PageElement.decomposed
@@ -1249,7 +1422,113 @@ class TestTreeModification(SoupTest):
             assert True == i.decomposed
         # p2 is unaffected.
         assert False == p2.decomposed
-            
+
+    def test_extract_all(self):
+        soup = self.soup(
+            "<p>1<b>2</b><b>3<b>4</b></b>5<i>6</i><b>7</b></p><b>8</b>"
+        )
+        extracted = soup.extract_all("b")
+        assert ["2", "34", "7", "8"] == [x.get_text() for x in extracted]
+        assert soup.decode() == self.document_for("<p>15<i>6</i></p>")
+        self.linkage_validator(soup)
+
+        # The nested <b> tag stayed inside the tag that was extracted.
+        assert "<b>3<b>4</b></b>" == extracted[1].decode()
+        for tag in extracted:
+            assert None == tag.parent
+            assert None == tag.previous_element
+            assert None == tag.next_sibling
+            self.linkage_validator(tag)
+
+    def test_extract_all_with_strainer(self):
+        soup = self.soup("<p>a<b id='1'>b</b><b>c</b></p>d")
+        extracted = soup.extract_all(SoupStrainer(string=re.compile("[ad]")))
+        assert ["a", "d"] == extracted
+        extracted = soup.p.extract_all(SoupStrainer(id="1"))
+        assert '<b id="1">b</b>' == extracted[0].decode()
+        assert soup.decode() == self.document_for("<p><b>c</b></p>")
+        self.linkage_validator(soup)
+
+    def test_extract_all_with_selector(self):
+        soup = self.soup("<p class='x'>a</p><p>b<i class='x'>c</i></p>")
+        extracted = soup.extract_all(selector=".x")
+        assert ["a", "c"] == [x.string for x in extracted]
+        assert soup.decode() == self.document_for("<p>b</p>")
+        self.linkage_validator(soup)
+
+    def test_decompose_all(self):
+        soup = self.soup("<p>a<script>b</script>c<style>d</style></p>")
+        script = soup.script
+        soup.decompose_all(["script", "style"])
+        assert soup.decode() == self.document_for("<p>ac</p>")
+        assert script.decomposed
+        self.linkage_validator(soup)
+
+    def test_unwrap_all(self):
+        soup = self.soup(
+            "<p>1<span>2<span>3</span><b>4<span>5</span></b></span>6</p>"
+            "<span>7</span>"
+        )
+        spans = soup.find_all("span")
+        unwrapped = soup.unwrap_all("span")
+        assert spans == unwrapped
+        assert all(x is y for x, y in zip(spans, unwrapped))
+        assert soup.decode() == self.document_for("<p>123<b>45</b>6</p>7")
+        self.linkage_validator(soup)
+        for tag in unwrapped:
+            assert [] == tag.contents
+            assert None == tag.parent
+            assert None == tag.next_element
+
+        # Unwrapping doesn't merge strings; smooth() does that.
+        assert ["1", "2", "3", "<b>45</b>", "6"] == [
+            str(x) for x in soup.p.contents
+        ]
+
+    def test_unwrap_all_leaves_other_tags_alone(self):
+        # Only the tags with a match among their children get new
+        # .contents.
+        soup = self.soup("<div><p>1<b>2</b></p><p><i><b>3</b></i></p></div>")
+        div = soup.div
+        p1, p2 = div.contents
+        div_contents = div.contents
+        p2_contents = p2.contents
+        soup.unwrap_all("b")
+        assert div.contents is div_contents
+        assert p2.contents is p2_contents
+        assert ["1", "2"] == p1.contents
+        assert ["3"] == p2.i.contents
+        self.linkage_validator(soup)
+
+    def test_bulk_methods_take_names_as_strings(self):
+        # A string is a tag name, as it is for find_all(), even if it
+        # looks like a CSS selector.
+        soup = self.soup("<p><ns:x>1</ns:x><b class='x'>2</b></p>")
+        assert ["ns:x"] == [x.name for x in soup.unwrap_all("ns:x")]
+        assert [] == soup.extract_all(".x")
+        assert ["2"] == [x.string for x in soup.extract_all(selector=".x")]
+        assert soup.decode() == self.document_for("<p>1</p>")
+
+    def test_bulk_methods_need_one_kind_of_match(self):
+        soup = self.soup("<p><b>1</b></p>")
+        for method in (soup.extract_all, soup.decompose_all, soup.unwrap_all):
+            with pytest.raises(ValueError):
+                method()
+            with pytest.raises(ValueError):
+                method("b", selector="b")
+        assert soup.decode() == self.document_for("<p><b>1</b></p>")
+
+    def test_unwrap_all_with_selector(self):
+        soup = self.soup("<div><a class='x'><b>1</b>2</a><a>3</a></div>")
+        unwrapped = soup.unwrap_all(selector="a.x")
+        assert 1 == len(unwrapped)
+        assert soup.decode() == self.document_for(
+            "<div><b>1</b>2<a>3</a></div>"
+        )
+        self.linkage_validator(soup)
+        assert soup.div.b is soup.div.contents[0]
+        assert soup.div.index(soup.div.a) == 2
+
     def test_string_set(self):
         """Tag.string = 'string'"""
         soup = self.soup("<a></a> <b><c></c></b>")
@@ -1270,6 +1549,134 @@ class TestTreeModification(SoupTest):
         assert isinstance(soup.a.string, CData)
 
 
+class TestBatchEdit(SoupTest):
+    """Test BeautifulSoup.batch_edit()."""
+
+    MARKUP = (
+        "<div><p>1<a>2</a>3</p><p>4<a>5</a><b>6</b></p></div>"
+        "<ul><li>7</li><li>8</li></ul>"
+    )
+
+    def rewrite(self, soup):
+        links = soup.find_all("a")
+        b = soup.b
+        ul = soup.ul
+        items = soup.find_all("li")
+        for a in links:
+            a.wrap(soup.new_tag("span"))
+        b.replace_with("bold", soup.new_tag("i"))
+        items[1].extract()
+        items[0].insert(0, items[1])
+        soup.div.p.insert_after(ul)
+        ul.append(soup.new_string("9"))
+        soup.div.p.decompose()
+        soup.div.p.unwrap()
+
+    def test_batch_edit_makes_the_same_changes(self):
+        expect = self.soup(self.MARKUP)
+        self.rewrite(expect)
+
+        soup = self.soup(self.MARKUP)
+        with soup.batch_edit() as value:
+            assert value is soup
+            self.rewrite(soup)
+        assert expect.decode() == soup.decode()
+        self.linkage_validator(soup)
+
+    def test_change_beneath_earlier_change(self):
+        # A Tag changes, and then one of its descendants changes.
+        soup = self.soup("<div>1<p><b>2<i>3</i></b>4</p></div>")
+        with soup.batch_edit():
+            soup.div.append("5")
+            soup.b.contents[0].replace_with("new")
+            soup.i.extract()
+        assert soup.decode() == "<div>1<p><b>new</b>4</p>5</div>"
+        self.linkage_validator(soup)
+
+    def test_linkage_is_repaired_when_batch_ends(self):
+        soup = self.soup("<a>1</a><b>2</b>")
+        a = soup.a
+        with soup.batch_edit():
+            with soup.batch_edit():
+                soup.b.append(a)
+            # The contents and parents are up to date...
+            assert [soup.b] == soup.contents
+            assert soup.b == a.parent
+            # ...but the rest of the linkage hasn't been touched.
+            assert soup.b == a.next_sibling
+        assert None == a.next_sibling
+        assert a == soup.b.contents[0].next_element
+        self.linkage_validator(soup)
+
+    def test_extracted_element_is_repaired(self):
+        soup = self.soup("<a>1</a><b>2<c>3</c></b><d>4</d>")
+        with soup.batch_edit():
+            b = soup.b.extract()
+            b.c.append(soup.d)
+        self.linkage_validator(b)
+        assert None == b.previous_element
+        assert None == b.next_sibling
+        assert "<b>2<c>3<d>4</d></c></b>" == b.decode()
+        assert "<a>1</a>" == soup.decode()
+        self.linkage_validator(soup)
+
+    def test_element_moved_to_another_tree(self):
+        soup = self.soup("<a>1</a><b>2</b>")
+        other = self.soup("<c>3</c><d>4</d>")
+        with soup.batch_edit():
+            other.c.append(soup.b)
+            soup.insert(0, other.d)
+        assert "<d>4</d><a>1</a>" == soup.decode()
+        assert "<c>3<b>2</b></c>" == other.decode()
+        self.linkage_validator(soup)
+        self.linkage_validator(other)
+
+    def test_other_documents_are_not_batched(self):
+        soup = self.soup("<a>1</a>")
+        other = self.soup("<b>2</b>")
+        with soup.batch_edit():
+            soup.a.append("3")
+            other.b.append(other.new_tag("c"))
+            new = self.soup("<p>4</p><p>5</p>")
+            new.p.extract()
+            # The other documents are linked up right away...
+            self.linkage_validator(other)
+            self.linkage_validator(new)
+            # ...but this one waits for the block to end.
+            assert None == soup.a.contents[0].next_element
+        assert "3" == soup.a.contents[0].next_element
+        self.linkage_validator(soup)
+
+    def test_nested_batch_on_a_subtree(self):
+        soup = self.soup("<div><p>1</p></div><b>2</b>")
+        div = soup.div
+        b = soup.b
+        with soup.batch_edit():
+            with BatchEdit(div):
+                soup.p.append(b)
+            # The outer block takes care of the inner one's changes.
+            assert div == b.previous_sibling
+        assert "1" == b.previous_sibling
+        self.linkage_validator(soup)
+
+    def test_bulk_methods_in_batch(self):
+        soup = self.soup("<p><i>1</i><b>2</b><i>3</i><b><i>4</i></b></p>")
+        with soup.batch_edit():
+            soup.decompose_all("b")
+            soup.unwrap_all("i")
+        assert "<p>13</p>" == soup.decode()
+        self.linkage_validator(soup)
+
+    def test_linkage_is_repaired_after_exception(self):
+        soup = self.soup("<a>1</a><b>2</b>")
+        with pytest.raises(ValueError):
+            with soup.batch_edit():
+                soup.b.insert(0, soup.a)
+                raise ValueError()
+        assert "<b><a>1</a>2</b>" == soup.decode()
+        self.linkage_validator(soup)
+
+
 class TestDeprecatedArguments(SoupTest):
 
     def test_find_type_method_string(self):